@@ -1,17 +1,42 @@
 #!/usr/bin/env python3
-"""Analyze earphones-commuter.jpg to find the face region."""
+"""
+Find the face / focal region of a photo for CSS object-position.
+
+Builds summed-area tables for R, G and brightness (R+G+B) once per image,
+so every scan window is scored in O(1) instead of re-reading its pixels.
+
+Usage:
+    python3 _dev/scripts/analyze_face.py [image] [--stride 2] [--window 30] [--dense]
+    python3 _dev/scripts/analyze_face.py --batch [--jobs N] [--manifest PATH] [--css PATH]
+
+Batch mode walks assets/images/ (including feat-cards/) and writes every
+focal point to one focal_points.json manifest.
+
+--max-side N decodes JPEGs at a reduced DCT scale (see imageload.py) and
+shrinks the scan window to match; percentages stay comparable, but the
+default remains a full-resolution scan.
+"""
+import argparse
+import json
+import multiprocessing
 import os
-from PIL import Image
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
-os.chdir(os.path.dirname(os.path.abspath(__file__)) + "/../..")
+import devtrace
+import imageload
+from crop_features import VARIANT_NAME
 
-img = Image.open("assets/images/earphones-commuter.jpg")
-w, h = img.size
-print(f"Image size: {w}x{h}")
-print()
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMAGES_DIR = os.path.join(ROOT, "assets", "images")
+DEFAULT_IMAGE = os.path.join(IMAGES_DIR, "earphones-commuter.jpg")
+DEFAULT_MANIFEST = os.path.join(IMAGES_DIR, "focal_points.json")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
 
-# Check specific points to find face
-points = [
+# Fixed probe points (x%, y%) printed as a quick skin-tone table
+PROBE_POINTS = [
     (0.25, 0.15), (0.30, 0.15), (0.35, 0.15), (0.40, 0.15), (0.45, 0.15),
     (0.25, 0.20), (0.30, 0.20), (0.35, 0.20), (0.40, 0.20), (0.45, 0.20),
     (0.25, 0.25), (0.30, 0.25), (0.35, 0.25), (0.40, 0.25), (0.45, 0.25),
@@ -19,40 +44,259 @@ points = [
     (0.50, 0.30), (0.55, 0.30), (0.60, 0.30), (0.45, 0.30), (0.40, 0.30),
     (0.50, 0.35), (0.55, 0.35), (0.60, 0.35), (0.45, 0.35), (0.40, 0.35),
 ]
+PROBE_HALF = 40
+
+# Search area for the focal scan, in percent of width / height (end exclusive)
+SCAN_X = (10, 90)
+SCAN_Y = (5, 60)
+
+
+@devtrace.traced("integral_tables")
+def integral_tables(img):
+    """Return summed-area tables (h+1, w+1) for R, G and brightness R+G+B."""
+    r, g, b = (np.asarray(band) for band in img.convert("RGB").split())
+    lum = r.astype(np.int32)
+    lum += g
+    lum += b
+    tables = {}
+    for name, plane in (("r", r), ("g", g), ("lum", lum)):
+        table = np.zeros((plane.shape[0] + 1, plane.shape[1] + 1), dtype=np.int64)
+        # Row-wise first, then in place down the columns (much faster than the reverse)
+        np.cumsum(plane, axis=1, dtype=np.int64, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=0, out=table[1:, 1:])
+        tables[name] = table
+    return tables
+
+
+def window_stats(tables, cx, cy, half):
+    """
+    Score square windows centred on (cx, cy), clipped to the image.
+    cx / cy may be scalars or broadcastable arrays.
+    Returns (brightness, skin) arrays with the same shape.
+    """
+    h, w = tables["r"].shape[0] - 1, tables["r"].shape[1] - 1
+    x0 = np.maximum(0, np.asarray(cx) - half)
+    y0 = np.maximum(0, np.asarray(cy) - half)
+    x1 = np.minimum(w, np.asarray(cx) + half)
+    y1 = np.minimum(h, np.asarray(cy) + half)
+    area = (x1 - x0) * (y1 - y0)
+
+    def box_sum(t):
+        return t[y1, x1] - t[y0, x1] - t[y1, x0] + t[y0, x0]
+
+    avg_r = box_sum(tables["r"]) / area
+    avg_g = box_sum(tables["g"]) / area
+    brightness = box_sum(tables["lum"]) / (3 * area)
+    return brightness, avg_r - avg_g
+
+
+def focal_score(brightness, skin):
+    """Warm (skin-like) and bright windows score highest."""
+    return np.where(skin > 0, skin * (brightness / 100), 0.0)
+
+
+@devtrace.traced("focal_scan")
+def find_focal_point(tables, stride=2, half=30, dense=False):
+    """
+    Return the best-scoring window as a dict, or None if nothing is warm.
+
+    The default grid steps `stride` percent across SCAN_X x SCAN_Y.
+    With dense=True every pixel offset inside the same area is scored.
+    """
+    h, w = tables["r"].shape[0] - 1, tables["r"].shape[1] - 1
+    if dense:
+        xs = np.arange(w * SCAN_X[0] // 100, -(-w * SCAN_X[1] // 100))
+        ys = np.arange(h * SCAN_Y[0] // 100, -(-h * SCAN_Y[1] // 100))
+        cx, cy = xs[:, None], ys[None, :]
+    else:
+        xps = np.arange(SCAN_X[0], SCAN_X[1], stride)
+        yps = np.arange(SCAN_Y[0], SCAN_Y[1], stride)
+        cx = (w * xps // 100)[:, None]
+        cy = (h * yps // 100)[None, :]
+
+    brightness, skin = window_stats(tables, cx, cy, half)
+    score = focal_score(brightness, skin)
+    # Row-major argmax keeps the first maximum in x-then-y scan order
+    ix, iy = np.unravel_index(int(np.argmax(score)), score.shape)
+    if score[ix, iy] <= 0:
+        return None
+
+    px, py = int(np.broadcast_to(cx, score.shape)[ix, iy]), int(np.broadcast_to(cy, score.shape)[ix, iy])
+    if dense:
+        xp, yp = round(px * 100 / w, 1), round(py * 100 / h, 1)
+    else:
+        xp, yp = int(xps[ix]), int(yps[iy])
+    return {
+        "x": xp,
+        "y": yp,
+        "px": px,
+        "py": py,
+        "brightness": float(brightness[ix, iy]),
+        "skin": float(skin[ix, iy]),
+        "score": float(score[ix, iy]),
+    }
+
+
+def print_probe_table(tables):
+    h, w = tables["r"].shape[0] - 1, tables["r"].shape[1] - 1
+    probes = sorted(PROBE_POINTS)
+    cx = np.array([int(w * xp) for xp, _ in probes])
+    cy = np.array([int(h * yp) for _, yp in probes])
+    brightness, skin = window_stats(tables, cx, cy, PROBE_HALF)
+
+    print("Scanning for skin tones (face region):")
+    print(f"{'X%':>5} {'Y%':>5} {'px_x':>6} {'px_y':>6} {'Bright':>7} {'Skin':>6}")
+    for i, (xp, yp) in enumerate(probes):
+        marker = " <-- FACE?" if skin[i] > 8 and brightness[i] > 60 else ""
+        print(f"{xp*100:>4.0f}% {yp*100:>4.0f}% {cx[i]:>6} {cy[i]:>6} {brightness[i]:>7.1f} {skin[i]:>6.1f}{marker}")
+
+
+def find_images(folder=IMAGES_DIR):
+    """All images under `folder`, recursively (picks up feat-cards/ too, minus srcset variants)."""
+    found = []
+    for dirpath, _, filenames in os.walk(folder):
+        found.extend(os.path.join(dirpath, f) for f in filenames
+                     if f.lower().endswith(IMAGE_EXTS) and not VARIANT_NAME.search(f))
+    return sorted(found)
+
+
+def load_scaled(path, max_side=None, half=30, stats=imageload.STATS):
+    """Decode `path` (optionally reduced) and scale `half` to the decoded size."""
+    img = imageload.open_max_side(path, max_side, stats=stats)
+    scale = img.size[0] / img.info["full_size"][0]
+    return img, scale, max(1, round(half * scale))
+
+
+def to_full_res(best, scale, full_size, dense=False):
+    """Map a focal point found on a reduced decode back to original pixels."""
+    if best and scale != 1:
+        best["px"], best["py"] = round(best["px"] / scale), round(best["py"] / scale)
+        if dense:
+            best["x"] = round(best["px"] * 100 / full_size[0], 1)
+            best["y"] = round(best["py"] * 100 / full_size[1], 1)
+    return best
+
+
+def analyze_file(path, stride=2, half=30, dense=False, max_side=None):
+    """
+    Process-pool worker: focal point manifest entry, decode stats and the
+    worker's trace spans for one image.
+    """
+    stats = imageload.DecodeStats()
+    rel = os.path.relpath(path, ROOT).replace(os.sep, "/")
+    with devtrace.span("analyze", file=rel):
+        img, scale, scaled_half = load_scaled(path, max_side, half, stats)
+        w, h = img.info["full_size"]
+        best = find_focal_point(integral_tables(img), stride=stride, half=scaled_half, dense=dense)
+        best = to_full_res(best, scale, (w, h), dense)
+    entry = {"width": w, "height": h, "detected": best is not None}
+    if best:
+        entry.update(x=best["x"], y=best["y"], score=round(best["score"], 2))
+        entry["object_position"] = f"{best['x']}% {best['y']}%"
+    else:
+        entry["object_position"] = "50% 50%"
+    return rel, entry, stats, devtrace.drain()
+
+
+def run_batch(paths, jobs=None, stride=2, half=30, dense=False, max_side=None):
+    """
+    Analyze `paths` across a process pool; returns {relpath: entry} in path order.
+    With imageload's shared decode cache on (build_assets.py), threads are
+    used instead so the workers read and fill the cache.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    args = [(p, stride, half, dense, max_side) for p in paths]
+    if jobs == 1 or len(paths) < 2:
+        results = [analyze_file(*a) for a in args]
+    else:
+        if imageload.CACHE is not None:
+            pool = devtrace.ThreadPool(max_workers=jobs)
+        else:
+            # spawn, not fork: build_assets may have other threads holding locks
+            pool = ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn"))
+        with pool:
+            results = list(pool.map(analyze_file, *zip(*args)))
+    manifest = {}
+    for rel, entry, stats, trace in results:
+        manifest[rel] = entry
+        imageload.STATS.merge(stats)
+        devtrace.merge(trace)
+    return manifest
+
+
+def write_css(manifest, css_path):
+    """Emit one object-position rule per image, keyed on the src suffix."""
+    lines = ["/* Generated by _dev/scripts/analyze_face.py --batch. Do not edit. */"]
+    for rel, entry in manifest.items():
+        if entry["detected"]:
+            lines.append(f'img[src$="{rel}"] {{ object-position: {entry["object_position"]}; }}')
+    with open(css_path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def batch_main(args):
+    paths = find_images(args.images_dir)
+    if not paths:
+        print(f"No images found in {args.images_dir}")
+        return
+    jobs = args.jobs or os.cpu_count() or 1
+    print(f"Found {len(paths)} images, analyzing with {jobs} worker(s)...")
+
+    start = time.perf_counter()
+    manifest = run_batch(paths, jobs=jobs, stride=args.stride, half=args.window,
+                         dense=args.dense, max_side=args.max_side)
+    elapsed = time.perf_counter() - start
+
+    for rel, entry in manifest.items():
+        print(f"  OK: {rel} -> {entry['object_position']}{'' if entry['detected'] else ' (no focal region)'}")
+
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+    print(f"\nDone! {len(manifest)} focal points in {elapsed:.2f}s -> {args.manifest}")
+    print(imageload.STATS.summary())
+    if args.css:
+        write_css(manifest, args.css)
+        print(f"CSS rules written to {args.css}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("image", nargs="?", default=DEFAULT_IMAGE, help="image to analyze")
+    parser.add_argument("--stride", type=int, default=2, help="grid step in percent (default 2)")
+    parser.add_argument("--window", type=int, default=30, help="half window size in px (default 30)")
+    parser.add_argument("--dense", action="store_true", help="score every pixel offset instead of the grid")
+    parser.add_argument("--max-side", type=int, default=None,
+                        help="decode JPEGs at a reduced scale whose longer side is at least N px")
+    parser.add_argument("--batch", action="store_true", help="analyze every image under --images-dir")
+    parser.add_argument("--images-dir", default=IMAGES_DIR, help="batch input folder (default assets/images)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="batch output JSON (default assets/images/focal_points.json)")
+    parser.add_argument("--css", default=None, help="also write object-position CSS rules to this file")
+    args = parser.parse_args(argv)
+
+    if args.batch:
+        batch_main(args)
+        return
+
+    img, scale, half = load_scaled(args.image, args.max_side, args.window)
+    w, h = img.info["full_size"]
+    print(f"Image size: {w}x{h}")
+    if scale != 1:
+        print(f"Decoded at {img.size[0]}x{img.size[1]} (scale {scale:g}), window half {half}px")
+    print()
+
+    tables = integral_tables(img)
+    print_probe_table(tables)
+
+    print()
+    best = find_focal_point(tables, stride=args.stride, half=half, dense=args.dense)
+    best = to_full_res(best, scale, (w, h), args.dense)
+    if best:
+        print(f"Best face candidate: {best['x']}% x, {best['y']}% y (px {best['px']},{best['py']})")
+        print(f"  Brightness: {best['brightness']:.1f}, Skin warmth: {best['skin']:.1f}")
+        print(f"  Recommended object-position: {best['x']}% {best['y']}%")
+
 
-print("Scanning for skin tones (face region):")
-print(f"{'X%':>5} {'Y%':>5} {'px_x':>6} {'px_y':>6} {'Bright':>7} {'Skin':>6}")
-for xp, yp in sorted(points):
-    cx, cy = int(w * xp), int(h * yp)
-    region = img.crop((max(0, cx-40), max(0, cy-40), min(w, cx+40), min(h, cy+40)))
-    pixels = list(region.getdata())
-    avg_r = sum(p[0] for p in pixels) / len(pixels)
-    avg_g = sum(p[1] for p in pixels) / len(pixels)
-    avg_b_ch = sum(p[2] for p in pixels) / len(pixels)
-    brightness = (avg_r + avg_g + avg_b_ch) / 3
-    skin = avg_r - avg_g
-    marker = " <-- FACE?" if skin > 8 and brightness > 60 else ""
-    print(f"{xp*100:>4.0f}% {yp*100:>4.0f}% {cx:>6} {cy:>6} {brightness:>7.1f} {skin:>6.1f}{marker}")
-
-# Find the highest skin-score region
-print()
-best = None
-best_score = 0
-for xp in range(10, 90, 2):
-    for yp in range(5, 60, 2):
-        cx, cy = int(w * xp / 100), int(h * yp / 100)
-        region = img.crop((max(0, cx-30), max(0, cy-30), min(w, cx+30), min(h, cy+30)))
-        pixels = list(region.getdata())
-        avg_r = sum(p[0] for p in pixels) / len(pixels)
-        avg_g = sum(p[1] for p in pixels) / len(pixels)
-        brightness = sum(sum(p[:3])/3 for p in pixels) / len(pixels)
-        skin = avg_r - avg_g
-        score = skin * (brightness / 100) if skin > 0 else 0
-        if score > best_score:
-            best_score = score
-            best = (xp, yp, cx, cy, brightness, skin)
-
-if best:
-    print(f"Best face candidate: {best[0]}% x, {best[1]}% y (px {best[2]},{best[3]})")
-    print(f"  Brightness: {best[4]:.1f}, Skin warmth: {best[5]:.1f}")
-    print(f"  Recommended object-position: {best[0]}% {best[1]}%")
+if __name__ == "__main__":
+    devtrace.run(main)
@@ -1,43 +1,301 @@
 #!/usr/bin/env python3
-"""Analyze app screenshots using macOS Vision OCR to identify each screen."""
-import objc, os, sys
-from Foundation import NSURL
-import Quartz
-import Vision
-
-folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'App Screenshots incomplete')
-files = sorted([f for f in os.listdir(folder) if f.endswith('.jpg')])
-
-print(f"Found {len(files)} screenshots\n")
-
-for f in files:
-    path = os.path.join(folder, f)
-    url = NSURL.fileURLWithPath_(path)
-    img_src = Quartz.CGImageSourceCreateWithURL(url, None)
-    if not img_src:
-        print(f"SKIP: {f}")
-        continue
-    cg_img = Quartz.CGImageSourceCreateImageAtIndex(img_src, 0, None)
-    if not cg_img:
-        print(f"SKIP: {f}")
-        continue
-
-    handler = Vision.VNImageRequestHandler.alloc().initWithCGImage_options_(cg_img, None)
-    request = Vision.VNRecognizeTextRequest.alloc().init()
-    request.setRecognitionLevel_(1)
-    request.setUsesLanguageCorrection_(True)
-    
-    success, error = handler.performRequests_error_([request], None)
-    
-    texts = []
-    if success and request.results():
-        for obs in request.results():
+"""
+Analyze app screenshots with OCR to identify each screen.
+
+OCR backends (--backend, default "auto" = first available OCR engine):
+    vision     macOS Vision framework via pyobjc
+               pip3 install pyobjc-framework-Vision pyobjc-framework-Quartz
+    tesseract  local Tesseract CLI (apt install tesseract-ocr / brew install
+               tesseract); runs one process per screenshot
+    filename   stand-in that reads the words of the file name; for tests and
+               machines without an OCR engine. Never picked by "auto" and
+               never cached, so its invented text cannot pass for OCR
+
+Screenshots are recognized concurrently (--jobs) and the text is cached in
+_dev/.cache/analyze_screenshots.json keyed by file content hash and
+backend/version, so repeat runs only OCR new or changed screenshots. Each
+run writes an index of the detected text per screen (JSON Lines, or JSON
+if the path ends in .json).
+
+Usage:
+    python3 _dev/scripts/analyze_screenshots.py [folder] [--backend NAME]
+        [--jobs N] [--lang eng] [--index PATH] [--force]
+"""
+import abc
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+
+import devtrace
+from buildcache import BuildCache, make_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_FOLDER = os.path.join(ROOT, "App Screenshots incomplete")
+DEFAULT_INDEX = os.path.join(ROOT, "_dev", "scripts", "screenshot_text.jsonl")
+IMAGE_EXTS = (".jpg", ".jpeg", ".png")
+
+
+# ---------------------------------------------------------------------------
+# OCR backends
+# ---------------------------------------------------------------------------
+
+BACKENDS = {}
+
+
+def register_backend(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+class OcrBackend(abc.ABC):
+    """
+    One way of turning a screenshot into [(text line, confidence)], top to bottom.
+    Bump `version` when a backend's output changes so cached text is discarded.
+    `real` is False for stand-ins: "auto" skips them and their output is
+    not cached.
+    """
+    name = ""
+    version = "1"
+    real = True
+
+    def __init__(self, lang="eng", **options):
+        self.lang = lang
+        self.options = options
+
+    def unavailable_reason(self):
+        """None if the backend can run here, else why it cannot."""
+        return None
+
+    def cache_version(self):
+        return self.version
+
+    @abc.abstractmethod
+    def recognize(self, path):
+        """[(text line, confidence 0..1)] for the screenshot at `path`."""
+
+
+@register_backend
+class VisionBackend(OcrBackend):
+    name = "vision"
+
+    def unavailable_reason(self):
+        try:
+            import Vision  # noqa: F401
+            import Quartz  # noqa: F401
+        except ImportError:
+            return "pyobjc Vision framework not available (macOS only)"
+        return None
+
+    def recognize(self, path):
+        from Foundation import NSURL
+        import Quartz
+        import Vision
+
+        url = NSURL.fileURLWithPath_(path)
+        img_src = Quartz.CGImageSourceCreateWithURL(url, None)
+        cg_img = Quartz.CGImageSourceCreateImageAtIndex(img_src, 0, None) if img_src else None
+        if not cg_img:
+            raise OSError(f"cannot read {path}")
+
+        handler = Vision.VNImageRequestHandler.alloc().initWithCGImage_options_(cg_img, None)
+        request = Vision.VNRecognizeTextRequest.alloc().init()
+        request.setRecognitionLevel_(1)
+        request.setUsesLanguageCorrection_(True)
+        success, error = handler.performRequests_error_([request], None)
+        if not success:
+            raise RuntimeError(str(error))
+
+        lines = []
+        for obs in request.results() or []:
             candidate = obs.topCandidates_(1)
             if candidate:
-                texts.append(candidate[0].string())
-    
-    short = f.replace('Screenshot_2026-02-08-', '').replace('_62cb8f718626560d6d480c451ac19cb3.jpg', '')
-    combined = ' | '.join(texts[:20])
-    print(f"[{short}]")
-    print(f"  {combined[:400]}")
-    print()
+                lines.append((str(candidate[0].string()), float(candidate[0].confidence())))
+        return lines
+
+
+@register_backend
+class TesseractBackend(OcrBackend):
+    """Tesseract CLI with TSV output; words are regrouped into lines."""
+    name = "tesseract"
+
+    def __init__(self, lang="eng", **options):
+        super().__init__(lang, **options)
+        self.binary = shutil.which("tesseract")
+
+    def unavailable_reason(self):
+        if not self.binary:
+            return "tesseract not found on PATH"
+        return None
+
+    def cache_version(self):
+        # Different Tesseract builds read text differently
+        out = subprocess.run([self.binary, "--version"], capture_output=True, text=True)
+        first = (out.stdout or out.stderr).splitlines()[:1]
+        return f"{self.version}:{first[0] if first else 'unknown'}:{self.lang}"
+
+    def recognize(self, path):
+        # One thread per process; the pool provides the parallelism
+        env = dict(os.environ, OMP_THREAD_LIMIT="1")
+        out = subprocess.run(
+            [self.binary, path, "stdout", "-l", self.lang, "--psm", "11", "tsv"],
+            capture_output=True, text=True, env=env,
+        )
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr.strip() or f"tesseract exited {out.returncode}")
+
+        lines = {}
+        for row in csv.DictReader(io.StringIO(out.stdout), delimiter="\t", quoting=csv.QUOTE_NONE):
+            text = (row.get("text") or "").strip()
+            conf = float(row.get("conf") or -1)
+            if not text or conf < 0:
+                continue
+            key = (int(row["block_num"]), int(row["par_num"]), int(row["line_num"]))
+            entry = lines.setdefault(key, {"top": int(row["top"]), "words": [], "conf": []})
+            entry["words"].append(text)
+            entry["conf"].append(conf)
+        ordered = sorted(lines.values(), key=lambda e: e["top"])
+        return [(" ".join(e["words"]), sum(e["conf"]) / len(e["conf"]) / 100.0) for e in ordered]
+
+
+@register_backend
+class FilenameBackend(OcrBackend):
+    """Stand-in OCR: the words of the file name, e.g. app-alarms-list.jpg -> "alarms list"."""
+    name = "filename"
+    real = False
+
+    def recognize(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        words = [w for w in re.split(r"[-_ ]+", stem) if w and w.lower() != "app"]
+        return [(" ".join(words), 1.0)] if words else []
+
+
+def select_backend(name="auto", **options):
+    """
+    Instantiate the requested backend, or the first available real OCR
+    engine for "auto". Exits with the reason if none can run.
+    """
+    candidates = [n for n, cls in BACKENDS.items() if cls.real] if name == "auto" else [name]
+    for candidate in candidates:
+        backend = BACKENDS[candidate](**options)
+        reason = backend.unavailable_reason()
+        if reason is None:
+            return backend
+        print(f"  {candidate}: unavailable ({reason})")
+    print("ERROR: no usable OCR backend (--backend filename uses file names instead of OCR).")
+    sys.exit(2)
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+def find_screenshots(folder):
+    return sorted(
+        os.path.join(folder, f) for f in os.listdir(folder)
+        if f.lower().endswith(IMAGE_EXTS)
+    )
+
+
+def recognize_all(backend, paths, jobs=None, force=False):
+    """
+    OCR `paths` in a bounded thread pool, reusing cached text (real
+    backends only). Returns {path: (digest, lines or Exception)} and the cache.
+    """
+    cache = BuildCache("analyze_screenshots", force=force)
+    version = backend.cache_version()
+    digests = {p: cache.digest(p) for p in paths}
+    keys = {p: make_key(src=digests[p], backend=backend.name, version=version) for p in paths}
+
+    results = {}
+    todo = []
+    for path in paths:
+        cached = cache.get(path, keys[path]) if backend.real else None
+        if cached is not None:
+            results[path] = (digests[path], [tuple(line) for line in cached])
+        else:
+            todo.append(path)
+
+    def run(path):
+        with devtrace.span("ocr", file=path, backend=backend.name):
+            try:
+                return backend.recognize(path)
+            except Exception as e:
+                return e
+
+    if todo:
+        with devtrace.ThreadPool(max_workers=jobs or min(8, os.cpu_count() or 1)) as pool:
+            for path, lines in zip(todo, pool.map(run, todo)):
+                results[path] = (digests[path], lines)
+                if backend.real and not isinstance(lines, Exception):
+                    cache.record(path, keys[path], info=lines)
+    cache.save()
+    return results, cache
+
+
+def index_records(backend, results):
+    for path in sorted(results):
+        digest, lines = results[path]
+        record = {
+            "file": os.path.relpath(path, ROOT).replace(os.sep, "/"),
+            "sha256": digest,
+            "backend": backend.name,
+        }
+        if isinstance(lines, Exception):
+            record["error"] = str(lines)
+        else:
+            record["lines"] = [{"text": text, "confidence": round(conf, 3)} for text, conf in lines]
+            record["text"] = " | ".join(text for text, _ in lines)
+        yield record
+
+
+def write_index(path, records):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        if path.endswith(".json"):
+            json.dump(list(records), f, indent=2, ensure_ascii=False)
+        else:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="OCR the app screenshots and index the text per screen.")
+    parser.add_argument("folder", nargs="?", default=DEFAULT_FOLDER, help="screenshot folder")
+    parser.add_argument("--backend", default="auto", choices=["auto", *BACKENDS], help="OCR backend")
+    parser.add_argument("--jobs", type=int, default=None, help="concurrent OCR workers")
+    parser.add_argument("--lang", default="eng", help="Tesseract language (default eng)")
+    parser.add_argument("--index", default=DEFAULT_INDEX, help="output index (.jsonl or .json)")
+    parser.add_argument("--force", action="store_true", help="ignore the cache and OCR everything")
+    args = parser.parse_args()
+
+    backend = select_backend(args.backend, lang=args.lang)
+    paths = find_screenshots(args.folder)
+    print(f"Found {len(paths)} screenshots, using {backend.name} backend\n")
+
+    results, cache = recognize_all(backend, paths, jobs=args.jobs, force=args.force)
+    records = list(index_records(backend, results))
+    for record in records:
+        short = os.path.basename(record["file"])
+        print(f"[{short}]")
+        if "error" in record:
+            print(f"  SKIP: {record['error']}")
+        else:
+            print(f"  {' | '.join(line['text'] for line in record['lines'][:20])[:400]}")
+        print()
+
+    write_index(args.index, records)
+    errors = sum(1 for r in records if "error" in r)
+    print(f"Done! {len(records) - errors} screen(s) indexed, {errors} error(s); {cache.summary()}")
+    print(f"Index saved to {os.path.relpath(args.index, ROOT)}")
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Persistent SQLite catalog of the screenshots and site images.
+
+One row per file (repo-relative path): size, mtime, content hash,
+dimensions, EXIF capture time, canonical name and kind. Roles map a name
+such as "crop-source:feat-search.jpg" (the screenshot a CROPS entry in
+crop_features.py is cut from) to a path, so scripts can look an asset up
+by primary key instead of walking directories.
+
+Rescans are incremental: a file whose size and mtime match its row is not
+re-read. Renames go through a journal table, so a batch can be rolled back
+and an interrupted batch is reconciled on the next open.
+
+The database lives at _dev/.cache/asset_catalog.sqlite.
+
+Usage:
+    python3 _dev/scripts/asset_catalog.py [--rescan] [--list] [--role NAME]
+"""
+import argparse
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+
+from PIL import Image
+
+import devtrace
+from buildcache import file_digest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CATALOG_PATH = os.path.join(ROOT, "_dev", ".cache", "asset_catalog.sqlite")
+SCREENSHOTS_DIR = os.path.join(ROOT, "App Screenshots incomplete")
+IMAGES_DIR = os.path.join(ROOT, "assets", "images")
+SCAN_DIRS = {"screenshot": SCREENSHOTS_DIR, "image": IMAGES_DIR}
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+
+# Android screenshot names carry the capture time: Screenshot_2026-02-08-11-36-38-81_<hash>.jpg
+SCREENSHOT_NAME = re.compile(r"Screenshot_(\d{4})-(\d{2})-(\d{2})-(\d{2})-(\d{2})-(\d{2})")
+EXIF_IFD = 0x8769
+EXIF_DATETIME_ORIGINAL = 36867
+TIFF_DATETIME = 306
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    path            TEXT PRIMARY KEY,
+    kind            TEXT NOT NULL,
+    size            INTEGER NOT NULL,
+    mtime_ns        INTEGER NOT NULL,
+    sha256          TEXT NOT NULL,
+    width           INTEGER,
+    height          INTEGER,
+    captured_at     TEXT,
+    canonical_name  TEXT,
+    scanned_at      REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assets_sha256 ON assets (sha256);
+CREATE INDEX IF NOT EXISTS assets_captured ON assets (captured_at);
+
+CREATE TABLE IF NOT EXISTS roles (
+    role    TEXT PRIMARY KEY,
+    path    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS roles_path ON roles (path);
+
+CREATE TABLE IF NOT EXISTS rename_journal (
+    id        INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch     INTEGER NOT NULL,
+    old_path  TEXT NOT NULL,
+    new_path  TEXT NOT NULL,
+    status    TEXT NOT NULL DEFAULT 'pending',   -- pending / done / rolled_back
+    applied_at REAL
+);
+CREATE INDEX IF NOT EXISTS journal_batch ON rename_journal (batch);
+"""
+
+
+def rel(path):
+    return os.path.relpath(path, ROOT).replace(os.sep, "/")
+
+
+def absolute(relpath):
+    return os.path.join(ROOT, *relpath.split("/"))
+
+
+def capture_time(path, img=None):
+    """ISO capture time from EXIF DateTimeOriginal/DateTime, else the screenshot name, else None."""
+    try:
+        exif = img.getexif() if img else Image.open(path).getexif()
+        raw = exif.get_ifd(EXIF_IFD).get(EXIF_DATETIME_ORIGINAL) or exif.get(TIFF_DATETIME)
+        if raw:
+            return datetime.strptime(raw.strip(), "%Y:%m:%d %H:%M:%S").isoformat()
+    except (OSError, ValueError):
+        pass
+    match = SCREENSHOT_NAME.search(os.path.basename(path))
+    if match:
+        y, mo, d, h, mi, s = (int(g) for g in match.groups())
+        return datetime(y, mo, d, h, mi, s).isoformat()
+    return None
+
+
+def inspect(path):
+    """Hash, dimensions and capture time of one file."""
+    with devtrace.span("catalog_inspect", file=path, bytes_in=os.path.getsize(path)):
+        width = height = captured = None
+        try:
+            with Image.open(path) as img:
+                width, height = img.size
+                captured = capture_time(path, img)
+        except OSError:
+            captured = capture_time(path)
+        return file_digest(path), width, height, captured
+
+
+class Catalog:
+    """
+    Usage:
+        with Catalog() as cat:
+            cat.rescan()
+            src = cat.path_for_role("crop-source:feat-search.jpg")
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        self.recover()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    # -- scanning --------------------------------------------------------------
+
+    def rescan(self, dirs=SCAN_DIRS):
+        """
+        Bring the catalog up to date with `dirs` ({kind: folder}).
+        Returns (added, updated, unchanged, removed) counts.
+        """
+        known = {row["path"]: row for row in self.db.execute("SELECT path, size, mtime_ns FROM assets")}
+        seen = set()
+        added = updated = unchanged = 0
+        now = time.time()
+        with self.db:
+            for kind, folder in dirs.items():
+                for dirpath, _, filenames in os.walk(folder):
+                    for name in sorted(filenames):
+                        if not name.lower().endswith(IMAGE_EXTS):
+                            continue
+                        path = os.path.join(dirpath, name)
+                        key = rel(path)
+                        seen.add(key)
+                        st = os.stat(path)
+                        row = known.get(key)
+                        if row and row["size"] == st.st_size and row["mtime_ns"] == st.st_mtime_ns:
+                            unchanged += 1
+                            continue
+                        sha, width, height, captured = inspect(path)
+                        self.db.execute(
+                            """INSERT INTO assets (path, kind, size, mtime_ns, sha256, width, height, captured_at, scanned_at)
+                               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                               ON CONFLICT(path) DO UPDATE SET
+                                   kind=excluded.kind, size=excluded.size, mtime_ns=excluded.mtime_ns,
+                                   sha256=excluded.sha256, width=excluded.width, height=excluded.height,
+                                   captured_at=excluded.captured_at, scanned_at=excluded.scanned_at""",
+                            (key, kind, st.st_size, st.st_mtime_ns, sha, width, height, captured, now),
+                        )
+                        if row:
+                            updated += 1
+                        else:
+                            added += 1
+            prefixes = tuple(rel(folder) + "/" for folder in dirs.values())
+            gone = [p for p in known if p not in seen and p.startswith(prefixes)]
+            self.db.executemany("DELETE FROM assets WHERE path = ?", [(p,) for p in gone])
+        devtrace.count("catalog.rescanned", added + updated)
+        return added, updated, unchanged, len(gone)
+
+    # -- lookups ---------------------------------------------------------------
+
+    def get(self, path):
+        return self.db.execute("SELECT * FROM assets WHERE path = ?", (rel(path) if os.path.isabs(path) else path,)).fetchone()
+
+    def assets(self, kind=None):
+        if kind:
+            return self.db.execute("SELECT * FROM assets WHERE kind = ? ORDER BY path", (kind,)).fetchall()
+        return self.db.execute("SELECT * FROM assets ORDER BY path").fetchall()
+
+    def by_hash(self, sha256):
+        return self.db.execute("SELECT * FROM assets WHERE sha256 = ?", (sha256,)).fetchall()
+
+    def by_capture_time(self, captured_at):
+        return self.db.execute("SELECT * FROM assets WHERE captured_at = ?", (captured_at,)).fetchall()
+
+    def path_for_role(self, role):
+        """Absolute path registered for `role`, or None."""
+        row = self.db.execute("SELECT path FROM roles WHERE role = ?", (role,)).fetchone()
+        return absolute(row["path"]) if row else None
+
+    def roles(self):
+        return dict(self.db.execute("SELECT role, path FROM roles ORDER BY role").fetchall())
+
+    # -- updates ---------------------------------------------------------------
+
+    def set_roles(self, roles):
+        """Replace the whole role table with {role: path}."""
+        with self.db:
+            self.db.execute("DELETE FROM roles")
+            self.db.executemany(
+                "INSERT INTO roles (role, path) VALUES (?, ?)",
+                [(role, rel(path) if os.path.isabs(path) else path) for role, path in roles.items()],
+            )
+
+    def set_canonical_names(self, names):
+        """{path: canonical file name}."""
+        with self.db:
+            self.db.executemany(
+                "UPDATE assets SET canonical_name = ? WHERE path = ?",
+                [(name, rel(path) if os.path.isabs(path) else path) for path, name in names.items()],
+            )
+
+    # -- renames ---------------------------------------------------------------
+
+    def pending_renames(self, kind=None):
+        """[(old relpath, new relpath)] for rows whose file name differs from the canonical one."""
+        query = "SELECT path, canonical_name FROM assets WHERE canonical_name IS NOT NULL"
+        params = ()
+        if kind:
+            query += " AND kind = ?"
+            params = (kind,)
+        plan = []
+        for row in self.db.execute(query + " ORDER BY path", params):
+            head, name = row["path"].rsplit("/", 1) if "/" in row["path"] else ("", row["path"])
+            if name != row["canonical_name"]:
+                plan.append((row["path"], f"{head}/{row['canonical_name']}" if head else row["canonical_name"]))
+        return plan
+
+    def apply_renames(self, plan):
+        """
+        Rename files in bulk. The whole batch is journaled before the first
+        rename; each rename and its catalog update are then committed
+        together. Returns (batch id, [(old, new, error or None)]).
+        """
+        targets = [new for _, new in plan]
+        if len(set(targets)) != len(targets):
+            raise ValueError("rename plan maps two files to the same name")
+        with self.db:
+            batch = (self.db.execute("SELECT COALESCE(MAX(batch), 0) + 1 FROM rename_journal").fetchone()[0])
+            self.db.executemany(
+                "INSERT INTO rename_journal (batch, old_path, new_path) VALUES (?, ?, ?)",
+                [(batch, old, new) for old, new in plan],
+            )
+        results = []
+        for jid, old, new in self.db.execute(
+            "SELECT id, old_path, new_path FROM rename_journal WHERE batch = ? ORDER BY id", (batch,)
+        ).fetchall():
+            error = self._move(jid, old, new, "done")
+            results.append((old, new, error))
+        return batch, results
+
+    def rollback(self, batch=None):
+        """Undo the renames of `batch` (default: the latest applied one), newest first."""
+        if batch is None:
+            row = self.db.execute("SELECT MAX(batch) FROM rename_journal WHERE status = 'done'").fetchone()
+            batch = row[0]
+        if batch is None:
+            return None, []
+        results = []
+        for jid, old, new in self.db.execute(
+            "SELECT id, old_path, new_path FROM rename_journal WHERE batch = ? AND status = 'done' ORDER BY id DESC",
+            (batch,),
+        ).fetchall():
+            error = self._move(jid, new, old, "rolled_back")
+            results.append((new, old, error))
+        return batch, results
+
+    def _move(self, jid, src, dst, status):
+        src_abs, dst_abs = absolute(src), absolute(dst)
+        if os.path.exists(dst_abs):
+            return "target exists"
+        if not os.path.exists(src_abs):
+            return "source missing"
+        with devtrace.span("rename", file=dst):
+            os.rename(src_abs, dst_abs)
+        with self.db:
+            self._repoint(src, dst)
+            self.db.execute(
+                "UPDATE rename_journal SET status = ?, applied_at = ? WHERE id = ?", (status, time.time(), jid)
+            )
+        return None
+
+    def _repoint(self, src, dst):
+        self.db.execute("DELETE FROM assets WHERE path = ?", (dst,))
+        self.db.execute("UPDATE assets SET path = ? WHERE path = ?", (dst, src))
+        self.db.execute("UPDATE roles SET path = ? WHERE path = ?", (dst, src))
+
+    def recover(self):
+        """
+        Reconcile journal rows left 'pending' by an interrupted batch: if
+        the file already moved, record the rename; otherwise drop the row.
+        """
+        pending = self.db.execute("SELECT id, old_path, new_path FROM rename_journal WHERE status = 'pending'").fetchall()
+        if not pending:
+            return
+        with self.db:
+            for jid, old, new in pending:
+                if os.path.exists(absolute(new)) and not os.path.exists(absolute(old)):
+                    self._repoint(old, new)
+                    self.db.execute("UPDATE rename_journal SET status = 'done', applied_at = ? WHERE id = ?",
+                                    (time.time(), jid))
+                else:
+                    self.db.execute("DELETE FROM rename_journal WHERE id = ?", (jid,))
+
+
+def crop_roles():
+    """{role: path} for the sources and outputs of crop_features.CROPS."""
+    import crop_features
+    roles = {}
+    for src_name, _, out_name in crop_features.CROPS:
+        roles[f"crop-source:{out_name}"] = os.path.join(crop_features.SRC, src_name)
+        roles[f"feat-card:{out_name}"] = os.path.join(crop_features.OUT, out_name)
+    return roles
+
+
+def refresh(catalog):
+    """Rescan and re-register the known roles; returns the rescan counts."""
+    counts = catalog.rescan()
+    catalog.set_roles(crop_roles())
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the SQLite catalog of screenshots and images.")
+    parser.add_argument("--rescan", action="store_true", help="rescan even when only looking something up")
+    parser.add_argument("--list", action="store_true", help="list every cataloged asset")
+    parser.add_argument("--role", default=None, help="print the path registered for a role")
+    args = parser.parse_args()
+
+    with Catalog() as cat:
+        if args.rescan or not (args.role or args.list):
+            added, updated, unchanged, removed = refresh(cat)
+            print(f"Scanned: {added} added, {updated} updated, {unchanged} unchanged, {removed} removed")
+        if args.role:
+            path = cat.path_for_role(args.role)
+            print(rel(path) if path else f"No asset registered for role '{args.role}'")
+            return
+        if args.list:
+            roles_by_path = {}
+            for role, path in cat.roles().items():
+                roles_by_path.setdefault(path, []).append(role)
+            for row in cat.assets():
+                extra = f" [{', '.join(roles_by_path[row['path']])}]" if row["path"] in roles_by_path else ""
+                print(f"  {row['path']}  {row['width']}x{row['height']}  {row['captured_at'] or '-'}  "
+                      f"{row['sha256'][:12]}{extra}")
+        total = cat.db.execute("SELECT COUNT(*) FROM assets").fetchone()[0]
+        print(f"Done! {total} asset(s), {len(cat.roles())} role(s) in {rel(CATALOG_PATH)}")
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Benchmark the _dev image pipeline on synthetic fixtures.
+
+Generates deterministic 1080x2376 screenshots and 3840x2160 photos (once,
+under _dev/.cache/bench/) and times each stage the real scripts run:
+
+    decode      full-resolution JPEG decode
+    decode-draft reduced DCT-scale decode (imageload.open_max_side)
+    crop        feature-card region read (imageload.open_region)
+    auto-crop   UI-region detection on a 1/8-scale copy (crop_features)
+    resize      srcset pyramid (crop_features.build_pyramid)
+    encode      JPEG + WebP encode of one card (crop_features settings)
+    classify    pil-basic colour features (validate_images / image_features)
+    focal-scan  summed-area tables + grid scan (analyze_face)
+
+Each stage runs in its own Python process, so the peak RSS reported is
+that stage's alone. Wall and CPU time are the median and best over
+--runs (after one warm-up run). Results are compared with a baseline
+JSON and any stage whose best time or peak RSS grew by more than
+--threshold is reported as a regression (exit 1).
+Everything runs offline with Pillow and NumPy; peak RSS needs the Unix
+`resource` module.
+
+Usage:
+    python3 _dev/scripts/bench_pipeline.py [--stages a,b] [--runs 5]
+        [--threshold 0.25] [--baseline PATH] [--update-baseline] [--json PATH]
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+import devtrace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+FIXTURE_DIR = os.path.join(ROOT, "_dev", ".cache", "bench")
+DEFAULT_BASELINE = os.path.join(ROOT, "_dev", ".cache", "bench_baseline.json")
+FIXTURE_VERSION = "1"
+
+SCREENSHOT_SIZE = (1080, 2376)
+PHOTO_SIZE = (3840, 2160)
+FIXTURE_COUNT = 2
+
+
+# ---------------------------------------------------------------------------
+# Fixtures
+# ---------------------------------------------------------------------------
+
+def make_screenshot(seed):
+    """Flat app UI: status bar, cards with text-like stripes, nav bar."""
+    rng = np.random.default_rng(seed)
+    w, h = SCREENSHOT_SIZE
+    img = np.full((h, w, 3), (18, 20, 32), dtype=np.uint8)
+    img[:80] = (10, 10, 16)
+    img[h - 140:] = (24, 26, 40)
+    for top in range(200, h - 300, 320):
+        img[top:top + 260, 40:w - 40] = rng.integers(30, 70, 3)
+        for line in range(top + 30, top + 230, 40):
+            length = int(rng.integers(300, w - 120))
+            # Noisy "glyphs" so the encoder has edges to work on
+            img[line:line + 18, 80:80 + length] = rng.integers(150, 255, (18, length, 1), dtype=np.uint8)
+    return Image.fromarray(img)
+
+
+def make_photo(seed):
+    """Smooth sky/ground gradient with noise and a warm, bright focal blob."""
+    rng = np.random.default_rng(seed)
+    w, h = PHOTO_SIZE
+    y = np.linspace(0, 1, h, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, w, dtype=np.float32)[None, :]
+    sky = np.stack([90 + 60 * y + 0 * x, 130 + 40 * y + 0 * x, 200 - 120 * y + 0 * x], axis=-1)
+    cx, cy = rng.uniform(0.3, 0.7), rng.uniform(0.15, 0.45)
+    blob = np.exp(-(((x - cx) * 6) ** 2 + ((y - cy) * 8) ** 2))[..., None]
+    img = sky * (1 - blob) + np.array([225, 170, 140], dtype=np.float32) * blob
+    img += rng.normal(0, 6, (h, w, 1)).astype(np.float32)
+    return Image.fromarray(np.clip(img, 0, 255).astype(np.uint8))
+
+
+def ensure_fixtures(folder=FIXTURE_DIR):
+    """Write the fixture JPEGs if they are missing; returns {kind: [paths]}."""
+    os.makedirs(folder, exist_ok=True)
+    fixtures = {"screenshot": [], "photo": []}
+    for kind, make in (("screenshot", make_screenshot), ("photo", make_photo)):
+        for i in range(FIXTURE_COUNT):
+            path = os.path.join(folder, f"{kind}-{i}-v{FIXTURE_VERSION}.jpg")
+            if not os.path.exists(path):
+                make(i).save(path, "JPEG", quality=90)
+            fixtures[kind].append(path)
+    return fixtures
+
+
+# ---------------------------------------------------------------------------
+# Stages (run inside the child process)
+# ---------------------------------------------------------------------------
+
+def stage_decode(fx):
+    for path in fx["screenshot"] + fx["photo"]:
+        with Image.open(path) as img:
+            img.load()
+
+
+def stage_decode_draft(fx):
+    import imageload
+    for path in fx["photo"]:
+        imageload.open_max_side(path, 960, stats=imageload.DecodeStats())
+
+
+def stage_crop(fx):
+    import crop_features
+    import imageload
+    for path in fx["screenshot"]:
+        for _, box, _ in crop_features.CROPS:
+            size = (crop_features.TARGET_WIDTH, crop_features.output_height(box, crop_features.TARGET_WIDTH))
+            imageload.open_region(path, box, size, stats=imageload.DecodeStats())
+
+
+def stage_auto_crop(fx):
+    import crop_features
+    for path in fx["screenshot"]:
+        crop_features.detect_ui_box(path)
+
+
+def stage_resize(fx):
+    import crop_features
+    _, box, _ = crop_features.CROPS[0]
+    with Image.open(fx["screenshot"][0]) as img:
+        region = img.crop(box)
+    sizes = [(w, crop_features.output_height(box, w)) for w in crop_features.VARIANT_WIDTHS]
+    for _ in range(3):
+        crop_features.build_pyramid(region, sizes)
+
+
+def stage_encode(fx):
+    import crop_features
+    _, box, _ = crop_features.CROPS[0]
+    with Image.open(fx["screenshot"][0]) as img:
+        card = img.crop(box).resize((1080, crop_features.output_height(box, 1080)))
+    for ext, (_, settings) in crop_features.variant_formats().items():
+        card.save(io.BytesIO(), **settings)
+
+
+def stage_classify(fx):
+    import validate_images
+    backend = validate_images.PilBasicBackend()
+    backend.classify_batch(fx["screenshot"] + fx["photo"])
+
+
+def stage_focal_scan(fx):
+    import analyze_face
+    for path in fx["photo"]:
+        with Image.open(path) as img:
+            tables = analyze_face.integral_tables(img)
+        analyze_face.find_focal_point(tables)
+
+
+STAGES = {
+    "decode": stage_decode,
+    "decode-draft": stage_decode_draft,
+    "crop": stage_crop,
+    "auto-crop": stage_auto_crop,
+    "resize": stage_resize,
+    "encode": stage_encode,
+    "classify": stage_classify,
+    "focal-scan": stage_focal_scan,
+}
+
+
+def peak_rss_kb():
+    # ru_maxrss survives fork+exec on Linux (it would report the parent's
+    # peak), so prefer this process's own high-water mark from /proc
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def run_stage(name, runs):
+    """Child side: warm up, then time `runs` calls of one stage."""
+    fx = ensure_fixtures()
+    stage = STAGES[name]
+    stage(fx)
+    wall, cpu = [], []
+    for _ in range(runs):
+        w0, c0 = time.perf_counter(), time.process_time()
+        stage(fx)
+        wall.append(time.perf_counter() - w0)
+        cpu.append(time.process_time() - c0)
+    return {"wall": wall, "cpu": cpu, "peak_rss_kb": peak_rss_kb()}
+
+
+def measure(name, runs):
+    """Parent side: run one stage in a fresh interpreter and summarize it."""
+    # Children must not overwrite the parent's trace or profile output
+    env = {k: v for k, v in os.environ.items() if not k.startswith(("LOKALERT_TRACE", "LOKALERT_PROFILE"))}
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name, "--runs", str(runs)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"stage {name} failed:\n{out.stderr.strip()}")
+    raw = json.loads(out.stdout.strip().splitlines()[-1])
+    return {
+        "runs": runs,
+        "wall_s": statistics.median(raw["wall"]),
+        "wall_min_s": min(raw["wall"]),
+        "cpu_s": statistics.median(raw["cpu"]),
+        "cpu_min_s": min(raw["cpu"]),
+        "peak_rss_mb": raw["peak_rss_kb"] / 1024,
+    }
+
+
+# ---------------------------------------------------------------------------
+# Baseline comparison
+# ---------------------------------------------------------------------------
+
+def compare(results, baseline, threshold):
+    """
+    [(stage, metric, old, new, change)] for every metric past `threshold`.
+    Times are compared best-of-N, which is far less noisy than the median.
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("stages", {}).get(name)
+        if not old:
+            continue
+        for metric in ("wall_min_s", "cpu_min_s", "peak_rss_mb"):
+            if old.get(metric) and result[metric] > old[metric] * (1 + threshold):
+                regressions.append((name, metric, old[metric], result[metric], result[metric] / old[metric] - 1))
+    return regressions
+
+
+def load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the image pipeline stages on synthetic fixtures.")
+    parser.add_argument("--stages", default=",".join(STAGES), help="comma-separated stages (default: all)")
+    parser.add_argument("--runs", type=int, default=5, help="timed runs per stage (default 5)")
+    parser.add_argument("--threshold", type=float, default=0.25, help="regression threshold (default 0.25 = 25%%)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_stage(args.child, args.runs)))
+        return
+
+    names = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = [s for s in names if s not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+
+    ensure_fixtures()
+    baseline = load_json(args.baseline)
+    print(f"Benchmarking {len(names)} stage(s), {args.runs} run(s) each\n")
+    print(f"{'stage':<13} {'wall ms':>9} {'min ms':>9} {'cpu ms':>9} {'peak MB':>8}  vs baseline")
+
+    results = {}
+    for name in names:
+        with devtrace.span("stage", file=name):
+            r = results[name] = measure(name, args.runs)
+        old = baseline.get("stages", {}).get(name)
+        delta = f"{(r['wall_min_s'] / old['wall_min_s'] - 1) * 100:+.0f}%" if old and old.get("wall_min_s") else "-"
+        print(f"{name:<13} {r['wall_s'] * 1000:>9.1f} {r['wall_min_s'] * 1000:>9.1f} "
+              f"{r['cpu_s'] * 1000:>9.1f} {r['peak_rss_mb']:>8.1f}  {delta}")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cpu_count": os.cpu_count(),
+        "stages": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults saved to {args.json}")
+
+    regressions = compare(results, baseline, args.threshold)
+    if args.update_baseline:
+        merged = dict(report, stages=dict(baseline.get("stages", {}), **results))
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(merged, f, indent=2)
+        print(f"\nBaseline updated: {os.path.relpath(args.baseline, ROOT)}")
+        return
+    if not baseline:
+        print("\nNo baseline yet; run with --update-baseline to store one.")
+        return
+
+    print()
+    for name, metric, old, new, change in regressions:
+        print(f"  REGRESSION {name} {metric}: {old:.3f} -> {new:.3f} ({change * 100:+.0f}%)")
+    print(f"Done! {len(regressions)} regression(s) against {os.path.relpath(args.baseline, ROOT)}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
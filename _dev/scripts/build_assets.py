@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+"""
+Build runner for the _dev/scripts asset stages.
+
+Each stage is one of the scripts, run in this process through its
+main(argv), with declared inputs, outputs and dependencies:
+
+    rename        rename_screenshots.py   screenshots -> canonical names
+    crop          crop_features.py --variants screenshots -> feat-cards/ (cards, variants, srcset.json)
+    focal         analyze_face.py --batch assets/images -> focal_points.json
+    classify      validate_images.py      assets/images -> image_report.json
+    placeholders  placeholders.py         images + screenshots -> placeholders.json, index.html
+    html          validate_html.py        *.html, css, js (+ which assets exist)
+
+Stages whose dependencies are done run in parallel (--jobs). A stage is
+skipped when the fingerprint of its inputs (path, size and mtime of every
+matching file, plus its script, the shared modules and its arguments) is
+unchanged since its last successful run and its recorded outputs are
+untouched; state lives in _dev/.cache/build_assets.json. The project tree
+is walked once per run, and again only under the directories a finished
+stage wrote to. Check stages (classify, html) record failures too, so an
+unchanged failing check is reported from the cache rather than re-run.
+Each stage keeps its own finer-grained cache (per crop, per OCR'd file,
+...), so a rerun stage only redoes the affected files.
+
+All stages share imageload's decode cache for the run (--cache-mb). It
+keeps the largest decode of each source and downscales it for smaller
+requests, so a file read by several stages is usually decoded once; the
+hit counts are printed at the end. Stage output is buffered and printed
+when the stage finishes (only for failures unless --verbose), including
+what its devtrace.ThreadPool workers print.
+
+--watch polls the tree every --interval seconds and, when files change,
+rebuilds the stages whose inputs match them and everything downstream.
+
+Usage:
+    python3 _dev/scripts/build_assets.py [STAGE ...] [--jobs N] [--force]
+        [--verbose] [--watch [--interval 1.0]] [--list]
+"""
+import argparse
+import contextvars
+import hashlib
+import importlib
+import io
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import devtrace
+import imageload
+from buildcache import BuildCache, make_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCRIPTS = "_dev/scripts"
+SCREENSHOTS = "App Screenshots incomplete"
+IMAGES = "assets/images"
+SHARED_MODULES = [f"{SCRIPTS}/{m}.py" for m in ("devtrace", "buildcache", "imageload")]
+# The running stage's output buffer (see StageOutput)
+STAGE_BUFFER = contextvars.ContextVar("stage_buffer", default=None)
+# Directories walked for the snapshot (plus the files at the top level)
+WATCH_DIRS = [SCREENSHOTS, "assets", "css", "js", SCRIPTS]
+
+
+def compile_patterns(patterns):
+    """One regex for a list of globs ("*" = within a directory, "**/" = any depth)."""
+    parts = []
+    for pattern in patterns:
+        out, i = [], 0
+        while i < len(pattern):
+            if pattern.startswith("**/", i):
+                out.append("(?:.*/)?")
+                i += 3
+            elif pattern.startswith("**", i):
+                out.append(".*")
+                i += 2
+            elif pattern[i] == "*":
+                out.append("[^/]*")
+                i += 1
+            elif pattern[i] == "?":
+                out.append("[^/]")
+                i += 1
+            else:
+                out.append(re.escape(pattern[i]))
+                i += 1
+        parts.append("".join(out))
+    return re.compile("(?:" + "|".join(parts) + r")\Z" if parts else r"(?!)")
+
+
+def static_prefix(pattern):
+    """Directory part of a pattern before its first wildcard."""
+    head = re.split(r"[*?]", pattern, 1)[0]
+    return head.rsplit("/", 1)[0] if "/" in head else ""
+
+
+class Stage:
+    """
+    One script run as a build step. `inputs` and `outputs` are glob
+    patterns relative to the repo root ("*" stays within a directory,
+    "**/" spans any depth). `listing` patterns count only by name, for
+    stages that care which files exist but not what is in them.
+    """
+
+    def __init__(self, name, module, argv=(), deps=(), inputs=(), outputs=(), listing=(), check=False):
+        self.name = name
+        self.module = module
+        self.argv = list(argv)
+        self.deps = list(deps)
+        self.inputs = list(inputs) + [f"{SCRIPTS}/{module}.py"] + SHARED_MODULES
+        self.outputs = list(outputs)
+        self.listing = list(listing)
+        self.check = check
+        self._input_re = compile_patterns(self.inputs)
+        self._listing_re = compile_patterns(self.listing)
+
+    def matches(self, path):
+        return bool(self._input_re.match(path) or self._listing_re.match(path))
+
+    def fingerprint(self, snapshot):
+        h = hashlib.sha256()
+        for path in snapshot.select(self._input_re):
+            h.update(f"{path}\0{snapshot.files[path][0]}\0{snapshot.files[path][1]}\n".encode())
+        for path in snapshot.select(self._listing_re):
+            h.update(f"{path}\n".encode())
+        return make_key(files=h.hexdigest(), argv=self.argv)
+
+
+STAGES = {s.name: s for s in [
+    Stage("rename", "rename_screenshots",
+          inputs=[f"{SCREENSHOTS}/*", f"{SCRIPTS}/asset_catalog.py"],
+          outputs=[f"{SCREENSHOTS}/*"]),
+    Stage("crop", "crop_features", argv=["--variants"], deps=["rename"],
+          inputs=[f"{SCREENSHOTS}/*", f"{SCRIPTS}/optimize_images.py"],
+          outputs=[f"{IMAGES}/feat-cards/*.jpg", f"{IMAGES}/feat-cards/*.webp",
+                   f"{IMAGES}/feat-cards/srcset.json"]),
+    Stage("focal", "analyze_face", argv=["--batch"], deps=["crop"],
+          inputs=[f"{IMAGES}/**/*.jpg", f"{IMAGES}/**/*.jpeg", f"{IMAGES}/**/*.png", f"{IMAGES}/**/*.webp"],
+          outputs=[f"{IMAGES}/focal_points.json"]),
+    Stage("classify", "validate_images", check=True,
+          inputs=[f"{IMAGES}/*.jpg", f"{IMAGES}/*.png"],
+          outputs=[f"{SCRIPTS}/image_report.json"]),
+    Stage("placeholders", "placeholders", deps=["crop"],
+          inputs=[f"{SCREENSHOTS}/*", f"{IMAGES}/**/*.jpg", f"{IMAGES}/**/*.jpeg", f"{IMAGES}/**/*.png",
+                  f"{IMAGES}/**/*.webp", f"{SCRIPTS}/optimize_images.py"],
+          outputs=[f"{IMAGES}/placeholders.json", "index.html"]),
+    Stage("html", "validate_html", deps=["crop", "placeholders"], check=True,
+          inputs=["*.html", "css/**/*", "js/**/*"],
+          listing=["assets/**/*"]),
+]}
+
+
+# ---------------------------------------------------------------------------
+# Snapshot of the tree
+# ---------------------------------------------------------------------------
+
+class Snapshot:
+    """{relpath: (size, mtime_ns)} for the watched part of the tree."""
+
+    def __init__(self):
+        self.files = {}
+        self.lock = threading.Lock()
+        with devtrace.span("snapshot"):
+            for name in os.listdir(ROOT):
+                self._stat(name)
+            for folder in WATCH_DIRS:
+                self.refresh_dir(folder)
+
+    def _stat(self, rel):
+        try:
+            st = os.stat(os.path.join(ROOT, rel))
+        except OSError:
+            return
+        if os.path.isfile(os.path.join(ROOT, rel)):
+            self.files[rel] = (st.st_size, st.st_mtime_ns)
+
+    def refresh_dir(self, folder):
+        """Re-walk one directory (relative to the root), replacing its entries."""
+        prefix = folder.rstrip("/") + "/" if folder else ""
+        found = {}
+        for dirpath, dirnames, filenames in os.walk(os.path.join(ROOT, folder)):
+            dirnames[:] = [d for d in dirnames if d not in ("__pycache__", ".cache")]
+            rel_dir = os.path.relpath(dirpath, ROOT).replace(os.sep, "/")
+            rel_dir = "" if rel_dir == "." else rel_dir + "/"
+            for name in filenames:
+                try:
+                    st = os.stat(os.path.join(dirpath, name))
+                except OSError:
+                    continue
+                found[rel_dir + name] = (st.st_size, st.st_mtime_ns)
+            if not folder:
+                dirnames[:] = []  # the root itself: top-level files only
+        with self.lock:
+            if prefix:
+                for path in [p for p in self.files if p.startswith(prefix)]:
+                    del self.files[path]
+            self.files.update(found)
+
+    def refresh(self, patterns):
+        for folder in sorted({static_prefix(p) for p in patterns}):
+            self.refresh_dir(folder)
+
+    def select(self, regex):
+        with self.lock:
+            return sorted(p for p in self.files if regex.match(p))
+
+    def changed_since(self, other):
+        keys = self.files.keys() | other.files.keys()
+        return sorted(p for p in keys if self.files.get(p) != other.files.get(p))
+
+
+# ---------------------------------------------------------------------------
+# Running stages
+# ---------------------------------------------------------------------------
+
+class StageOutput(io.TextIOBase):
+    """
+    sys.stdout stand-in that buffers each stage's output separately.
+    The buffer lives in a contextvar: a stage runs in its own context, and
+    pool workers that copy it (devtrace.ThreadPool) write to the same
+    buffer. Any other thread writes straight through.
+    """
+
+    def __init__(self, real):
+        self.real = real
+
+    def __enter__(self):
+        sys.stdout = self
+        return self
+
+    def __exit__(self, *exc):
+        sys.stdout = self.real
+
+    def write(self, text):
+        return (STAGE_BUFFER.get() or self.real).write(text)
+
+    def flush(self):
+        self.real.flush()
+
+    def capture(self):
+        buf = io.StringIO()
+        STAGE_BUFFER.set(buf)
+        return buf
+
+    def release(self):
+        buf = STAGE_BUFFER.get()
+        STAGE_BUFFER.set(None)
+        return buf.getvalue()
+
+
+def run_stage(stage, out):
+    """Run one stage's main(); returns (status, seconds, output)."""
+    out.capture()
+    start = time.perf_counter()
+    status = "ok"
+    with devtrace.span(f"stage:{stage.name}"):
+        try:
+            sys.modules[stage.module].main(stage.argv)
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                status = "failed"
+        except Exception as e:
+            print(f"ERROR: {type(e).__name__}: {e}")
+            status = "error"
+    return status, time.perf_counter() - start, out.release()
+
+
+def with_dependencies(names):
+    """`names` plus everything they depend on, in STAGES order."""
+    wanted = set()
+
+    def add(name):
+        if name not in wanted:
+            wanted.add(name)
+            for dep in STAGES[name].deps:
+                add(dep)
+
+    for name in names:
+        add(name)
+    return [n for n in STAGES if n in wanted]
+
+
+def downstream(names):
+    """`names` plus every stage that depends on them, directly or not."""
+    affected = set(names)
+    grew = True
+    while grew:
+        grew = False
+        for stage in STAGES.values():
+            if stage.name not in affected and affected.intersection(stage.deps):
+                affected.add(stage.name)
+                grew = True
+    return [n for n in STAGES if n in affected]
+
+
+def build(names, snapshot, cache, jobs, verbose=False):
+    """
+    Run `names` (dependencies first, independent stages in parallel),
+    skipping fresh ones. Returns {stage: status}.
+    """
+    selected = with_dependencies(names)
+    pending = list(selected)
+    running = {}
+    results = {}
+    real_stdout = sys.stdout
+    out = StageOutput(real_stdout)
+
+    def report(line, output=""):
+        real_stdout.write(line + "\n")
+        if output.strip():
+            real_stdout.write("".join(f"    {l}\n" for l in output.rstrip().splitlines()))
+        real_stdout.flush()
+
+    # Import on this thread: extension modules (numpy) are not safe to
+    # import for the first time from several threads at once
+    for name in list(pending):
+        try:
+            importlib.import_module(STAGES[name].module)
+        except Exception as e:
+            pending.remove(name)
+            results[name] = "error"
+            report(f"  ERROR: {name} (import failed: {type(e).__name__}: {e})")
+
+    with out, ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            for name in list(pending):
+                stage = STAGES[name]
+                deps = [d for d in stage.deps if d in selected]
+                if any(d in pending or d in running.values() for d in deps):
+                    continue
+                pending.remove(name)
+                blocked = [d for d in deps if results.get(d) in ("error", "blocked")
+                           or (results.get(d) == "failed" and not STAGES[d].check)]
+                if blocked:
+                    results[name] = "blocked"
+                    report(f"  BLOCKED: {name} (needs {', '.join(blocked)})")
+                    continue
+                key = stage.fingerprint(snapshot)
+                recorded = list(cache.entries.get(name, {}).get("outputs", {}))
+                if cache.is_fresh(name, key, recorded):
+                    status = cache.entries[name].get("info", {}).get("status", "ok")
+                    results[name] = status
+                    report(f"  {'CACHED' if status == 'ok' else 'FAILED (cached)'}: {name}")
+                    continue
+                # A fresh context per stage holds its output buffer
+                running[pool.submit(contextvars.Context().run, run_stage, stage, out)] = name
+
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                stage = STAGES[name]
+                status, seconds, output = future.result()
+                results[name] = status
+                snapshot.refresh(stage.outputs)
+                if status == "ok" or (status == "failed" and stage.check):
+                    outputs = [os.path.join(ROOT, p) for p in snapshot.select(compile_patterns(stage.outputs))] \
+                        if stage.outputs else []
+                    cache.record(name, stage.fingerprint(snapshot), outputs, info={"status": status})
+                    cache.save()
+                label = {"ok": "OK", "failed": "FAILED", "error": "ERROR"}[status]
+                report(f"  {label}: {name} ({seconds:.2f}s)", output if verbose or status != "ok" else "")
+    return results
+
+
+def describe_stages():
+    for stage in STAGES.values():
+        deps = f" after {', '.join(stage.deps)}" if stage.deps else ""
+        print(f"  {stage.name:<13} {stage.module}.py {' '.join(stage.argv)}{deps}")
+        print(f"                in:  {', '.join(stage.inputs + stage.listing)}")
+        if stage.outputs:
+            print(f"                out: {', '.join(stage.outputs)}")
+
+
+def run_build(names, cache, args):
+    t0 = time.perf_counter()
+    snapshot = Snapshot()
+    results = build(names, snapshot, cache, args.jobs, args.verbose)
+    bad = sorted(n for n, s in results.items() if s != "ok")
+    print(f"\nDone! {len(results) - len(bad)}/{len(results)} stage(s) OK in {time.perf_counter() - t0:.1f}s"
+          + (f"; not OK: {', '.join(bad)}" if bad else ""))
+    if imageload.CACHE is not None:
+        print(imageload.CACHE.summary())
+    return snapshot, not bad
+
+
+def watch(names, cache, args):
+    snapshot, _ = run_build(names, cache, args)
+    cache.force = False  # --force applies to the first build only
+    print(f"\nWatching for changes every {args.interval:g}s (Ctrl-C to stop)...")
+    try:
+        while True:
+            time.sleep(args.interval)
+            current = Snapshot()
+            changed = current.changed_since(snapshot)
+            if not changed:
+                continue
+            # Let a burst of writes (editor save, copy of many files) settle
+            while True:
+                time.sleep(args.interval)
+                settled = Snapshot()
+                if not settled.changed_since(current):
+                    break
+                current = settled
+            changed = current.changed_since(snapshot)
+            hit = [s.name for s in STAGES.values() if s.name in names and any(s.matches(p) for p in changed)]
+            print(f"\n{len(changed)} file(s) changed: {', '.join(changed[:5])}" + (" ..." if len(changed) > 5 else ""))
+            if not hit:
+                snapshot = current
+                print("  (no stage reads these)")
+                continue
+            snapshot, _ = run_build([n for n in downstream(hit) if n in names], cache, args)
+    except KeyboardInterrupt:
+        print("\nStopped watching")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the asset pipeline stages, skipping up-to-date ones.")
+    parser.add_argument("stages", nargs="*", metavar="STAGE",
+                        help=f"stages to build, with their dependencies (default: all of {', '.join(STAGES)})")
+    parser.add_argument("--jobs", type=int, default=min(4, os.cpu_count() or 1), help="stages run at once")
+    parser.add_argument("--force", action="store_true", help="run every selected stage even if fresh")
+    parser.add_argument("--verbose", "-v", action="store_true", help="show the output of successful stages too")
+    parser.add_argument("--watch", action="store_true", help="rebuild affected stages when files change")
+    parser.add_argument("--interval", type=float, default=1.0, help="--watch poll interval in seconds")
+    parser.add_argument("--cache-mb", type=int, default=256, help="shared decode cache size (default 256 MB)")
+    parser.add_argument("--list", action="store_true", help="describe the stages and exit")
+    args = parser.parse_args(argv)
+    unknown = [n for n in args.stages if n not in STAGES]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+
+    if args.list:
+        describe_stages()
+        return
+
+    names = list(args.stages) or list(STAGES)
+    imageload.enable_cache(args.cache_mb)
+    cache = BuildCache("build_assets", force=args.force)
+    if args.watch:
+        watch(with_dependencies(names), cache, args)
+        return
+    _, ok = run_build(names, cache, args)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
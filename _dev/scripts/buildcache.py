@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Persistent build cache shared by the _dev asset scripts.
+
+Each script gets one JSON file under _dev/.cache/. Entries are keyed by a
+hash of everything that affects an output (source content hash, crop box,
+encoder settings, ...), so unchanged outputs can be skipped on the next run.
+
+Source hashes are memoized on (size, mtime), so an unchanged file is not
+re-read just to prove it is unchanged.
+"""
+import hashlib
+import json
+import os
+
+import devtrace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CACHE_DIR = os.path.join(ROOT, "_dev", ".cache")
+
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's contents, read in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def make_key(**parts):
+    """Stable hash of the keyword arguments (must be JSON-serializable)."""
+    blob = json.dumps(parts, sort_keys=True, default=list)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _stat_sig(path):
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BuildCache:
+    """
+    JSON-backed cache of {entry_name: {"key": ..., "outputs": {...}}}.
+
+    Usage:
+        cache = BuildCache("crop_features")
+        key = make_key(src=cache.digest(src_path), box=box)
+        if not cache.is_fresh(out_name, key, [out_path]):
+            ... build ...
+            cache.record(out_name, key, [out_path])
+        cache.save()
+    """
+
+    def __init__(self, name, cache_dir=CACHE_DIR, force=False):
+        self.name = name
+        self.path = os.path.join(cache_dir, f"{name}.json")
+        self.force = force
+        self.hits = 0
+        self.misses = 0
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.entries = data.get("entries", {})
+        self.digests = data.get("digests", {})
+
+    def digest(self, path):
+        """Content hash of `path`, reusing the stored one if size/mtime match."""
+        sig = _stat_sig(path)
+        known = self.digests.get(path)
+        if known and known["stat"] == sig:
+            return known["sha256"]
+        with devtrace.span("digest", file=path, bytes_in=sig[0]):
+            sha = file_digest(path)
+        self.digests[path] = {"stat": sig, "sha256": sha}
+        return sha
+
+    def is_fresh(self, name, key, outputs=()):
+        """True if `name` was built with `key` and its outputs are untouched."""
+        entry = self.entries.get(name)
+        fresh = not self.force and entry is not None and entry["key"] == key
+        if fresh:
+            for out in outputs:
+                if not os.path.exists(out) or entry["outputs"].get(out) != _stat_sig(out):
+                    fresh = False
+                    break
+        self._tally(fresh)
+        return fresh
+
+    def get(self, name, key):
+        """Stored info for `name` if it was recorded with `key`, else None."""
+        entry = self.entries.get(name)
+        if not self.force and entry is not None and entry["key"] == key:
+            self._tally(True)
+            return entry.get("info")
+        self._tally(False)
+        return None
+
+    def _tally(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        devtrace.count(f"cache.{self.name}.{'hit' if hit else 'miss'}")
+
+    def record(self, name, key, outputs=(), info=None):
+        entry = {"key": key, "outputs": {out: _stat_sig(out) for out in outputs}}
+        if info is not None:
+            entry["info"] = info
+        self.entries[name] = entry
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"entries": self.entries, "digests": self.digests}, f, indent=1, sort_keys=True)
+        os.replace(tmp, self.path)
+
+    def summary(self):
+        return f"Cache: {self.hits} hit(s), {self.misses} miss(es)"
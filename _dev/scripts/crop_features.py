@@ -6,18 +6,80 @@ similar to how Apple crops their feature images on apple.com/ios.
 
 All source images are 1080x2376 (Android screenshots).
 Output: 1080x1200 crops focused on key UI areas, saved as high-quality JPEG.
+
+Outputs are tracked in a build cache (_dev/.cache/crop_features.json) keyed
+on the source file hash, crop box, target width and encoder settings, so
+unchanged crops are skipped. Pass --force to rebuild everything.
+
+With --variants a pyramid of widths (VARIANT_WIDTHS) is encoded as JPEG
+and WebP, plus a srcset.json manifest for <picture>/<img srcset> markup.
+
+Each source is decoded once, through imageload, at the JPEG scale the
+largest output needs: without --variants the 540px card only decodes the
+screenshot at half scale; with it, the card is resized from the same
+decode as the variants.
+
+Auto-crop: a CROPS entry whose box is None (or every entry, with --auto)
+gets its box from detect_ui_box(), which scores rows of a 1/8-scale
+grayscale copy by variance and edge density (status and nav bars
+excluded) and slides a fixed-size window over the cumulative profile.
+Detected boxes are cached per source hash.
+
+With --target-ssim the fixed encoder qualities are replaced by the lowest
+quality that still meets that SSIM against the resized card (the same
+search optimize_images.py runs on shipped images).
 """
 
-from PIL import Image, ImageDraw
+from PIL import Image, ImageDraw, features
+import argparse
+import json
 import os
+import re
+
+import numpy as np
 
-BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+import devtrace
+import imageload
+import optimize_images
+from buildcache import BuildCache, make_key
+
+BASE = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 SRC = os.path.join(BASE, "App Screenshots incomplete")
 OUT = os.path.join(BASE, "assets", "images", "feat-cards")
-os.makedirs(OUT, exist_ok=True)
+
+# Resize to a consistent width for web (540px wide = half of 1080, good for retina)
+TARGET_WIDTH = 540
+# Save as high-quality JPEG (no rounded corners in file - CSS handles that)
+JPEG_SETTINGS = {"format": "JPEG", "quality": 90, "optimize": True}
+
+# Responsive variants: widths largest first, one encoder per format
+VARIANT_WIDTHS = (1080, 810, 540, 270)
+VARIANT_FORMATS = {
+    "jpg": ("image/jpeg", JPEG_SETTINGS),
+    "webp": ("image/webp", {"format": "WEBP", "quality": 82, "method": 6}),
+}
+SRCSET_MANIFEST = os.path.join(OUT, "srcset.json")
+# File names variant_plan() gives variants ("feat-search-540w.webp"); other
+# scripts use this to skip generated files
+VARIANT_NAME = re.compile(r"-\d+w\.[a-z]+$", re.I)
+
+# Auto-crop window (full-res px), same shape as the pinned boxes below
+AUTO_SIZE = (1080, 1270)
+AUTO_DECODE_WIDTH = 135      # 1/8 JPEG scale of a 1080px screenshot
+STATUS_BAR = 80 / 2376       # fraction of the height excluded at the top
+NAV_BAR = 0.06               # ... and at the bottom (gesture / nav bar)
+EDGE_THRESHOLD = 12          # gray-level step that counts as an edge
+# Keyboards and map tiles are busy but rarely the point of a card; a broad
+# prior centred below the app header keeps the window on the main UI
+FOCUS_CENTER = 0.40
+FOCUS_SIGMA = 0.25
+# Windows within this fraction of the best score count as a tie; ties go to
+# the one centred nearest FOCUS_CENTER so small edits do not flip the crop
+TIE_TOLERANCE = 0.005
+AUTO_VERSION = "1"
 
 # Each entry: (filename, crop_box=(left, top, right, bottom), description)
-# Source images are 1080x2376
+# Source images are 1080x2376; a box of None is detected automatically
 CROPS = [
     # 1. Map with pinned location - show the map area with the pin
     # Top portion: status bar + map + pin marker
@@ -69,29 +131,263 @@ def add_rounded_corners(img, radius=40):
     img.putalpha(mask)
     return img
 
-for src_name, box, out_name in CROPS:
-    src_path = os.path.join(SRC, src_name)
-    out_path = os.path.join(OUT, out_name)
-    
-    if not os.path.exists(src_path):
-        print(f"  SKIP: {src_name} not found")
-        continue
-    
-    img = Image.open(src_path)
-    
-    # Crop to the specified region
-    cropped = img.crop(box)
-    
-    # Resize to a consistent width for web (540px wide = half of 1080, good for retina)
-    w, h = cropped.size
-    new_w = 540
-    new_h = int(h * (new_w / w))
-    resized = cropped.resize((new_w, new_h), Image.LANCZOS)
-    
-    # Save as high-quality JPEG (no rounded corners in file - CSS handles that)
+def _robust_norm(profile):
+    """Scale to 0..1 by the 95th percentile so one busy row cannot dominate."""
+    hi = np.percentile(profile, 95)
+    return np.clip(profile / hi, 0, 1) if hi > 0 else np.zeros_like(profile)
+
+
+def activity_profiles(gray):
+    """Per-row and per-column activity (variance + edge density), each 0..2."""
+    gy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    gx = np.abs(np.diff(gray, axis=1))[:-1]
+    edges = np.maximum(gx, gy) > EDGE_THRESHOLD
+    inner = gray[:-1, :-1]
+    rows = _robust_norm(inner.var(axis=1)) + _robust_norm(edges.mean(axis=1))
+    cols = _robust_norm(inner.var(axis=0)) + _robust_norm(edges.mean(axis=0))
+    return rows, cols
+
+
+def best_window(profile, size, lo=0, hi=None, center=None):
+    """
+    Start index of the `size`-long window in profile[lo:hi] with the largest
+    sum. With `center` (0..1), near-ties go to the window centred closest to it.
+    """
+    hi = len(profile) if hi is None else hi
+    size = max(1, min(size, hi - lo))
+    csum = np.cumsum(np.concatenate(([0.0], profile[lo:hi])))
+    sums = csum[size:] - csum[:-size]
+    if center is None:
+        return lo + int(np.argmax(sums))
+    near = np.flatnonzero(sums >= sums.max() * (1 - TIE_TOLERANCE))
+    offsets = np.abs((lo + near + size / 2) / len(profile) - center)
+    return lo + int(near[np.argmin(offsets)])
+
+
+@devtrace.traced("detect_ui_box")
+def detect_ui_box(src_path, size=AUTO_SIZE):
+    """Full-resolution (left, top, right, bottom) of the most UI-dense `size` window."""
+    img = imageload.open_image(src_path, size=(AUTO_DECODE_WIDTH, 1), mode="L")
+    full_w, full_h = img.info["full_size"]
+    if img.size[0] > 2 * AUTO_DECODE_WIDTH:
+        img = img.reduce(img.size[0] // AUTO_DECODE_WIDTH)
+    gray = np.asarray(img, dtype=np.float32)
+    h, w = gray.shape
+    sx, sy = w / full_w, h / full_h
+    win_w, win_h = min(size[0], full_w), min(size[1], full_h)
+
+    rows, cols = activity_profiles(gray)
+    ys = (np.arange(len(rows)) + 0.5) / len(rows)
+    rows = rows * np.exp(-0.5 * ((ys - FOCUS_CENTER) / FOCUS_SIGMA) ** 2)
+    lo, hi = int(np.ceil(len(rows) * STATUS_BAR)), int(len(rows) * (1 - NAV_BAR))
+    top = round(best_window(rows, round(win_h * sy), lo, hi, FOCUS_CENTER) / sy)
+    left = round(best_window(cols, round(win_w * sx), center=0.5) / sx) if win_w < full_w else 0
+
+    top, left = min(top, full_h - win_h), min(left, full_w - win_w)
+    return (left, top, left + win_w, top + win_h)
+
+
+def resolve_box(cache, src_path, box, auto=False):
+    """The pinned box, or a (cached) detected one if box is None or auto is set."""
+    if box is not None and not auto:
+        return box, False
+    key = make_key(
+        src=cache.digest(src_path), size=AUTO_SIZE, version=AUTO_VERSION,
+        params=[AUTO_DECODE_WIDTH, STATUS_BAR, NAV_BAR, EDGE_THRESHOLD, FOCUS_CENTER, FOCUS_SIGMA, TIE_TOLERANCE],
+    )
+    name = f"autobox:{os.path.basename(src_path)}"
+    detected = cache.get(name, key)
+    if detected is None:
+        detected = list(detect_ui_box(src_path))
+        cache.record(name, key, info=detected)
+    return tuple(detected), True
+
+
+def output_height(box, width):
+    return int((box[3] - box[1]) * (width / (box[2] - box[0])))
+
+
+def save_image(img, path, settings, target=None):
+    """Encode with `settings`, or at the lowest quality meeting `target` SSIM."""
+    if target is None:
+        img.save(path, **settings)
+        return
+    data, _, _ = optimize_images.encode_to_target(
+        img, target, max_quality=settings["quality"],
+        settings=dict(settings, progressive=True) if settings["format"] == "JPEG" else settings,
+    )
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def render_crop(region, out_path, size, target=None):
+    """Resize and encode one feature card from its cropped region."""
+    with devtrace.span("resize", file=out_path):
+        resized = region.resize(size, Image.LANCZOS)
+
     resized_rgb = resized.convert("RGB")
-    resized_rgb.save(out_path, "JPEG", quality=90, optimize=True)
-    
-    print(f"  OK: {src_name} -> {out_name} ({new_w}x{new_h})")
+    with devtrace.span("encode", file=out_path) as sp:
+        save_image(resized_rgb, out_path, JPEG_SETTINGS, target)
+        sp.add(bytes_out=os.path.getsize(out_path))
+
+
+def crop_key(cache, src_path, box, width=TARGET_WIDTH, target=None, decode_width=None):
+    """Everything that changes the encoded bytes of one crop."""
+    return make_key(
+        src=cache.digest(src_path), box=box, width=width,
+        decode="draft", resample="LANCZOS", encoder=JPEG_SETTINGS,
+        **({"target": target} if target else {}),
+        **({"decode_width": decode_width} if decode_width not in (None, width) else {}),
+    )
+
+
+def variant_formats():
+    """VARIANT_FORMATS minus anything this Pillow build cannot encode."""
+    return {ext: fmt for ext, fmt in VARIANT_FORMATS.items() if ext != "webp" or features.check("webp")}
+
+
+def variant_plan(box, out_name, widths=VARIANT_WIDTHS, formats=None):
+    """
+    [(width, height, ext, path)] for every variant of one crop.
+    Widths wider than the crop itself are dropped (never upscale); a crop
+    narrower than every width gets a single variant at its own width.
+    """
+    formats = variant_formats() if formats is None else formats
+    crop_w = box[2] - box[0]
+    stem = os.path.splitext(out_name)[0]
+    plan = []
+    for width in sorted({w for w in widths if w <= crop_w} or {crop_w}, reverse=True):
+        height = output_height(box, width)
+        for ext in formats:
+            plan.append((width, height, ext, os.path.join(OUT, f"{stem}-{width}w.{ext}")))
+    return plan
+
+
+@devtrace.traced("pyramid")
+def build_pyramid(cropped, sizes):
+    """
+    Resample `cropped` down to each (width, height) in `sizes` (largest first).
+    Each level is resampled from the previous one, so the full-resolution
+    crop is only filtered once.
+    """
+    levels = {}
+    current = cropped.convert("RGB")
+    for size in sizes:
+        if current.size != size:
+            current = current.resize(size, Image.LANCZOS)
+        levels[size[0]] = current
+    return levels
+
+
+def render_variants(region, plan, target=None):
+    """Encode every entry of `plan` from one decoded crop region."""
+    sizes = sorted({(w, h) for w, h, _, _ in plan}, reverse=True)
+    levels = build_pyramid(region, sizes)
+    formats = variant_formats()
+    for width, _, ext, path in plan:
+        with devtrace.span("encode", file=path) as sp:
+            save_image(levels[width], path, formats[ext][1], target)
+            sp.add(bytes_out=os.path.getsize(path))
+
+
+def variants_key(cache, src_path, box, plan, target=None):
+    return make_key(
+        src=cache.digest(src_path), box=box, decode="draft", resample="LANCZOS-pyramid",
+        variants=[(w, h, ext) for w, h, ext, _ in plan],
+        encoders={ext: fmt[1] for ext, fmt in variant_formats().items()},
+        **({"target": target} if target else {}),
+    )
+
+
+def srcset_entry(box, plan):
+    """Manifest entry: one srcset string per MIME type plus a fallback src."""
+    def rel(path):
+        return os.path.relpath(path, BASE).replace(os.sep, "/")
+
+    srcset = {}
+    for width, _, ext, path in sorted(plan):
+        mime = VARIANT_FORMATS[ext][0]
+        srcset.setdefault(mime, []).append(f"{rel(path)} {width}w")
+    # Fallback src: the smallest JPEG at least as wide as the legacy card
+    _, fallback = min(
+        ((w, p) for w, _, ext, p in plan if ext == "jpg" and w >= TARGET_WIDTH),
+        default=(plan[0][0], plan[0][3]),
+    )
+    return {
+        "width": box[2] - box[0],
+        "height": box[3] - box[1],
+        "src": rel(fallback),
+        "srcset": {mime: ", ".join(items) for mime, items in srcset.items()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crop screenshots into feature-card images.")
+    parser.add_argument("--force", action="store_true", help="ignore the build cache and re-encode every crop")
+    parser.add_argument("--variants", action="store_true",
+                        help=f"also emit {'/'.join(map(str, VARIANT_WIDTHS))}px JPEG+WebP variants and srcset.json")
+    parser.add_argument("--auto", action="store_true",
+                        help="detect every crop box instead of using the pinned ones")
+    parser.add_argument("--target-ssim", type=float, default=None,
+                        help="encode at the lowest quality meeting this SSIM (e.g. 0.98) instead of fixed quality")
+    args = parser.parse_args(argv)
+
+    os.makedirs(OUT, exist_ok=True)
+    cache = BuildCache("crop_features", force=args.force)
+    manifest = {}
+
+    for src_name, box, out_name in CROPS:
+        src_path = os.path.join(SRC, src_name)
+        out_path = os.path.join(OUT, out_name)
+
+        if not os.path.exists(src_path):
+            print(f"  SKIP: {src_name} not found")
+            continue
+
+        pinned = box
+        box, detected = resolve_box(cache, src_path, box, args.auto)
+        if detected:
+            print(f"  AUTO: {src_name} box {box}" + (f" (pinned {pinned})" if pinned else ""))
+
+        size = (TARGET_WIDTH, output_height(box, TARGET_WIDTH))
+        plan, vkey, variants_fresh = [], None, True
+        decode_size = size
+        if args.variants:
+            plan = variant_plan(box, out_name)
+            vkey = variants_key(cache, src_path, box, plan, args.target_ssim)
+            variants_fresh = cache.is_fresh(f"variants:{out_name}", vkey, [p for *_, p in plan])
+            manifest[out_name] = srcset_entry(box, plan)
+            # One decode serves the card and every variant, so it is sized
+            # for the largest; the card's key records that it came from it
+            decode_size = max(size, plan[0][:2])
+
+        key = crop_key(cache, src_path, box, target=args.target_ssim, decode_width=decode_size[0])
+        crop_fresh = cache.is_fresh(out_name, key, [out_path])
+
+        if crop_fresh and variants_fresh:
+            print(f"  CACHED: {src_name} -> {out_name}")
+            continue
+
+        region = imageload.open_region(src_path, box, decode_size)
+        if not crop_fresh:
+            render_crop(region, out_path, size, args.target_ssim)
+            cache.record(out_name, key, [out_path])
+            print(f"  OK: {src_name} -> {out_name} ({size[0]}x{size[1]})")
+        if not variants_fresh:
+            render_variants(region, plan, args.target_ssim)
+            cache.record(f"variants:{out_name}", vkey, [p for *_, p in plan])
+            print(f"  OK: {src_name} -> {len(plan)} variants")
+
+    cache.save()
+    print(f"\nDone! {len(CROPS)} crops in {OUT}")
+    if args.variants:
+        with open(SRCSET_MANIFEST, "w") as f:
+            json.dump(manifest, f, indent=2)
+            f.write("\n")
+        print(f"srcset manifest saved to {SRCSET_MANIFEST}")
+    print(f"{cache.summary()}")
+    print(imageload.STATS.summary())
+
 
-print(f"\nDone! {len(CROPS)} crops saved to {OUT}")
+if __name__ == "__main__":
+    devtrace.run(main)
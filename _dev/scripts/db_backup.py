@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+Streaming SQL dump / restore / verify, a companion to backup.php.
+
+backup.php builds the whole dump as an in-memory array (fetchAll per
+table), which runs into the shared host's memory limit once audit_logs
+and email_logs grow. This writes the same format — the header, SET lines,
+DROP/CREATE per table, INSERT INTO `t` (`cols`) VALUES ... — but streams
+it:
+
+  * rows are read with keyset pagination on the primary key
+    (WHERE pk > last ORDER BY pk LIMIT --page-rows), so memory is one
+    page no matter how large the table is; tables without a primary key
+    fall back to LIMIT/OFFSET
+  * rows are written as multi-row INSERTs of up to --batch-rows rows or
+    --max-statement-kb, so a restore stays under max_allowed_packet
+  * output ending in .gz is gzip-compressed as it is written
+  * after each table a `-- Checksum for `t`: N rows, sha256 ...` comment
+    records a hash of that table's row literals in key order
+
+Modes:
+    dump     database -> dump file
+    restore  dump file -> database (MySQL statements run as-is; for a
+             SQLite target the DDL is translated and rows are inserted
+             with parameters). Also restores backup.php dumps and the
+             lokalert_schema.sql seed, which makes a local stand-in.
+    verify   re-read a dump and check every table against its checksum
+             comment, plus against a database when one is given. A
+             backup.php dump has no checksums and quotes every value, so
+             it is compared with the database by value as text
+             (text_literal) rather than by typed literal
+
+Databases: --sqlite PATH (always available), or --mysql using pymysql
+(pip install pymysql) with LOKALERT_DB_HOST / LOKALERT_DB_NAME /
+LOKALERT_DB_USER / LOKALERT_DB_PASS (defaults as in includes/config.php).
+
+Usage:
+    python3 _dev/scripts/db_backup.py dump (--sqlite DB | --mysql) [-o backup.sql.gz]
+    python3 _dev/scripts/db_backup.py restore DUMP (--sqlite DB | --mysql)
+    python3 _dev/scripts/db_backup.py verify DUMP [--sqlite DB | --mysql]
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import devtrace
+import sqldump
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PAGE_ROWS = 1000
+BATCH_ROWS = 500
+MAX_STATEMENT_KB = 1024
+CHECKSUM_LINE = re.compile(r"-- Checksum for `(?P<table>\w+)`: (?P<rows>\d+) rows, sha256 (?P<sha>[0-9a-f]{64})")
+NUMBER = re.compile(r"[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\Z")
+
+# PDO::quote / mysql_real_escape_string escapes
+QUOTE_ESCAPES = str.maketrans({"\\": "\\\\", "'": "\\'", '"': '\\"', "\0": "\\0", "\n": "\\n", "\r": "\\r", "\x1a": "\\Z"})
+
+
+def sql_literal(value):
+    """
+    SQL literal for one value. Reading the literal back with sqldump gives
+    a value with the same literal, which is what the checksums rely on.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, sqldump.Keyword):
+        return str(value)
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "X'" + bytes(value).hex() + "'"
+    # str, plus datetime / Decimal / ... from MySQL, in their text form
+    return "'" + str(value).translate(QUOTE_ESCAPES) + "'"
+
+
+def text_literal(value):
+    """
+    Type-blind literal: NULL, or the value's text quoted, with numbers in
+    a canonical form ('1', 1 and 1.0 all give '1'; '2.50' gives '2.5').
+    Used to compare a backup.php dump, where PDO::quote turned every
+    value into a string, with the typed values in a database.
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = bytes(value).decode("utf-8", "surrogateescape")
+    elif isinstance(value, bool):
+        value = int(value)
+    text = str(value)
+    if NUMBER.match(text):
+        text = format(Decimal(text).normalize(), "f")
+    return "'" + text.translate(QUOTE_ESCAPES) + "'"
+
+
+def row_literal(values, literal=sql_literal):
+    return "(" + ", ".join(literal(v) for v in values) + ")"
+
+
+class TableChecksum:
+    def __init__(self):
+        self.rows = 0
+        self.hash = hashlib.sha256()
+
+    def add(self, literal):
+        self.rows += 1
+        self.hash.update(literal.encode("utf-8", "surrogateescape"))
+        self.hash.update(b"\n")
+
+    def line(self, table):
+        return f"-- Checksum for `{table}`: {self.rows} rows, sha256 {self.hash.hexdigest()}"
+
+
+# ---------------------------------------------------------------------------
+# Connections
+# ---------------------------------------------------------------------------
+
+class SqliteDatabase:
+    dialect = "SQLite"
+    mark = "?"
+
+    def __init__(self, path):
+        self.name = os.path.basename(path)
+        self.db = sqlite3.connect(path)
+
+    def close(self):
+        self.db.close()
+
+    def query(self, sql, params=()):
+        return self.db.execute(sql, params)
+
+    def tables(self):
+        return [r[0] for r in self.query(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+
+    def create_statement(self, table):
+        return self.query("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+
+    def primary_key(self, table):
+        info = self.query(f"PRAGMA table_info(`{table}`)").fetchall()
+        return [row[1] for row in sorted(info, key=lambda r: r[5]) if row[5]]
+
+    def restore(self, statements):
+        """Run a MySQL-format dump against SQLite; returns rows inserted."""
+        rows = 0
+        self.db.execute("PRAGMA foreign_keys = OFF")
+        with self.db:
+            for statement in statements:
+                parsed = sqldump.parse_insert(statement)
+                if parsed:
+                    table, columns, values = parsed
+                    ignore = " OR IGNORE" if re.match(r"INSERT\s+IGNORE", statement, re.I) else ""
+                    cols = f" ({', '.join(f'`{c}`' for c in columns)})" if columns else ""
+                    marks = ", ".join("?" * len(values[0])) if values else ""
+                    self.db.executemany(f"INSERT{ignore} INTO `{table}`{cols} VALUES ({marks})",
+                                        [tuple(sqlite_value(v) for v in row) for row in values])
+                    rows += len(values)
+                    continue
+                translated = mysql_to_sqlite(statement)
+                if translated:
+                    self.db.execute(translated)
+        return rows
+
+
+class MysqlDatabase:
+    dialect = "MySQL / MariaDB"
+    mark = "%s"
+
+    def __init__(self):
+        try:
+            import pymysql
+        except ImportError:
+            print("ERROR: --mysql needs pymysql (pip install pymysql)")
+            sys.exit(2)
+        self.name = os.environ.get("LOKALERT_DB_NAME", "lokalert_db")
+        self.db = pymysql.connect(
+            host=os.environ.get("LOKALERT_DB_HOST", "localhost"),
+            user=os.environ.get("LOKALERT_DB_USER", "root"),
+            password=os.environ.get("LOKALERT_DB_PASS", ""),
+            database=self.name,
+            charset="utf8mb4",
+        )
+
+    def close(self):
+        self.db.close()
+
+    def query(self, sql, params=()):
+        cursor = self.db.cursor()
+        cursor.execute(sql, params or None)
+        return cursor
+
+    def tables(self):
+        return [r[0] for r in self.query("SHOW TABLES")]
+
+    def create_statement(self, table):
+        return self.query(f"SHOW CREATE TABLE `{table}`").fetchone()[1]
+
+    def primary_key(self, table):
+        rows = self.query(f"SHOW KEYS FROM `{table}` WHERE Key_name = 'PRIMARY'").fetchall()
+        return [r[4] for r in sorted(rows, key=lambda r: r[3])]
+
+    def restore(self, statements):
+        rows = 0
+        self.db.autocommit(False)
+        for statement in statements:
+            self.query(statement)
+            if re.match(r"INSERT\b", statement, re.I):
+                rows += self.db.affected_rows()
+        self.db.commit()
+        return rows
+
+
+def connect(args):
+    if args.sqlite:
+        return SqliteDatabase(args.sqlite)
+    if args.mysql:
+        return MysqlDatabase()
+    return None
+
+
+def sqlite_value(value):
+    # Unquoted words in seed files (NOW(), CURRENT_TIMESTAMP, TRUE) have no
+    # parameter form; quoted text that happens to read "now()" is left alone
+    if isinstance(value, sqldump.Keyword):
+        word = value.upper()
+        if word in ("NOW()", "CURRENT_TIMESTAMP", "CURRENT_TIMESTAMP()"):
+            return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if word in ("TRUE", "FALSE"):
+            return int(word == "TRUE")
+    return value
+
+
+def split_top_level(body):
+    """Split a CREATE TABLE body on commas outside parentheses and quotes."""
+    parts, depth, start, quote = [], 0, 0, None
+    for i, ch in enumerate(body):
+        if quote:
+            if ch == quote and body[i - 1] != "\\":
+                quote = None
+        elif ch in "'\"`":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(body[start:i].strip())
+            start = i + 1
+    parts.append(body[start:].strip())
+    return [p for p in parts if p]
+
+
+def mysql_to_sqlite(statement):
+    """Best-effort MySQL -> SQLite DDL; None for statements SQLite has no use for (SET, ...)."""
+    head = statement.lstrip()[:20].upper()
+    if head.startswith(("SET ", "LOCK ", "UNLOCK ", "USE ", "CREATE DATABASE")):
+        return None
+    if not head.startswith("CREATE TABLE"):
+        return statement
+    open_at, close_at = statement.index("("), statement.rindex(")")
+    keep = []
+    for item in split_top_level(statement[open_at + 1:close_at]):
+        unique = re.match(r"UNIQUE\s+(?:INDEX|KEY)\s+`?\w+`?\s*(\(.*\))", item, re.I | re.S)
+        if unique:
+            keep.append("UNIQUE " + unique.group(1))
+            continue
+        if re.match(r"(FULLTEXT\s+|SPATIAL\s+)?(INDEX|KEY)\b", item, re.I):
+            continue  # secondary indexes are not part of SQLite's CREATE TABLE
+        item = re.sub(r"\bINT(?:\(\d+\))?\s+(?:NOT NULL\s+)?AUTO_INCREMENT\s+PRIMARY KEY",
+                      "INTEGER PRIMARY KEY AUTOINCREMENT", item, flags=re.I)
+        item = re.sub(r"\s+COMMENT\s+'(?:[^'\\]|\\.|'')*'", "", item, flags=re.I)
+        item = re.sub(r"\b(AUTO_INCREMENT|UNSIGNED|ON UPDATE CURRENT_TIMESTAMP(?:\(\))?)\b", "", item, flags=re.I)
+        item = re.sub(r"\b(CHARACTER SET|COLLATE)\s+\w+", "", item, flags=re.I)
+        item = re.sub(r"\bENUM\((?:[^()'\"]|'[^']*'|\"[^\"]*\")*\)", "TEXT", item, flags=re.I)
+        keep.append(item)
+    return statement[:open_at + 1] + "\n    " + ",\n    ".join(keep) + "\n)"
+
+
+# ---------------------------------------------------------------------------
+# Dump
+# ---------------------------------------------------------------------------
+
+def iter_pages(db, table, key, page_rows):
+    """Yield (columns, rows) pages of `table` in key order."""
+    last = None
+    offset = 0
+    while True:
+        if key:
+            order = ", ".join(f"`{c}`" for c in key)
+            where, params = "", ()
+            if last is not None:
+                where = f" WHERE ({order}) > ({', '.join([db.mark] * len(key))})"
+                params = last
+            cursor = db.query(f"SELECT * FROM `{table}`{where} ORDER BY {order} LIMIT {page_rows}", params)
+        else:
+            cursor = db.query(f"SELECT * FROM `{table}` LIMIT {page_rows} OFFSET {offset}")
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        columns = [d[0] for d in cursor.description]
+        yield columns, rows
+        if len(rows) < page_rows:
+            return
+        if key:
+            idx = [columns.index(c) for c in key]
+            last = tuple(rows[-1][i] for i in idx)
+        offset += len(rows)
+
+
+def dump_table(db, table, out, page_rows, batch_rows, max_bytes):
+    """Write one table's DROP/CREATE/INSERTs; returns its TableChecksum."""
+    out.write("-- -----------------------------------------------------------\n")
+    out.write(f"-- Table structure for `{table}`\n")
+    out.write("-- -----------------------------------------------------------\n")
+    out.write(f"DROP TABLE IF EXISTS `{table}`;\n")
+    out.write(db.create_statement(table) + ";\n\n")
+
+    key = db.primary_key(table)
+    if not key:
+        print(f"  WARNING: `{table}` has no primary key, paging with OFFSET")
+    checksum = TableChecksum()
+    batch, batch_bytes, head = [], 0, None
+
+    def flush():
+        if batch:
+            out.write(head + ",\n".join(batch) + ";\n")
+            batch.clear()
+
+    with devtrace.span("dump_table", table=table) as sp:
+        for columns, rows in iter_pages(db, table, key, page_rows):
+            if head is None:
+                out.write(f"-- Data for `{table}`\n")
+                head = f"INSERT INTO `{table}` (`" + "`, `".join(columns) + "`) VALUES\n"
+            for row in rows:
+                literal = row_literal(row)
+                checksum.add(literal)
+                if batch and (len(batch) >= batch_rows or batch_bytes + len(literal) > max_bytes):
+                    flush()
+                    batch_bytes = 0
+                batch.append(literal)
+                batch_bytes += len(literal) + 2
+        flush()
+        sp.add(rows=checksum.rows)
+    out.write(checksum.line(table) + "\n\n")
+    return checksum
+
+
+def dump(db, path, page_rows=PAGE_ROWS, batch_rows=BATCH_ROWS, max_bytes=MAX_STATEMENT_KB * 1024):
+    """Stream the whole database to `path` (.gz = compressed); returns {table: TableChecksum}."""
+    tmp = path + ".tmp"
+    opener = gzip.open if path.endswith(".gz") else open
+    checksums = {}
+    with opener(tmp, "wt", encoding="utf-8", errors="surrogateescape", newline="\n") as out:
+        out.write("\n".join([
+            "-- ============================================================",
+            "-- LokAlert Database Backup",
+            f"-- Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            f"-- DBMS: {db.dialect}",
+            f"-- Database: {db.name}",
+            "-- ============================================================",
+            "",
+            "SET FOREIGN_KEY_CHECKS = 0;",
+            'SET SQL_MODE = "NO_AUTO_VALUE_ON_ZERO";',
+            "", "",
+        ]))
+        for table in db.tables():
+            checksums[table] = dump_table(db, table, out, page_rows, batch_rows, max_bytes)
+            print(f"  OK: {table} ({checksums[table].rows} rows)")
+        out.write("SET FOREIGN_KEY_CHECKS = 1;\n\n-- End of backup\n")
+    os.replace(tmp, path)
+    return checksums
+
+
+# ---------------------------------------------------------------------------
+# Verify
+# ---------------------------------------------------------------------------
+
+def read_dump(path, literal=sql_literal):
+    """
+    Recompute per-table checksums from the INSERTs in a dump, alongside the
+    recorded ones. Returns (computed, recorded, complete).
+    """
+    computed, recorded = {}, {}
+    state = {"complete": False}
+
+    def lines(f):
+        for line in f:
+            if line.startswith("-- "):
+                m = CHECKSUM_LINE.match(line)
+                if m:
+                    recorded[m.group("table")] = (int(m.group("rows")), m.group("sha"))
+                elif line.startswith("-- End of backup"):
+                    state["complete"] = True
+            yield line
+
+    with sqldump.open_dump(path) as f, devtrace.span("verify_dump", file=path):
+        for statement in sqldump.iter_statements(lines(f)):
+            parsed = sqldump.parse_insert(statement)
+            if parsed:
+                table, _, rows = parsed
+                checksum = computed.setdefault(table, TableChecksum())
+                for row in rows:
+                    checksum.add(row_literal(row, literal))
+            elif re.match(r"CREATE TABLE", statement, re.I):
+                name = re.search(r"CREATE TABLE\s+(?:IF NOT EXISTS\s+)?`?(\w+)`?", statement, re.I).group(1)
+                computed.setdefault(name, TableChecksum())
+    return computed, recorded, state["complete"]
+
+
+def database_checksums(db, tables, page_rows=PAGE_ROWS, literal=sql_literal):
+    checksums = {}
+    for table in tables:
+        checksum = TableChecksum()
+        for _, rows in iter_pages(db, table, db.primary_key(table), page_rows):
+            for row in rows:
+                checksum.add(row_literal(row, literal))
+        checksums[table] = checksum
+    return checksums
+
+
+def verify(path, db=None):
+    """Print a per-table report; returns the number of problems found."""
+    try:
+        computed, recorded, complete = read_dump(path)
+        if not recorded and db:
+            # backup.php dump: every value quoted, so compare by text
+            computed, _, _ = read_dump(path, text_literal)
+    except (sqldump.DumpError, OSError, EOFError) as e:
+        print(f"  FAIL: cannot read dump: {e}")
+        return 1
+    literal = sql_literal if recorded else text_literal
+    live = database_checksums(db, [t for t in db.tables() if t in recorded or t in computed],
+                              literal=literal) if db else {}
+    problems = 0
+    if not complete:
+        print("  FAIL: no '-- End of backup' marker (truncated dump?)")
+        problems += 1
+    if not recorded:
+        print("  NOTE: no checksum comments (backup.php dump?); comparing values as text against the database")
+    for table in sorted(set(computed) | set(recorded)):
+        checksum = computed.get(table, TableChecksum())
+        got = (checksum.rows, checksum.hash.hexdigest())
+        issues = []
+        if recorded and recorded.get(table) != got:
+            want = recorded.get(table)
+            issues.append("no checksum recorded" if want is None else f"dump rows/hash differ from checksum ({want[0]} rows recorded)")
+        if db:
+            other = live.get(table)
+            if other is None:
+                issues.append("table missing in database")
+            elif (other.rows, other.hash.hexdigest()) != got:
+                issues.append(f"database differs ({other.rows} rows)")
+        if issues:
+            problems += 1
+            print(f"  FAIL: {table} ({got[0]} rows): " + "; ".join(issues))
+        else:
+            print(f"  OK: {table} ({got[0]} rows)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming, verifiable SQL dump and restore.")
+    parser.add_argument("mode", choices=["dump", "restore", "verify"])
+    parser.add_argument("dump_file", nargs="?", help="dump to restore or verify")
+    parser.add_argument("-o", "--output", help="dump output (.sql or .sql.gz)")
+    db_group = parser.add_mutually_exclusive_group()
+    db_group.add_argument("--sqlite", metavar="PATH", help="SQLite database (a local stand-in)")
+    db_group.add_argument("--mysql", action="store_true", help="MySQL/MariaDB via pymysql and LOKALERT_DB_* env vars")
+    parser.add_argument("--page-rows", type=int, default=PAGE_ROWS, help=f"rows per keyset page (default {PAGE_ROWS})")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS,
+                        help=f"max rows per INSERT (default {BATCH_ROWS})")
+    parser.add_argument("--max-statement-kb", type=int, default=MAX_STATEMENT_KB,
+                        help=f"max INSERT size, keep under max_allowed_packet (default {MAX_STATEMENT_KB})")
+    args = parser.parse_args()
+
+    db = connect(args)
+    if args.mode in ("dump", "restore") and db is None:
+        parser.error(f"{args.mode} needs --sqlite PATH or --mysql")
+    if args.mode in ("restore", "verify") and not args.dump_file:
+        parser.error(f"{args.mode} needs a dump file")
+
+    t0 = time.perf_counter()
+    try:
+        if args.mode == "dump":
+            output = args.output or os.path.join(
+                os.getcwd(), f"lokalert_backup_{datetime.now().strftime('%Y-%m-%d_%H%M%S')}.sql.gz")
+            checksums = dump(db, output, args.page_rows, args.batch_rows, args.max_statement_kb * 1024)
+            size = os.path.getsize(output)
+            print(f"\nDone! {len(checksums)} tables, {sum(c.rows for c in checksums.values())} rows, "
+                  f"{size / 1024:.0f} KB in {time.perf_counter() - t0:.1f}s -> {output}")
+        elif args.mode == "restore":
+            with sqldump.open_dump(args.dump_file) as f:
+                rows = db.restore(sqldump.iter_statements(f))
+            print(f"Done! Restored {rows} rows into {db.name} in {time.perf_counter() - t0:.1f}s")
+        else:
+            problems = verify(args.dump_file, db)
+            print(f"\n{'Done! Dump verified' if not problems else f'{problems} problem(s) found'}"
+                  + (f" against {db.name}" if db else ""))
+            if problems:
+                sys.exit(1)
+    finally:
+        if db:
+            db.close()
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
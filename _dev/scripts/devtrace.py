@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Lightweight spans, counters and profiling shared by the _dev scripts.
+
+    import devtrace
+
+    with devtrace.span("encode", file=out_path) as sp:
+        img.save(out_path)
+        sp.add(bytes_out=os.path.getsize(out_path))
+
+    @devtrace.traced("classify")
+    def classify(path): ...
+
+    devtrace.count("cache.crop_features.hit")
+
+    if __name__ == "__main__":
+        devtrace.run(main)
+
+Spans nest per thread and carry optional per-file arguments and byte
+counts. Nothing is recorded unless tracing is switched on:
+
+    LOKALERT_TRACE=trace.json     write Chrome trace-event JSON (chrome://tracing,
+                                  ui.perfetto.dev) and print the summary
+    LOKALERT_TRACE_SUMMARY=1      only print the summary table
+    LOKALERT_PROFILE=out.prof     run the whole script under cProfile and dump
+                                  the stats (view with python3 -m pstats)
+
+Thread pools in the scripts use devtrace.ThreadPool, whose tasks run in
+a copy of the submitting thread's contextvars (build_assets.py keeps each
+stage's output buffer in one).
+
+Worker processes inherit the environment; they can hand their spans back
+with drain() for the parent to merge(). A forked worker starts with an
+empty tracer, so only its own spans come back.
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+TRACE_PATH = os.environ.get("LOKALERT_TRACE")
+PROFILE_PATH = os.environ.get("LOKALERT_PROFILE")
+ENABLED = bool(TRACE_PATH or os.environ.get("LOKALERT_TRACE_SUMMARY") == "1")
+
+
+class Span:
+    """One timed region; use through span() rather than directly."""
+
+    __slots__ = ("name", "args", "start", "child_time")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.start = 0.0
+        self.child_time = 0.0
+
+    def add(self, **amounts):
+        """Accumulate numeric args, e.g. sp.add(bytes_in=n)."""
+        for key, value in amounts.items():
+            self.args[key] = self.args.get(key, 0) + value
+
+    def set(self, **values):
+        self.args.update(values)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def add(self, **amounts):
+        pass
+
+    def set(self, **values):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Tracer:
+    """Collects finished spans as Chrome "complete" events plus counters."""
+
+    def __init__(self):
+        self.events = []
+        self.counters = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Start empty, e.g. in a forked child that inherited the parent's events."""
+        self.__init__()
+
+    def _stack(self):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def begin(self, name, args):
+        sp = Span(name, args)
+        self._stack().append(sp)
+        sp.start = time.perf_counter()
+        return sp
+
+    def end(self, sp):
+        end = time.perf_counter()
+        stack = self._stack()
+        stack.pop()
+        dur = end - sp.start
+        if stack:
+            stack[-1].child_time += dur
+        event = {
+            "name": sp.name,
+            "ph": "X",
+            # perf_counter is system-wide monotonic, so worker processes line up
+            "ts": round(sp.start * 1e6, 1),
+            "dur": round(dur * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "self": round((dur - sp.child_time) * 1e6, 1),
+        }
+        if sp.args:
+            event["args"] = sp.args
+        with self._lock:
+            self.events.append(event)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def drain(self):
+        """Hand back (events, counters) recorded so far and forget them."""
+        with self._lock:
+            out = (self.events, self.counters)
+            self.events, self.counters = [], {}
+        return out
+
+    def merge(self, drained):
+        """Fold in what a worker process drain()ed."""
+        events, counters = drained
+        with self._lock:
+            self.events.extend(events)
+            for name, n in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + n
+
+    # -- output ----------------------------------------------------------------
+
+    def chrome_trace(self):
+        events = [{k: v for k, v in e.items() if k != "self"} for e in self.events]
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"counters": self.counters}}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary_rows(self):
+        """Per span name: count, total/self/max ms and byte totals, slowest first."""
+        rows = {}
+        for e in self.events:
+            row = rows.setdefault(e["name"], {"name": e["name"], "count": 0, "total": 0.0,
+                                              "self": 0.0, "max": 0.0, "bytes_in": 0, "bytes_out": 0})
+            row["count"] += 1
+            row["total"] += e["dur"] / 1000
+            row["self"] += e["self"] / 1000
+            row["max"] = max(row["max"], e["dur"] / 1000)
+            args = e.get("args", {})
+            row["bytes_in"] += args.get("bytes_in", 0)
+            row["bytes_out"] += args.get("bytes_out", 0)
+        return sorted(rows.values(), key=lambda r: -r["self"])
+
+    def slowest_files(self, limit=5):
+        with_file = [e for e in self.events if "file" in e.get("args", {})]
+        return sorted(with_file, key=lambda e: -e["dur"])[:limit]
+
+    def print_summary(self, out=sys.stderr):
+        if not self.events and not self.counters:
+            return
+        mb = 1024 * 1024
+        print("\n--- trace summary " + "-" * 52, file=out)
+        print(f"{'span':<28} {'count':>6} {'total ms':>10} {'self ms':>10} {'max ms':>9} {'in MB':>7} {'out MB':>7}", file=out)
+        for r in self.summary_rows():
+            print(f"{r['name'][:28]:<28} {r['count']:>6} {r['total']:>10.1f} {r['self']:>10.1f} "
+                  f"{r['max']:>9.1f} {r['bytes_in'] / mb:>7.1f} {r['bytes_out'] / mb:>7.1f}", file=out)
+        slow = self.slowest_files()
+        if slow:
+            print("Slowest files:", file=out)
+            for e in slow:
+                path = str(e["args"]["file"])
+                if os.path.isabs(path):
+                    path = os.path.relpath(path)
+                print(f"  {e['dur'] / 1000:>8.1f} ms  {e['name']:<16} {path}", file=out)
+        for name, n in sorted(self.counters.items()):
+            print(f"  {name}: {n}", file=out)
+
+
+TRACER = Tracer()
+# A forked pool worker would otherwise drain() a copy of everything the
+# parent had recorded (and could inherit _lock held by another thread)
+os.register_at_fork(after_in_child=TRACER.reset)
+
+
+def span(name, **args):
+    """Context manager timing a region; yields a Span (or a no-op when disabled)."""
+    if not ENABLED:
+        return _NullContext()
+    return _SpanContext(name, args)
+
+
+class _NullContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return NULL_SPAN
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _SpanContext:
+    __slots__ = ("name", "args", "sp")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.sp = TRACER.begin(self.name, self.args)
+        return self.sp
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.sp.args["error"] = exc_type.__name__
+        TRACER.end(self.sp)
+        return False
+
+
+def traced(name=None):
+    """Decorator form of span(); the span is named after the function by default."""
+    def decorate(fn):
+        label = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*a, **kw):
+            if not ENABLED:
+                return fn(*a, **kw)
+            with span(label):
+                return fn(*a, **kw)
+        return wrapper
+    return decorate
+
+
+class ThreadPool(ThreadPoolExecutor):
+    """ThreadPoolExecutor whose tasks run in a copy of the submitter's context."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def count(name, n=1):
+    if ENABLED:
+        TRACER.count(name, n)
+
+
+def drain():
+    return TRACER.drain()
+
+
+def merge(drained):
+    if ENABLED:
+        TRACER.merge(drained)
+
+
+def _report():
+    if TRACE_PATH:
+        TRACER.write_chrome_trace(TRACE_PATH)
+    if ENABLED:
+        TRACER.print_summary()
+        if TRACE_PATH:
+            print(f"Trace written to {TRACE_PATH} ({len(TRACER.events)} spans)", file=sys.stderr)
+
+
+def run(main, name=None):
+    """
+    Run a script's main() inside a root span, under cProfile if
+    LOKALERT_PROFILE is set, and write the trace/summary/profile on the
+    way out (including sys.exit()).
+    """
+    profiler = None
+    if PROFILE_PATH:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        with span(name or os.path.basename(sys.argv[0])):
+            return main()
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(PROFILE_PATH)
+            print(f"Profile written to {PROFILE_PATH}", file=sys.stderr)
+        _report()
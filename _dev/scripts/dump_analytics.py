@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Offline analytics over backup.php SQL dumps.
+
+The admin dashboard's download, login and audit statistics are live
+queries over download_logs, login_attempts and audit_logs, and get slower
+as those tables grow. This loads dumps into a local SQLite store
+(_dev/.cache/analytics.sqlite) and keeps precomputed rollups:
+
+    downloads_daily   downloads and bytes per version, day and status
+    failed_logins     failed login attempts per IP and --window minutes
+    audit_actions     audit events per table, action and day
+
+Dumps are streamed statement by statement (sqldump.py), so a dump is never
+held in memory. Loading is incremental: each source table has a
+high-water mark (largest id loaded), so a newer dump only adds its new
+rows to the rollups. login_attempts and audit_logs are append-only.
+download_logs rows change status after insert (started -> completed), so
+rows at or below the mark are compared with the stored copy and their
+old contribution is swapped for the new one. Loading the same dump
+twice changes nothing. Rows deleted upstream stay counted: the rollups
+are a history.
+
+Usage:
+    python3 _dev/scripts/dump_analytics.py DUMP [DUMP...] [--window 15]
+    python3 _dev/scripts/dump_analytics.py --report [--days 14] [--json]
+    python3 _dev/scripts/dump_analytics.py --rebuild
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+import devtrace
+import sqldump
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_DB = os.path.join(ROOT, "_dev", ".cache", "analytics.sqlite")
+# Same as the login_lockout_minutes default in the settings table
+DEFAULT_WINDOW = 15
+BATCH_SIZE = 5000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS download_logs (
+    id                INTEGER PRIMARY KEY,
+    user_id           INTEGER,
+    version_id        INTEGER,
+    status            TEXT,
+    bytes_downloaded  INTEGER,
+    started_at        TEXT,
+    completed_at      TEXT
+);
+CREATE TABLE IF NOT EXISTS login_attempts (
+    id            INTEGER PRIMARY KEY,
+    email         TEXT,
+    ip_address    TEXT,
+    attempted_at  TEXT,
+    success       INTEGER
+);
+CREATE TABLE IF NOT EXISTS audit_logs (
+    id          INTEGER PRIMARY KEY,
+    user_id     INTEGER,
+    action      TEXT,
+    table_name  TEXT,
+    record_id   INTEGER,
+    ip_address  TEXT,
+    created_at  TEXT
+);
+CREATE TABLE IF NOT EXISTS apk_versions (
+    id       INTEGER PRIMARY KEY,
+    version  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS downloads_daily (
+    version_id  INTEGER NOT NULL,   -- 0 = version deleted / unknown
+    day         TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    downloads   INTEGER NOT NULL,
+    bytes       INTEGER NOT NULL,
+    PRIMARY KEY (version_id, day, status)
+);
+CREATE TABLE IF NOT EXISTS failed_logins (
+    ip_address    TEXT NOT NULL,
+    window_start  TEXT NOT NULL,
+    failures      INTEGER NOT NULL,
+    PRIMARY KEY (ip_address, window_start)
+);
+CREATE TABLE IF NOT EXISTS audit_actions (
+    table_name  TEXT NOT NULL,      -- '' when the log row has none
+    action      TEXT NOT NULL,
+    day         TEXT NOT NULL,
+    events      INTEGER NOT NULL,
+    PRIMARY KEY (table_name, action, day)
+);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    table_name  TEXT PRIMARY KEY,
+    high_water  INTEGER NOT NULL,
+    updated_at  REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS loads (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    dump          TEXT NOT NULL,
+    generated     TEXT,
+    new_rows      INTEGER NOT NULL,
+    changed_rows  INTEGER NOT NULL,
+    loaded_at     REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  TEXT NOT NULL
+);
+"""
+
+# Source table -> stored columns (id first) and integer columns
+SOURCES = {
+    "download_logs": ("id", "user_id", "version_id", "status", "bytes_downloaded", "started_at", "completed_at"),
+    "login_attempts": ("id", "email", "ip_address", "attempted_at", "success"),
+    "audit_logs": ("id", "user_id", "action", "table_name", "record_id", "ip_address", "created_at"),
+}
+INT_COLUMNS = {"id", "user_id", "version_id", "bytes_downloaded", "success", "record_id"}
+# Tables whose existing rows can change between dumps
+MUTABLE = {"download_logs"}
+# Rollup -> (key columns, summed columns)
+ROLLUPS = {
+    "downloads_daily": (("version_id", "day", "status"), ("downloads", "bytes")),
+    "failed_logins": (("ip_address", "window_start"), ("failures",)),
+    "audit_actions": (("table_name", "action", "day"), ("events",)),
+}
+ROLLUP_SOURCE = {"downloads_daily": "download_logs", "failed_logins": "login_attempts", "audit_actions": "audit_logs"}
+
+
+def to_int(value):
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def normalize(table, row):
+    """Stored tuple for one dump row: only the columns we keep, ints converted."""
+    return tuple(
+        to_int(row.get(col)) if col in INT_COLUMNS else row.get(col)
+        for col in SOURCES[table]
+    )
+
+
+def window_start(timestamp, minutes):
+    """Start of the `minutes`-wide window containing a MySQL DATETIME string."""
+    try:
+        ts = datetime.strptime(timestamp[:19], "%Y-%m-%d %H:%M:%S")
+    except (TypeError, ValueError):
+        return timestamp or ""
+    slot = (ts.hour * 60 + ts.minute) // minutes * minutes
+    return ts.replace(hour=slot // 60, minute=slot % 60, second=0).strftime("%Y-%m-%d %H:%M")
+
+
+def contributions(table, record, window):
+    """[(rollup, key, values)] that one stored row adds to the rollups."""
+    row = dict(zip(SOURCES[table], record))
+    if table == "download_logs":
+        when = row["started_at"] or row["completed_at"] or ""
+        return [("downloads_daily", (row["version_id"] or 0, when[:10], row["status"] or "started"),
+                 (1, row["bytes_downloaded"] or 0))]
+    if table == "login_attempts":
+        if row["success"]:
+            return []
+        return [("failed_logins", (row["ip_address"] or "", window_start(row["attempted_at"], window)), (1,))]
+    if table == "audit_logs":
+        return [("audit_actions", (row["table_name"] or "", row["action"], (row["created_at"] or "")[:10]), (1,))]
+    return []
+
+
+class Analytics:
+    """
+    Usage:
+        with Analytics() as store:
+            store.load("lokalert_backup_2026-10-01.sql")
+            rows = store.downloads_per_version_day()
+    """
+
+    def __init__(self, path=DEFAULT_DB, window=None):
+        """`window` (minutes) defaults to the one the store was built with."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        stored = self.meta("failed_login_window")
+        self.window = window or int(stored or DEFAULT_WINDOW)
+        if stored is None:
+            self.set_meta("failed_login_window", self.window)
+        elif int(stored) != self.window:
+            # Windows of a different width cannot be merged; recount from raw rows
+            print(f"  Failed-login window changed ({stored} -> {self.window} min), rebuilding failed_logins",
+                  file=sys.stderr)
+            self.set_meta("failed_login_window", self.window)
+            self.rebuild(["failed_logins"])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.db.close()
+
+    def meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else None
+
+    def set_meta(self, key, value):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    def high_water(self, table):
+        row = self.db.execute("SELECT high_water FROM sync_state WHERE table_name = ?", (table,)).fetchone()
+        return row["high_water"] if row else 0
+
+    # -- loading ---------------------------------------------------------------
+
+    def _apply(self, deltas):
+        """Add a {(rollup, key): [sums]} batch to the rollup tables."""
+        by_rollup = {}
+        for (rollup, key), sums in deltas.items():
+            by_rollup.setdefault(rollup, []).append((*key, *sums))
+        for rollup, params in by_rollup.items():
+            keys, sums = ROLLUPS[rollup]
+            columns = ", ".join(keys + sums)
+            marks = ", ".join("?" * (len(keys) + len(sums)))
+            updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in sums)
+            self.db.executemany(
+                f"INSERT INTO {rollup} ({columns}) VALUES ({marks}) "
+                f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET {updates}",
+                params,
+            )
+        deltas.clear()
+
+    @staticmethod
+    def _add(deltas, contribs, sign=1):
+        for rollup, key, values in contribs:
+            sums = deltas.setdefault((rollup, key), [0] * len(values))
+            for i, v in enumerate(values):
+                sums[i] += sign * v
+
+    def load(self, path):
+        """Load one dump. Returns {table: (new rows, changed rows)}."""
+        marks = {table: self.high_water(table) for table in SOURCES}
+        seen_max = dict(marks)
+        stats = {table: [0, 0] for table in SOURCES}
+        deltas = {}
+        inserts = {table: [] for table in SOURCES}
+        pending = 0
+
+        def flush():
+            for table, records in inserts.items():
+                if records:
+                    cols = SOURCES[table]
+                    self.db.executemany(
+                        f"INSERT OR REPLACE INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                        records,
+                    )
+                    records.clear()
+            self._apply(deltas)
+
+        with self.db, devtrace.span("load_dump", file=path):
+            for table, row in sqldump.iter_rows(path, tables={*SOURCES, "apk_versions"}):
+                if table == "apk_versions":
+                    self.db.execute("INSERT OR REPLACE INTO apk_versions (id, version) VALUES (?, ?)",
+                                    (to_int(row["id"]), row.get("version")))
+                    continue
+                record = normalize(table, row)
+                row_id = record[0]
+                seen_max[table] = max(seen_max[table], row_id)
+                if row_id > marks[table]:
+                    stats[table][0] += 1
+                elif table in MUTABLE:
+                    stored = self.db.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone()
+                    if stored is not None and tuple(stored) == record:
+                        continue
+                    stats[table][1] += 1
+                    if stored is not None:
+                        self._add(deltas, contributions(table, tuple(stored), self.window), -1)
+                else:
+                    continue
+                self._add(deltas, contributions(table, record, self.window))
+                inserts[table].append(record)
+                pending += 1
+                if pending >= BATCH_SIZE:
+                    flush()
+                    pending = 0
+            flush()
+
+            now = time.time()
+            for table, mark in seen_max.items():
+                self.db.execute(
+                    "INSERT OR REPLACE INTO sync_state (table_name, high_water, updated_at) VALUES (?, ?, ?)",
+                    (table, mark, now),
+                )
+            self.db.execute(
+                "INSERT INTO loads (dump, generated, new_rows, changed_rows, loaded_at) VALUES (?, ?, ?, ?, ?)",
+                (os.path.abspath(path), sqldump.dump_header(path).get("Generated"),
+                 sum(s[0] for s in stats.values()), sum(s[1] for s in stats.values()), now),
+            )
+        for table, (new, changed) in stats.items():
+            devtrace.count(f"analytics.{table}.new", new)
+            devtrace.count(f"analytics.{table}.changed", changed)
+        return {table: tuple(s) for table, s in stats.items()}
+
+    def rebuild(self, rollups=None):
+        """Recompute rollups from the stored rows (after a --window change, or on demand)."""
+        rollups = rollups or list(ROLLUPS)
+        with self.db, devtrace.span("rebuild_rollups"):
+            for rollup in rollups:
+                self.db.execute(f"DELETE FROM {rollup}")
+                table = ROLLUP_SOURCE[rollup]
+                deltas = {}
+                for stored in self.db.execute(f"SELECT {', '.join(SOURCES[table])} FROM {table}"):
+                    self._add(deltas, [c for c in contributions(table, tuple(stored), self.window) if c[0] == rollup])
+                    if len(deltas) >= BATCH_SIZE:
+                        self._apply(deltas)
+                self._apply(deltas)
+
+    # -- reports ---------------------------------------------------------------
+
+    def downloads_per_version_day(self, since=None, status="completed"):
+        return self.db.execute(
+            """SELECT COALESCE(v.version, '#' || d.version_id) AS version, d.day, d.downloads, d.bytes
+               FROM downloads_daily d LEFT JOIN apk_versions v ON v.id = d.version_id
+               WHERE d.status = ? AND d.day >= ?
+               ORDER BY d.day DESC, version""",
+            (status, since or ""),
+        ).fetchall()
+
+    def failed_logins_per_ip(self, since=None, limit=20):
+        return self.db.execute(
+            """SELECT ip_address, SUM(failures) AS failures, MAX(failures) AS worst_window,
+                      COUNT(*) AS windows, MAX(window_start) AS last_window
+               FROM failed_logins WHERE window_start >= ?
+               GROUP BY ip_address ORDER BY failures DESC, ip_address LIMIT ?""",
+            (since or "", limit),
+        ).fetchall()
+
+    def audit_actions_per_table(self, since=None):
+        return self.db.execute(
+            """SELECT table_name, action, SUM(events) AS events
+               FROM audit_actions WHERE day >= ?
+               GROUP BY table_name, action ORDER BY table_name, events DESC""",
+            (since or "",),
+        ).fetchall()
+
+    def report(self, since=None):
+        return {
+            "since": since,
+            "failed_login_window_minutes": self.window,
+            "high_water": {table: self.high_water(table) for table in SOURCES},
+            "downloads_per_version_day": [dict(r) for r in self.downloads_per_version_day(since)],
+            "failed_logins_per_ip": [dict(r) for r in self.failed_logins_per_ip(since)],
+            "audit_actions_per_table": [dict(r) for r in self.audit_actions_per_table(since)],
+        }
+
+
+def print_report(report):
+    print(f"Since {report['since'] or 'the first dump'}; high-water marks: "
+          + ", ".join(f"{t}={m}" for t, m in report["high_water"].items()))
+
+    print("\nCompleted downloads per version per day:")
+    for r in report["downloads_per_version_day"]:
+        print(f"  {r['day']}  {r['version']:<10} {r['downloads']:>6}  {r['bytes'] / 1e6:>9.1f} MB")
+
+    print(f"\nFailed logins per IP ({report['failed_login_window_minutes']} min windows):")
+    for r in report["failed_logins_per_ip"]:
+        print(f"  {r['ip_address']:<40} {r['failures']:>6} total, worst window {r['worst_window']}, "
+              f"last {r['last_window']}")
+
+    print("\nAudit actions per table:")
+    for r in report["audit_actions_per_table"]:
+        print(f"  {r['table_name'] or '-':<20} {r['action']:<30} {r['events']:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load backup.php dumps into a local analytics store.")
+    parser.add_argument("dumps", nargs="*", help=".sql or .sql.gz dumps, oldest first")
+    parser.add_argument("--db", default=DEFAULT_DB, help="analytics database")
+    parser.add_argument("--window", type=int, default=None,
+                        help=f"failed-login window in minutes (default: as stored, else {DEFAULT_WINDOW})")
+    parser.add_argument("--rebuild", action="store_true", help="recompute all rollups from the stored rows")
+    parser.add_argument("--report", action="store_true", help="print the rollups")
+    parser.add_argument("--days", type=int, default=None, help="limit the report to the last N days")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    if not (args.dumps or args.rebuild or args.report):
+        parser.print_usage()
+        sys.exit(2)
+
+    with Analytics(args.db, window=args.window) as store:
+        for path in args.dumps:
+            if not os.path.exists(path):
+                print(f"  SKIP: {path} not found")
+                continue
+            t0 = time.perf_counter()
+            stats = store.load(path)
+            summary = ", ".join(f"{t} +{new}" + (f" ~{changed}" if changed else "") for t, (new, changed) in stats.items())
+            print(f"  OK: {os.path.basename(path)} ({summary}) in {time.perf_counter() - t0:.2f}s")
+
+        if args.rebuild:
+            store.rebuild()
+            print("  OK: rollups rebuilt")
+
+        if args.report:
+            since = None
+            if args.days:
+                since = datetime.fromtimestamp(time.time() - args.days * 86400).strftime("%Y-%m-%d")
+            report = store.report(since)
+            if args.json:
+                print(json.dumps(report, indent=2))
+            else:
+                print()
+                print_report(report)
+        elif args.dumps:
+            print(f"\nDone! Analytics store at {os.path.relpath(args.db, ROOT)}")
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Find duplicate and near-duplicate images in the asset library.
+
+Each image is hashed once (64-bit DCT pHash + gradient dHash from a
+reduced-scale thumbnail) in a single streaming pass; hashes are kept in
+_dev/.cache/find_duplicates.json keyed by content hash, so later runs only
+hash new or changed files. Near-duplicates are found with a BK-tree over
+the pHashes (sub-quadratic lookups), confirmed with the dHash, and grouped
+into clusters with the bytes that could be saved by keeping one copy.
+
+Responsive variants written by crop_features.py --variants (*-540w.webp
+etc.) are intentional copies and are skipped unless --include-variants.
+
+Usage:
+    python3 _dev/scripts/find_duplicates.py [folders...] [--phash-distance 6]
+        [--dhash-distance 8] [--include-variants] [--json PATH]
+"""
+import argparse
+import json
+import os
+
+import devtrace
+import image_features
+from crop_features import VARIANT_NAME
+from buildcache import BuildCache, make_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_FOLDERS = [
+    os.path.join(ROOT, "assets", "images"),
+    os.path.join(ROOT, "App Screenshots incomplete"),
+]
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+HASH_VERSION = "1"
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit integer hashes with Hamming distance."""
+
+    def __init__(self):
+        self.root = None
+
+    @staticmethod
+    def distance(a, b):
+        return bin(a ^ b).count("1")
+
+    def add(self, value, item):
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            d = self.distance(value, node[0])
+            if d == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [item], {}]
+                return
+            node = child
+
+    def query(self, value, radius):
+        """All (distance, item) within `radius` of `value`."""
+        found = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            d = self.distance(value, node[0])
+            if d <= radius:
+                found.extend((d, item) for item in node[1])
+            # Triangle inequality: only children in [d - r, d + r] can match
+            for edge, child in node[2].items():
+                if d - radius <= edge <= d + radius:
+                    stack.append(child)
+        return found
+
+
+def iter_images(folders, include_variants=False):
+    for folder in folders:
+        for dirpath, _, filenames in os.walk(folder):
+            for name in sorted(filenames):
+                if not name.lower().endswith(IMAGE_EXTS):
+                    continue
+                if not include_variants and VARIANT_NAME.search(name):
+                    continue
+                yield os.path.join(dirpath, name)
+
+
+def hash_images(paths, cache):
+    """Yield (path, record) one image at a time, hashing only cache misses."""
+    for path in paths:
+        key = make_key(src=cache.digest(path), version=HASH_VERSION)
+        record = cache.get(path, key)
+        if record is None:
+            with devtrace.span("hash", file=path):
+                rgb, (w, h), _ = image_features.load_thumbnail(path)
+                gray = image_features.grayscale(rgb)
+                record = {
+                    "phash": image_features.phash(gray),
+                    "dhash": image_features.dhash(gray),
+                    "width": w,
+                    "height": h,
+                }
+            cache.record(path, key, info=record)
+        yield path, dict(record, bytes=os.path.getsize(path))
+
+
+@devtrace.traced("find_clusters")
+def find_clusters(records, phash_distance=6, dhash_distance=8):
+    """Group near-identical images (union-find over BK-tree matches)."""
+    tree = BKTree()
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for path, rec in records.items():
+        parent[path] = path
+        value = int(rec["phash"], 16)
+        for _, other in tree.query(value, phash_distance):
+            if image_features.hamming(rec["dhash"], records[other]["dhash"]) <= dhash_distance:
+                parent[find(path)] = find(other)
+        tree.add(value, path)
+
+    groups = {}
+    for path in records:
+        groups.setdefault(find(path), []).append(path)
+
+    clusters = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        # Keep the largest-resolution copy; the rest are potential savings
+        members.sort(key=lambda p: (-records[p]["width"] * records[p]["height"], -records[p]["bytes"], p))
+        keep = members[0]
+        clusters.append({
+            "keep": keep,
+            "duplicates": [
+                {
+                    "path": p,
+                    "bytes": records[p]["bytes"],
+                    "phash_distance": image_features.hamming(records[keep]["phash"], records[p]["phash"]),
+                }
+                for p in members[1:]
+            ],
+            "savings_bytes": sum(records[p]["bytes"] for p in members[1:]),
+        })
+    clusters.sort(key=lambda c: -c["savings_bytes"])
+    return clusters
+
+
+def rel(path):
+    return os.path.relpath(path, ROOT).replace(os.sep, "/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find duplicate and near-duplicate images.")
+    parser.add_argument("folders", nargs="*", default=DEFAULT_FOLDERS, help="folders to scan (recursive)")
+    parser.add_argument("--phash-distance", type=int, default=6, help="max pHash bit distance (default 6)")
+    parser.add_argument("--dhash-distance", type=int, default=8, help="max dHash bit distance (default 8)")
+    parser.add_argument("--include-variants", action="store_true", help="also compare generated -NNNw variants")
+    parser.add_argument("--json", default=None, help="also write the cluster report as JSON")
+    args = parser.parse_args()
+
+    cache = BuildCache("find_duplicates")
+    records = dict(hash_images(iter_images(args.folders, args.include_variants), cache))
+    cache.save()
+    print(f"Hashed {len(records)} images ({cache.summary()})\n")
+
+    clusters = find_clusters(records, args.phash_distance, args.dhash_distance)
+    total = sum(c["savings_bytes"] for c in clusters)
+    for i, cluster in enumerate(clusters, 1):
+        print(f"  Cluster {i}: keep {rel(cluster['keep'])}")
+        for dup in cluster["duplicates"]:
+            print(f"    ~ {rel(dup['path'])} ({dup['bytes'] / 1024:.0f} KB, distance {dup['phash_distance']})")
+        print(f"    potential savings: {cluster['savings_bytes'] / 1024:.0f} KB")
+
+    print(f"\nDone! {len(clusters)} cluster(s), {total / 1024:.0f} KB potential savings")
+
+    if args.json:
+        report = {
+            "clusters": [
+                dict(c, keep=rel(c["keep"]), duplicates=[dict(d, path=rel(d["path"])) for d in c["duplicates"]])
+                for c in clusters
+            ],
+            "savings_bytes": total,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report saved to {args.json}")
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
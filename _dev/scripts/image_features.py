@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Vectorized colour statistics and perceptual hashes for one image.
+
+Everything is computed with NumPy from a single 64x64 RGB thumbnail
+(decoded at reduced JPEG scale through imageload): channel means, HSV
+histograms, dominant colours via a small k-means, sky / vegetation /
+night heuristics and a 64-bit DCT perceptual hash (plus a gradient
+dHash for duplicate detection).
+
+Used by the pil-basic backend of validate_images.py and by
+find_duplicates.py.
+"""
+import numpy as np
+from PIL import Image
+
+import devtrace
+import imageload
+
+THUMB_SIZE = 64
+HUE_BINS = 12
+SV_BINS = 8
+KMEANS_K = 4
+KMEANS_ITERS = 8
+
+
+def load_thumbnail(path, size=THUMB_SIZE, stats=imageload.STATS):
+    """(size x size x 3 uint8 array, full (w, h), original mode)."""
+    img = imageload.open_image(path, size=(size, size), mode=None, stats=stats)
+    mode = img.mode
+    thumb = img.convert("RGB").resize((size, size))
+    return np.asarray(thumb), img.info["full_size"], mode
+
+
+def rgb_to_hsv(rgb):
+    """uint8 (..., 3) RGB -> float (..., 3) HSV with hue in degrees, s/v in 0..1."""
+    rgb = rgb.astype(np.float32) / 255.0
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    delta = maxc - minc
+    safe = np.where(delta == 0, 1.0, delta)
+    hue = np.select(
+        [delta == 0, maxc == r, maxc == g],
+        [0.0, ((g - b) / safe) % 6, (b - r) / safe + 2],
+        default=(r - g) / safe + 4,
+    ) * 60.0
+    sat = np.where(maxc == 0, 0.0, delta / np.where(maxc == 0, 1.0, maxc))
+    return np.stack([hue, sat, maxc], axis=-1)
+
+
+def dominant_colors(pixels, k=KMEANS_K, iters=KMEANS_ITERS):
+    """
+    Tiny deterministic k-means over (N, 3) RGB pixels.
+    Returns [(hex colour, share of pixels)] largest cluster first.
+    """
+    pixels = pixels.astype(np.float32)
+    # Seed from luminance quantiles so results are repeatable
+    order = np.argsort(pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32))
+    centers = pixels[order[np.linspace(0, len(order) - 1, k).astype(int)]]
+    for _ in range(iters):
+        dist = ((pixels[:, None, :] - centers[None, :, :]) ** 2).sum(axis=-1)
+        assign = dist.argmin(axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, assign, pixels)
+        nonempty = counts > 0
+        centers[nonempty] = sums[nonempty] / counts[nonempty, None]
+    shares = counts / counts.sum()
+    ranked = np.argsort(-shares)
+    return [
+        ("#%02x%02x%02x" % tuple(int(round(c)) for c in centers[i]), float(shares[i]))
+        for i in ranked if shares[i] > 0
+    ]
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0] /= np.sqrt(2.0)
+    return m
+
+
+_DCT32 = _dct_matrix(32)
+
+
+def grayscale(rgb):
+    return rgb.astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def block_mean(gray, size):
+    """Downscale a square array by averaging equal blocks (size must divide it)."""
+    f = gray.shape[0] // size
+    return gray.reshape(size, f, size, f).mean(axis=(1, 3))
+
+
+def phash(gray):
+    """64-bit DCT perceptual hash (hex) of a square grayscale array >= 32px."""
+    small = block_mean(gray, 32) if gray.shape[0] != 32 else gray
+    low = (_DCT32 @ small @ _DCT32.T)[:8, :8].ravel()
+    # Median excludes the DC term, which only encodes overall brightness
+    bits = low > np.median(low[1:])
+    return "%016x" % int("".join("1" if b else "0" for b in bits), 2)
+
+
+def dhash(gray):
+    """64-bit difference hash (hex): sign of horizontal gradients on a 9x8 grid."""
+    small = np.asarray(Image.fromarray(gray.astype(np.float32), mode="F").resize((9, 8), Image.BOX))
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return "%016x" % int("".join("1" if b else "0" for b in bits), 2)
+
+
+def hamming(a, b):
+    """Bit distance between two hex hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+@devtrace.traced("color_features")
+def color_features(rgb):
+    """All colour statistics for a square uint8 RGB thumbnail, in one pass."""
+    hsv = rgb_to_hsv(rgb)
+    hue, sat, val = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    means = rgb.reshape(-1, 3).mean(axis=0)
+    top = slice(0, rgb.shape[0] // 3)
+
+    # Heuristic masks
+    blue_sky = (hue >= 190) & (hue <= 250) & (sat > 0.15) & (val > 0.35)
+    overcast = (sat < 0.12) & (val > 0.7)
+    warm_sky = ((hue <= 45) | (hue >= 330)) & (sat > 0.35) & (val > 0.45)
+    vegetation = (hue >= 70) & (hue <= 170) & (sat > 0.2) & (val > 0.15)
+    # Point lights get averaged down in a 64px thumbnail, so "lit" is modest
+    lit = val > 0.55
+
+    return {
+        "mean_rgb": [float(c) for c in means],
+        "brightness": float(means.mean()),
+        "hue_hist": (np.histogram(hue[sat > 0.1], bins=HUE_BINS, range=(0, 360))[0] / hue.size).tolist(),
+        "sat_hist": (np.histogram(sat, bins=SV_BINS, range=(0, 1))[0] / sat.size).tolist(),
+        "val_hist": (np.histogram(val, bins=SV_BINS, range=(0, 1))[0] / val.size).tolist(),
+        "dominant": dominant_colors(rgb.reshape(-1, 3)),
+        "sky": float((blue_sky | overcast)[top].mean()),
+        "sunset": float(warm_sky[top].mean()),
+        "vegetation": float(vegetation.mean()),
+        "dark_fraction": float((val < 0.25).mean()),
+        "lit_fraction": float(lit.mean()),
+        "phash": phash(grayscale(rgb)),
+    }
+
+
+def feature_labels(features):
+    """Turn color_features() into (label, confidence) pairs."""
+    labels = []
+    brightness = features["brightness"]
+    if brightness < 80:
+        labels.append(("dark_scene", 0.8))
+    elif brightness > 180:
+        labels.append(("bright_scene", 0.8))
+
+    # Night: mostly dark, but with some point lights
+    if features["dark_fraction"] > 0.5 and features["lit_fraction"] > 0.01:
+        labels.append(("night", min(1.0, features["dark_fraction"])))
+        labels.append(("light", min(1.0, features["lit_fraction"] * 10)))
+    if features["sunset"] > 0.25:
+        labels.append(("sunset", min(1.0, features["sunset"] * 1.5)))
+        labels.append(("evening", min(1.0, features["sunset"])))
+    if features["sky"] > 0.35:
+        labels.append(("sky", min(1.0, features["sky"])))
+        labels.append(("outdoor", min(1.0, features["sky"])))
+    if features["vegetation"] > 0.25:
+        labels.append(("vegetation", min(1.0, features["vegetation"] * 1.5)))
+
+    for color, share in features["dominant"][:3]:
+        labels.append((f"dominant_{color}", share))
+    labels.append((f"brightness_{brightness:.0f}", 1.0))
+    labels.append((f"phash_{features['phash']}", 1.0))
+    return labels
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Reduced-resolution image loading shared by the _dev image scripts.
+
+JPEGs can be decoded at 1/2, 1/4 or 1/8 scale straight from the DCT
+coefficients (PIL's Image.draft), which is far cheaper than decoding at
+full size and resizing afterwards. Callers say how many pixels they
+actually need and get the smallest decode that still covers it.
+
+Every decode is tallied in a DecodeStats so scripts can report what the
+reduced decode saved. Pixel buffer sizes are exact; to also time a full
+decode of every file for comparison, set LOKALERT_DECODE_BASELINE=1.
+
+enable_cache() turns on a process-wide LRU of decoded images keyed by the
+source (path and content hash) and mode. A miss decodes the whole file,
+the largest any build_assets.py stage asks for (analyze_face --batch reads
+every image at full size), and each request is served by downscaling
+that to the size its reduced-scale decode would have had. So every stage
+of a run shares one decode per file. Callers get their own copy.
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+import devtrace
+from buildcache import file_digest
+
+MEASURE_BASELINE = os.environ.get("LOKALERT_DECODE_BASELINE") == "1"
+
+
+class DecodeStats:
+    """Running totals of decoded vs. full-size pixels and decode time (thread-safe)."""
+
+    def __init__(self):
+        self.files = 0
+        self.full_bytes = 0
+        self.decoded_bytes = 0
+        self.peak_full = 0
+        self.peak_decoded = 0
+        self.seconds = 0.0
+        self.baseline_seconds = 0.0
+        self.cache_hits = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes send their stats back pickled; the lock stays behind
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add(self, full_size, decoded_size, bands, seconds, baseline_seconds=0.0):
+        full = full_size[0] * full_size[1] * bands
+        decoded = decoded_size[0] * decoded_size[1] * bands
+        with self.lock:
+            self.files += 1
+            self.full_bytes += full
+            self.decoded_bytes += decoded
+            self.peak_full = max(self.peak_full, full)
+            self.peak_decoded = max(self.peak_decoded, decoded)
+            self.seconds += seconds
+            self.baseline_seconds += baseline_seconds
+
+    def add_hit(self):
+        with self.lock:
+            self.cache_hits += 1
+
+    def merge(self, other):
+        """Fold in totals from another DecodeStats (e.g. from a worker process)."""
+        with self.lock:
+            self.files += other.files
+            self.full_bytes += other.full_bytes
+            self.decoded_bytes += other.decoded_bytes
+            self.peak_full = max(self.peak_full, other.peak_full)
+            self.peak_decoded = max(self.peak_decoded, other.peak_decoded)
+            self.seconds += other.seconds
+            self.baseline_seconds += other.baseline_seconds
+            self.cache_hits += other.cache_hits
+
+    def summary(self):
+        if not self.files:
+            return "Decode: no images decoded"
+        mb = 1024 * 1024
+        line = (
+            f"Decode: {self.files} image(s), {self.decoded_bytes / mb:.1f} MB of "
+            f"{self.full_bytes / mb:.1f} MB pixels decoded in {self.seconds:.3f}s; "
+            f"peak buffer {self.peak_decoded / mb:.1f} MB "
+            f"(saved {(self.peak_full - self.peak_decoded) / mb:.1f} MB)"
+        )
+        if self.baseline_seconds:
+            line += f"; full decode took {self.baseline_seconds:.3f}s (saved {self.baseline_seconds - self.seconds:.3f}s)"
+        if self.cache_hits:
+            line += f"; {self.cache_hits} served from the decode cache"
+        return line
+
+
+STATS = DecodeStats()
+
+
+def _buffer_bytes(img):
+    return img.size[0] * img.size[1] * len(img.getbands())
+
+
+def _fit(img, size):
+    """A copy of cached `img` at `size` (what a reduced-scale decode would give)."""
+    if img.size == size:
+        return img.copy()
+    # BOX averages like the reduced-scale JPEG decode it stands in for
+    return img.resize(size, Image.BOX)
+
+
+class DecodeCache:
+    """
+    Thread-safe LRU of decoded images, bounded by pixel-buffer bytes.
+    One entry per source and mode, holding the largest decode put().
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.downscaled = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._digests = {}
+
+    def key(self, path, mode):
+        """(path, content hash, mode); the hash is computed once per size/mtime."""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        sig = (path, st.st_size, st.st_mtime_ns)
+        with self.lock:
+            digest = self._digests.get(sig)
+        if digest is None:
+            digest = file_digest(path)
+            with self.lock:
+                self._digests[sig] = digest
+        return path, digest, mode
+
+    def get(self, key, size):
+        """A copy of the cached decode at `size`, or None if there is none that large."""
+        with self.lock:
+            img = self.items.get(key)
+            if img is None or img.size[0] < size[0] or img.size[1] < size[1]:
+                self.misses += 1
+                return None
+            self.items.move_to_end(key)
+            self.hits += 1
+            if img.size != size:
+                self.downscaled += 1
+        devtrace.count("decode_cache.hit")
+        return _fit(img, size)
+
+    def put(self, key, img):
+        size = _buffer_bytes(img)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.get(key)
+            if old is not None:
+                if old.size[0] >= img.size[0] and old.size[1] >= img.size[1]:
+                    return
+                del self.items[key]
+                self.bytes -= _buffer_bytes(old)
+            self.items[key] = img
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.bytes -= _buffer_bytes(evicted)
+
+    def summary(self):
+        return (f"Decode cache: {self.hits} hit(s) ({self.downscaled} downscaled), {self.misses} miss(es), "
+                f"{len(self.items)} image(s) / {self.bytes / (1024 * 1024):.1f} MB held")
+
+
+CACHE = None
+
+
+def enable_cache(max_mb=256):
+    """Share decodes across callers in this process (see module docstring)."""
+    global CACHE
+    if CACHE is None:
+        CACHE = DecodeCache(max_mb * 1024 * 1024)
+    return CACHE
+
+
+def _time_full_decode(path):
+    start = time.perf_counter()
+    with Image.open(path) as img:
+        img.load()
+    return time.perf_counter() - start
+
+
+def _load(img, path, full_size, mode, stats):
+    """load() (at whatever scale draft() picked), convert and record the decode."""
+    with devtrace.span("decode", file=path) as sp:
+        start = time.perf_counter()
+        img.load()
+        elapsed = time.perf_counter() - start
+        sp.add(bytes_in=os.path.getsize(path), bytes_out=_buffer_bytes(img))
+    baseline = 0.0
+    if MEASURE_BASELINE:
+        baseline = _time_full_decode(path) if img.size != full_size else elapsed
+    if mode and img.mode != mode:
+        img = img.convert(mode)
+    stats.add(full_size, img.size, len(img.getbands()), elapsed, baseline)
+    return img
+
+
+def _decode(img, path, request, mode, stats):
+    """draft() towards `request` (w, h), load (or take from CACHE), and record the decode."""
+    full_size = img.size
+    if request:
+        # draft() only picks the DCT scale; img.size is now what load() gives
+        img.draft(mode, (max(1, request[0]), max(1, request[1])))
+    if CACHE is None:
+        img = _load(img, path, full_size, mode, stats)
+    else:
+        key = CACHE.key(path, mode or img.mode)
+        size = img.size
+        cached = CACHE.get(key, size)
+        if cached is None:
+            # Decode the whole file once; this and every later request is cut from it
+            full = _load(Image.open(path) if size != full_size else img, path, full_size, mode, stats)
+            CACHE.put(key, full)
+            img = _fit(full, size)
+        else:
+            stats.add_hit()
+            img = cached
+    # Callers mapping coordinates back to the original need the full size
+    img.info["full_size"] = full_size
+    return img
+
+
+def open_image(path, size=None, mode="RGB", stats=STATS):
+    """
+    Decode `path` at the smallest JPEG scale that is still at least `size`
+    (w, h). With size=None the image is decoded at full resolution.
+    Non-JPEG files are always decoded at full size. The original size is
+    kept in img.info["full_size"].
+    """
+    return _decode(Image.open(path), path, size, mode, stats)
+
+
+def open_max_side(path, max_side=None, mode="RGB", stats=STATS):
+    """Decode so the longer side is (at least) `max_side` pixels."""
+    img = Image.open(path)
+    request = None
+    if max_side:
+        w, h = img.size
+        ratio = min(1.0, max_side / max(w, h))
+        request = (math.ceil(w * ratio), math.ceil(h * ratio))
+    return _decode(img, path, request, mode, stats)
+
+
+def open_region(path, box, size=None, mode="RGB", stats=STATS):
+    """
+    Return the `box` region of `path` (box in full-resolution pixels).
+
+    If `size` is given, the source is decoded at the smallest scale where
+    the region is still at least `size` pixels, and the box is scaled to
+    match. The result may therefore be smaller than the box itself.
+    (Pillow cannot stop a JPEG decode early, so the region is cut after
+    the reduced-scale decode rather than read on its own.)
+    """
+    img = Image.open(path)
+    full_w, full_h = img.size
+    request = None
+    if size:
+        box_w, box_h = box[2] - box[0], box[3] - box[1]
+        request = (math.ceil(size[0] * full_w / box_w), math.ceil(size[1] * full_h / box_h))
+    img = _decode(img, path, request, mode, stats)
+    sx, sy = img.size[0] / full_w, img.size[1] / full_h
+    return img.crop((round(box[0] * sx), round(box[1] * sy), round(box[2] * sx), round(box[3] * sy)))
+
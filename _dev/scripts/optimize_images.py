@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+"""
+Recompress shipped JPEG/PNG images at the lowest quality that still
+matches the original.
+
+For each JPEG, encoder quality is binary-searched between --min-quality
+and --max-quality for the lowest setting whose decoded result still has
+SSIM >= --target against the current image. The score is SSIM on luma
+(8x8 windows, NumPy summed-area tables) pooled per 64px tile, taking the
+1st-percentile tile: like butteraugli's max-norm, it is driven by the
+worst region, so ringing around text in a screenshot is not averaged
+away by flat background. Output is progressive, optimized and
+stripped of EXIF/XMP/comments (EXIF orientation is applied first; ICC
+profiles are kept so colours do not shift). PNGs are re-saved with
+optimize=True, and palette quantization is used when the fewest colours
+meeting the target are found; alpha has to meet the target as well.
+
+A file is only replaced when the result is at least --min-savings
+smaller. Nothing is written without --write; the per-image savings go to
+a JSON report either way. Images are processed across a process pool and
+results are cached by content hash in _dev/.cache.
+
+Every file written is recorded with the sha256 of its new bytes in
+_dev/scripts/optimized_images.json, which is committed with the images.
+A file whose content still matches its ledger entry is never recompressed
+(not on a fresh clone and not with --force, which only drops the cache),
+so lossy output does not lose quality again on every run. Use
+--reoptimize to ignore the ledger.
+
+Generated feature-card variants are skipped by default (crop_features.py
+owns them; use its --target-ssim instead) unless --include-generated.
+
+Usage:
+    python3 _dev/scripts/optimize_images.py [folders...] [--target 0.98]
+        [--jobs N] [--write] [--report PATH] [--include-generated] [--reoptimize]
+"""
+import argparse
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# crop_features imports this module too; only use its names at call time
+import crop_features
+import devtrace
+from buildcache import BuildCache, file_digest, make_key
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_FOLDERS = [os.path.join(ROOT, "assets", "images")]
+DEFAULT_REPORT = os.path.join(ROOT, "_dev", "scripts", "optimize_report.json")
+DEFAULT_LEDGER = os.path.join(ROOT, "_dev", "scripts", "optimized_images.json")
+GENERATED_DIR = os.path.join(ROOT, "assets", "images", "feat-cards")
+JPEG_EXTS = (".jpg", ".jpeg")
+PNG_EXTS = (".png",)
+OPTIMIZER_VERSION = "1"
+
+DEFAULT_TARGET = 0.98
+SSIM_WINDOW = 8
+SSIM_TILE = 64
+SSIM_PERCENTILE = 1
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
+
+# ---------------------------------------------------------------------------
+# SSIM
+# ---------------------------------------------------------------------------
+
+def _box_mean(plane, k):
+    """Mean over every k x k window (valid positions only), via a summed-area table."""
+    table = np.zeros((plane.shape[0] + 1, plane.shape[1] + 1), dtype=np.float64)
+    np.cumsum(plane, axis=1, out=table[1:, 1:])
+    np.cumsum(table[1:, 1:], axis=0, out=table[1:, 1:])
+    return (table[k:, k:] - table[:-k, k:] - table[k:, :-k] + table[:-k, :-k]) / (k * k)
+
+
+def ssim_map(a, b, window=SSIM_WINDOW):
+    """Per-window SSIM of two same-shaped 2-D arrays (0..255)."""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    if min(a.shape) < window:
+        window = max(1, min(a.shape))
+    mu_a, mu_b = _box_mean(a, window), _box_mean(b, window)
+    var_a = _box_mean(a * a, window) - mu_a * mu_a
+    var_b = _box_mean(b * b, window) - mu_b * mu_b
+    cov = _box_mean(a * b, window) - mu_a * mu_b
+    num = (2 * mu_a * mu_b + SSIM_C1) * (2 * cov + SSIM_C2)
+    den = (mu_a * mu_a + mu_b * mu_b + SSIM_C1) * (var_a + var_b + SSIM_C2)
+    return num / den
+
+
+def ssim(a, b, window=SSIM_WINDOW, tile=SSIM_TILE, percentile=SSIM_PERCENTILE):
+    """Low-percentile tile mean of the SSIM map; plain mean for small images."""
+    smap = ssim_map(a, b, window)
+    rows, cols = smap.shape[0] // tile, smap.shape[1] // tile
+    if rows * cols < 4:
+        return float(smap.mean())
+    tiles = smap[:rows * tile, :cols * tile].reshape(rows, tile, cols, tile).mean(axis=(1, 3))
+    return float(np.percentile(tiles, percentile))
+
+
+def luma(img):
+    return np.asarray(img.convert("L"), dtype=np.float32)
+
+
+def similarity(reference, candidate):
+    """Pooled SSIM on luma, and on alpha too when the reference has one (the lower wins)."""
+    score = ssim(luma(reference), luma(candidate))
+    if "A" in reference.getbands():
+        alpha = candidate.convert("RGBA").getchannel("A")
+        score = min(score, ssim(np.asarray(reference.getchannel("A")), np.asarray(alpha)))
+    return score
+
+
+# ---------------------------------------------------------------------------
+# Encoders
+# ---------------------------------------------------------------------------
+
+def jpeg_settings(quality, icc_profile=None):
+    settings = {"format": "JPEG", "quality": quality, "optimize": True, "progressive": True}
+    if icc_profile:
+        settings["icc_profile"] = icc_profile
+    return settings
+
+
+def encode(img, settings):
+    if settings["format"] == "JPEG":
+        # Pillow writes img.info["comment"] as a COM segment unless one is given
+        settings = {"comment": b"", **settings}
+    buf = io.BytesIO()
+    img.save(buf, **settings)
+    return buf.getvalue()
+
+
+def search_lowest(lo, hi, passes):
+    """
+    Smallest value in [lo, hi] for which passes(value) is true, assuming
+    higher values pass more easily. Returns (value, result) or (None, None).
+    """
+    best = (None, None)
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        ok, result = passes(mid)
+        if ok:
+            best = (mid, result)
+            hi = mid - 1
+        else:
+            lo = mid + 1
+    return best
+
+
+def encode_to_target(img, target=DEFAULT_TARGET, min_quality=40, max_quality=95, settings=None):
+    """
+    Encode `img` at the lowest quality whose decode has SSIM >= target.
+    `settings` is a PIL save() dict with a "quality" key (JPEG or WebP);
+    defaults to progressive JPEG. Returns (bytes, quality, ssim); falls
+    back to max_quality if nothing in range meets the target.
+    """
+    base = dict(settings or jpeg_settings(max_quality))
+    reference = img.convert("RGB") if base["format"] == "JPEG" else img
+
+    def passes(quality):
+        data = encode(reference, dict(base, quality=quality))
+        with devtrace.span("ssim"):
+            score = similarity(reference, Image.open(io.BytesIO(data)))
+        return score >= target, (data, score)
+
+    quality, result = search_lowest(min_quality, max_quality, passes)
+    if quality is None:
+        quality = max_quality
+        data = encode(reference, dict(base, quality=quality))
+        result = (data, similarity(reference, Image.open(io.BytesIO(data))))
+    return result[0], quality, result[1]
+
+
+def optimize_jpeg(img, target, min_quality, max_quality):
+    settings = jpeg_settings(max_quality, img.info.get("icc_profile"))
+    data, quality, score = encode_to_target(img, target, min_quality, max_quality, settings)
+    return data, {"quality": quality, "ssim": round(score, 5)}
+
+
+def optimize_png(img, target):
+    """Lossless optimize, or the fewest-colour palette that still meets the target."""
+    icc = img.info.get("icc_profile")
+    settings = {"format": "PNG", "optimize": True, **({"icc_profile": icc} if icc else {})}
+    lossless = encode(img, settings)
+    best = (lossless, {"colors": None, "ssim": 1.0})
+    if img.mode == "P":
+        return best
+    method = Image.Quantize.FASTOCTREE if "A" in img.getbands() else Image.Quantize.MEDIANCUT
+
+    def passes(colors):
+        quantized = img.quantize(colors=colors, method=method)
+        score = similarity(img, quantized.convert(img.mode))
+        return score >= target, (quantized, score)
+
+    colors, result = search_lowest(16, 256, passes)
+    if colors is not None:
+        data = encode(result[0], settings)
+        if len(data) < len(lossless):
+            best = (data, {"colors": colors, "ssim": round(result[1], 5)})
+    return best
+
+
+def optimize_file(path, target=DEFAULT_TARGET, min_quality=40, max_quality=95):
+    """Process-pool worker: (path, optimized bytes, record, trace)."""
+    with devtrace.span("optimize", file=path) as sp:
+        original = os.path.getsize(path)
+        with Image.open(path) as src:
+            src.load()
+            img = ImageOps.exif_transpose(src)
+            img.info.setdefault("icc_profile", src.info.get("icc_profile"))
+        if path.lower().endswith(JPEG_EXTS):
+            data, record = optimize_jpeg(img, target, min_quality, max_quality)
+        else:
+            data, record = optimize_png(img, target)
+        sp.add(bytes_in=original, bytes_out=len(data))
+    record.update(width=img.size[0], height=img.size[1], original_bytes=original, optimized_bytes=len(data))
+    return path, data, record, devtrace.drain()
+
+
+# ---------------------------------------------------------------------------
+# Driver
+# ---------------------------------------------------------------------------
+
+def iter_images(folders, include_generated=False):
+    for folder in folders:
+        for dirpath, _, filenames in os.walk(folder):
+            if not include_generated and os.path.abspath(dirpath).startswith(GENERATED_DIR):
+                continue
+            for name in sorted(filenames):
+                if not name.lower().endswith(JPEG_EXTS + PNG_EXTS):
+                    continue
+                if not include_generated and crop_features.VARIANT_NAME.search(name):
+                    continue
+                yield os.path.join(dirpath, name)
+
+
+def write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def rel(path):
+    return os.path.relpath(path, ROOT).replace(os.sep, "/")
+
+
+def load_ledger(path):
+    """{relpath: {"sha256": ..., "record": {...}}} for files this script has written."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_ledger(path, ledger):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(dict(sorted(ledger.items())), f, indent=1)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompress images at the lowest quality meeting an SSIM target.")
+    parser.add_argument("folders", nargs="*", default=DEFAULT_FOLDERS, help="folders to scan (recursive)")
+    parser.add_argument("--target", type=float, default=DEFAULT_TARGET, help=f"minimum SSIM (default {DEFAULT_TARGET})")
+    parser.add_argument("--min-quality", type=int, default=40, help="lowest JPEG quality to try (default 40)")
+    parser.add_argument("--max-quality", type=int, default=95, help="highest JPEG quality to try (default 95)")
+    parser.add_argument("--min-savings", type=float, default=0.02,
+                        help="only replace a file if it shrinks by at least this fraction (default 0.02)")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--write", action="store_true", help="replace the originals (default: report only)")
+    parser.add_argument("--report", default=DEFAULT_REPORT, help="JSON savings report")
+    parser.add_argument("--include-generated", action="store_true", help="also process feat-cards outputs")
+    parser.add_argument("--force", action="store_true", help="ignore cached results")
+    parser.add_argument("--ledger", default=DEFAULT_LEDGER, help="committed record of optimized files")
+    parser.add_argument("--reoptimize", action="store_true",
+                        help="recompress files the ledger marks as already optimized")
+    args = parser.parse_args()
+
+    cache = BuildCache("optimize_images", force=args.force)
+    settings = dict(target=args.target, min_quality=args.min_quality, max_quality=args.max_quality,
+                    version=OPTIMIZER_VERSION)
+    paths = list(iter_images(args.folders, args.include_generated))
+    keys = {p: make_key(src=cache.digest(p), **settings) for p in paths}
+
+    ledger = load_ledger(args.ledger)
+    report = {}
+    todo = []
+    for path in paths:
+        written = ledger.get(rel(path))
+        if written and not args.reoptimize and written["sha256"] == file_digest(path):
+            # This file is already the optimizer's own output
+            report[rel(path)] = dict(written["record"], action="already optimized")
+            continue
+        cached = cache.get(path, keys[path])
+        if cached is None:
+            todo.append(path)
+        elif not args.write or cached["action"] != "would replace":
+            report[rel(path)] = dict(cached["record"], action=cached["action"])
+        else:
+            todo.append(path)
+
+    print(f"Found {len(paths)} images, {len(todo)} to optimize (target SSIM {args.target})...")
+    jobs = args.jobs or os.cpu_count() or 1
+    work = [(p, args.target, args.min_quality, args.max_quality) for p in todo]
+    if jobs == 1 or len(todo) < 2:
+        results = [optimize_file(*w) for w in work]
+    else:
+        # spawn, not fork: a forked child can inherit a lock another thread held
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context("spawn")) as pool:
+            results = list(pool.map(optimize_file, *zip(*work))) if work else []
+
+    for path, data, record, trace in results:
+        devtrace.merge(trace)
+        saved = record["original_bytes"] - record["optimized_bytes"]
+        worth_it = saved >= record["original_bytes"] * args.min_savings
+        if not worth_it:
+            action = "kept"
+        elif args.write:
+            write_atomic(path, data)
+            action = "replaced"
+        else:
+            action = "would replace"
+        record["saved_bytes"] = saved if worth_it else 0
+        report[rel(path)] = dict(record, action=action)
+        cache.record(path, keys[path], info={"record": record, "action": action})
+        if action == "replaced":
+            ledger[rel(path)] = {"sha256": hashlib.sha256(data).hexdigest(), "record": record}
+        detail = f"q{record['quality']}" if "quality" in record else (
+            f"{record['colors']} colours" if record.get("colors") else "lossless")
+        print(f"  {action.upper() if action != 'kept' else 'KEEP'}: {rel(path)} "
+              f"{record['original_bytes'] / 1024:.0f} KB -> {record['optimized_bytes'] / 1024:.0f} KB "
+              f"({detail}, SSIM {record['ssim']})")
+    cache.save()
+    if any(r["action"] == "replaced" for r in report.values()):
+        save_ledger(args.ledger, ledger)
+        print(f"Ledger updated: {rel(args.ledger)} (commit it with the images)")
+
+    total_in = sum(r["original_bytes"] for r in report.values())
+    saved = sum(r.get("saved_bytes", 0) for r in report.values() if r["action"] != "would replace")
+    pending = sum(r.get("saved_bytes", 0) for r in report.values() if r["action"] == "would replace")
+    with open(args.report, "w") as f:
+        json.dump({"target_ssim": args.target, "images": dict(sorted(report.items())),
+                   "original_bytes": total_in, "saved_bytes": saved, "pending_bytes": pending}, f, indent=2)
+    print(f"\nDone! Saved {saved / 1024:.0f} KB of {total_in / 1024:.0f} KB"
+          + (f", {pending / 1024:.0f} KB more with --write" if pending else "") + f"; {cache.summary()}")
+    print(f"Report saved to {rel(args.report)}")
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Page-weight and critical-path budget check for the site's HTML pages.
+
+Each page is parsed once with validate_html.HtmlAudit, every local asset
+it loads (stylesheets, scripts, images, video, plus url() references in
+inline and linked CSS) is resolved on disk, and transfer bytes are summed
+per page: raw, gzip (level 6, as a typical server) and brotli. Text
+assets are counted compressed, media as-is. Brotli sizes need the
+optional `brotli` package; without it they are estimated from gzip.
+
+Also flagged:
+  - render-blocking requests: stylesheets and synchronous scripts in <head>
+  - images wider than their displayed size times --dpr. The displayed
+    width is the width attribute, else the first "display_widths" entry
+    in the budget file matching the image (".class" or a path glob such
+    as "App Screenshots incomplete/*"), else --display-width
+
+<img srcset> and <picture><source srcset> count the one candidate a
+browser would fetch at that displayed width (the `sizes` attribute wins
+when it gives px or vw), and only the first <source> of a <picture>.
+
+Budgets come from _dev/scripts/page_budgets.json ("default" plus
+per-page overrides) or --budget FILE; --set NAME=VALUE overrides a single
+limit. Exits 1 if any page is over budget.
+
+Usage:
+    python3 _dev/scripts/page_budget.py [page.html ...] [--budget FILE]
+        [--set total_kb=900] [--display-width 1440] [--dpr 1] [--json]
+"""
+import argparse
+import fnmatch
+import functools
+import glob
+import gzip
+import json
+import os
+import re
+import sys
+from urllib.parse import unquote, urlsplit
+
+from PIL import Image
+
+import devtrace
+import validate_html
+
+ROOT = validate_html.ROOT
+BUDGET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_budgets.json")
+
+# Limits are in KB of transfer size, or plain counts
+DEFAULT_BUDGET = {
+    "total_kb": 1500,
+    "critical_kb": 150,
+    "html_kb": 60,
+    "style_kb": 60,
+    "script_kb": 80,
+    "image_kb": 1200,
+    "render_blocking": 3,
+    "oversized_images": 0,
+}
+
+CATEGORIES = {
+    ".css": "style",
+    ".js": "script", ".mjs": "script",
+    ".jpg": "image", ".jpeg": "image", ".png": "image", ".webp": "image",
+    ".avif": "image", ".gif": "image", ".svg": "image", ".ico": "image",
+    ".mp4": "media", ".webm": "media", ".mp3": "media",
+    ".woff": "font", ".woff2": "font", ".ttf": "font",
+}
+COMPRESSIBLE = {".html", ".css", ".js", ".mjs", ".svg", ".json", ".txt", ".md", ".xml"}
+RASTER = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".avif"}
+# Typical brotli-11 vs gzip-6 ratio on minified-ish HTML/CSS/JS
+BROTLI_ESTIMATE = 0.82
+OVERSIZE_TOLERANCE = 1.1
+# The unconditional (last) entry of a sizes attribute, e.g. "(max-width: 600px) 100vw, 320px"
+SIZES_LENGTH = re.compile(r"^\s*(\d+(?:\.\d+)?)(px|vw)\s*$")
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def compressed_sizes(data, ext):
+    """(gzip bytes, brotli bytes, brotli_estimated) for one payload."""
+    if ext not in COMPRESSIBLE:
+        return len(data), len(data), False
+    gz = len(gzip.compress(data, compresslevel=6, mtime=0))
+    if brotli is not None:
+        return gz, len(brotli.compress(data, quality=11)), False
+    return gz, round(gz * BROTLI_ESTIMATE), True
+
+
+@functools.lru_cache(maxsize=None)
+def asset_info(path):
+    """Sizes (and intrinsic dimensions for rasters) of one file, once per run."""
+    ext = os.path.splitext(path)[1].lower()
+    if not os.path.isfile(path):
+        return {"exists": False, "raw": 0, "gzip": 0, "brotli": 0, "brotli_estimated": False, "size": None}
+    with devtrace.span("compress", file=path) as sp:
+        with open(path, "rb") as f:
+            data = f.read()
+        gz, br, estimated = compressed_sizes(data, ext)
+        sp.add(bytes_in=len(data), bytes_out=gz)
+    size = None
+    if ext in RASTER:
+        try:
+            with Image.open(path) as img:
+                size = img.size
+        except OSError:
+            pass
+    css_urls = []
+    if ext == ".css":
+        text = data.decode("utf-8", "replace")
+        css_urls = [u for u in validate_html.CSS_URL.findall(text) if validate_html.is_local_url(u)]
+    return {
+        "exists": True, "raw": len(data), "gzip": gz, "brotli": br,
+        "brotli_estimated": estimated, "size": size, "css_urls": css_urls,
+    }
+
+
+def resolve(base_dir, url):
+    return os.path.normpath(os.path.join(base_dir, unquote(urlsplit(url).path)))
+
+
+def rel(path):
+    return os.path.relpath(path, ROOT).replace(os.sep, "/")
+
+
+def display_width(resource, path, default, overrides):
+    """CSS px the image is shown at: width attribute, then display_widths, then the default."""
+    try:
+        return int(str(resource["width"]).strip().rstrip("px"))
+    except (TypeError, ValueError):
+        pass
+    classes = (resource.get("class") or "").split()
+    for pattern, width in overrides.items():
+        if pattern.startswith(".") and pattern[1:] in classes:
+            return width
+        if fnmatch.fnmatch(rel(path), pattern):
+            return width
+    return default
+
+
+def parse_srcset(srcset):
+    """[(url, width descriptor or None, density)] for each srcset candidate."""
+    candidates = []
+    for part in srcset.split(","):
+        bits = part.split()
+        if not bits:
+            continue
+        width, density = None, 1.0
+        for descriptor in bits[1:]:
+            try:
+                if descriptor.endswith("w"):
+                    width = int(descriptor[:-1])
+                elif descriptor.endswith("x"):
+                    density = float(descriptor[:-1])
+            except ValueError:
+                pass
+        candidates.append((bits[0], width, density))
+    return candidates
+
+
+def pick_candidate(resource, shown, viewport, dpr):
+    """The srcset URL a browser would fetch when the slot is `shown` CSS px wide."""
+    candidates = parse_srcset(resource["srcset"])
+    if not candidates:
+        return resource["url"]
+    sizes = SIZES_LENGTH.match((resource.get("sizes") or "").split(",")[-1])
+    if sizes:
+        value, unit = float(sizes.group(1)), sizes.group(2)
+        shown = value if unit == "px" else viewport * value / 100
+    if any(width for _, width, _ in candidates):
+        # w descriptors: the smallest candidate covering the slot, else the largest
+        scored = [(width, url) for url, width, _ in candidates if width]
+        needed = shown * dpr
+    else:
+        scored = [(density, url) for url, _, density in candidates]
+        needed = dpr
+    fitting = [c for c in scored if c[0] >= needed]
+    return min(fitting)[1] if fitting else max(scored)[1]
+
+
+def oversize_check(resource, info, shown, dpr):
+    """Return a finding if the image is wider than it can be displayed, else None."""
+    if not info["size"] or resource["srcset"]:
+        # srcset lets the browser pick a candidate; nothing to judge here
+        return None
+    needed = shown * dpr
+    width, height = info["size"]
+    if width <= needed * OVERSIZE_TOLERANCE:
+        return None
+    scale = needed / width
+    return {
+        "intrinsic": [width, height],
+        "display_width": shown,
+        "needed_width": needed,
+        "wasted_bytes": round(info["raw"] * (1 - scale * scale)),
+    }
+
+
+@devtrace.traced("analyze_page")
+def analyze_page(page, default_width=1440, dpr=1, display_widths=None):
+    audit = validate_html.audit_page(page)
+    base_dir = os.path.dirname(os.path.abspath(page))
+    html = asset_info(os.path.abspath(page))
+
+    assets = {}
+    external = []
+    render_blocking = []
+    oversized = []
+    fetched_pictures = set()
+    display_widths = display_widths or {}
+
+    def add(path, resource, via=None):
+        info = asset_info(path)
+        ext = os.path.splitext(path)[1].lower()
+        entry = assets.get(path)
+        if entry is None:
+            entry = assets[path] = {
+                "path": rel(path),
+                "category": CATEGORIES.get(ext, "other"),
+                "exists": info["exists"],
+                "raw": info["raw"],
+                "transfer": info["gzip"],
+                "brotli": info["brotli"],
+                "brotli_estimated": info["brotli_estimated"],
+                "refs": [],
+            }
+            # Background images etc. referenced from a linked stylesheet
+            for url in info.get("css_urls", ()):
+                add(resolve(os.path.dirname(path), url), {"tag": "css-url", "line": None}, via=path)
+        entry["refs"].append({"tag": resource["tag"], "line": resource["line"], "via": via and rel(via)})
+        return entry, info
+
+    for resource in audit["resources"]:
+        url = resource["url"]
+        picture = resource.get("picture")
+        if picture is not None:
+            if picture in fetched_pictures:
+                # An earlier <source> of this <picture> is the one fetched
+                continue
+            fetched_pictures.add(picture)
+        shown = display_width(resource, resolve(base_dir, url), default_width, display_widths)
+        if resource["srcset"]:
+            url = pick_candidate(resource, shown, default_width, dpr)
+        if not validate_html.is_local_url(url):
+            if urlsplit(url).scheme in ("http", "https") or url.startswith("//"):
+                external.append({"url": url, "tag": resource["tag"], "render_blocking": resource["render_blocking"]})
+                if resource["render_blocking"]:
+                    render_blocking.append({"url": url, "tag": resource["tag"], "line": resource["line"]})
+            continue
+        path = resolve(base_dir, url)
+        entry, info = add(path, resource)
+        if resource["render_blocking"]:
+            render_blocking.append({"url": entry["path"], "tag": resource["tag"], "line": resource["line"]})
+        if resource["tag"] == "img" and info["exists"]:
+            finding = oversize_check(resource, info, shown, dpr)
+            if finding:
+                oversized.append(dict(finding, path=entry["path"], line=resource["line"]))
+
+    by_category = {}
+    for entry in assets.values():
+        by_category[entry["category"]] = by_category.get(entry["category"], 0) + entry["transfer"]
+    blocking_paths = {r["url"] for r in render_blocking}
+    critical = html["gzip"] + sum(e["transfer"] for e in assets.values() if e["path"] in blocking_paths)
+
+    return {
+        "page": audit["page"],
+        "html": {"raw": html["raw"], "transfer": html["gzip"], "brotli": html["brotli"],
+                 "inline_bytes": audit["inline_bytes"]},
+        "raw_bytes": html["raw"] + sum(e["raw"] for e in assets.values()),
+        "transfer_bytes": html["gzip"] + sum(e["transfer"] for e in assets.values()),
+        "brotli_bytes": html["brotli"] + sum(e["brotli"] for e in assets.values()),
+        "brotli_estimated": brotli is None,
+        "critical_bytes": critical,
+        "by_category": by_category,
+        "assets": sorted(assets.values(), key=lambda e: -e["transfer"]),
+        "missing_assets": sorted(e["path"] for e in assets.values() if not e["exists"]),
+        "external": external,
+        "render_blocking": render_blocking,
+        "oversized_images": oversized,
+    }
+
+
+def load_budget(path, overrides):
+    """Merge DEFAULT_BUDGET, the budget file and --set overrides into {page: limits}.
+
+    Also returns the file's "display_widths" ({".class" or path glob: CSS px}).
+    """
+    config = {"default": {}, "pages": {}, "display_widths": {}}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            config.update(json.load(f))
+    default = dict(DEFAULT_BUDGET, **config.get("default", {}))
+    for item in overrides:
+        name, _, value = item.partition("=")
+        if name not in DEFAULT_BUDGET:
+            raise SystemExit(f"Unknown budget '{name}' (choose from {', '.join(DEFAULT_BUDGET)})")
+        default[name] = float(value)
+    pages = {name: dict(default, **limits) for name, limits in config.get("pages", {}).items()}
+    return default, pages, config.get("display_widths", {})
+
+
+def measure(result):
+    """The budgeted quantities for one analyzed page."""
+    kb = 1024
+    cats = result["by_category"]
+    return {
+        "total_kb": result["transfer_bytes"] / kb,
+        "critical_kb": result["critical_bytes"] / kb,
+        "html_kb": result["html"]["transfer"] / kb,
+        "style_kb": cats.get("style", 0) / kb,
+        "script_kb": cats.get("script", 0) / kb,
+        "image_kb": cats.get("image", 0) / kb,
+        "render_blocking": len(result["render_blocking"]),
+        "oversized_images": len(result["oversized_images"]),
+    }
+
+
+def check_budget(result, limits):
+    values = measure(result)
+    return [
+        {"budget": name, "value": round(values[name], 1), "limit": limit}
+        for name, limit in limits.items()
+        if name in values and values[name] > limit
+    ]
+
+
+def print_report(result, values, limits, over):
+    kb = 1024
+    brotli_note = " est." if result["brotli_estimated"] else ""
+    print(f"=== {result['page']}")
+    print(f"Transfer: {result['transfer_bytes'] / kb:.0f} KB gzip, "
+          f"{result['brotli_bytes'] / kb:.0f} KB brotli{brotli_note} "
+          f"({result['raw_bytes'] / kb:.0f} KB raw, {len(result['assets'])} local assets)")
+    inline = result["html"]["inline_bytes"]
+    print(f"HTML: {result['html']['raw'] / kb:.0f} KB raw -> {result['html']['transfer'] / kb:.0f} KB gzip "
+          f"(inline CSS {inline['style'] / kb:.0f} KB, inline JS {inline['script'] / kb:.0f} KB)")
+    print("By type: " + ", ".join(f"{cat} {size / kb:.0f} KB" for cat, size in sorted(result["by_category"].items())))
+    print(f"Critical path: {result['critical_bytes'] / kb:.0f} KB, {len(result['render_blocking'])} render-blocking request(s)")
+    for item in result["render_blocking"]:
+        print(f"  blocking <{item['tag']}> line {item['line']}: {item['url']}")
+    for item in result["oversized_images"]:
+        print(f"  oversized {item['path']} (line {item['line']}): {item['intrinsic'][0]}px wide, "
+              f"shown at {item['display_width']}px, ~{item['wasted_bytes'] / kb:.0f} KB wasted")
+    if result["missing_assets"]:
+        print(f"  {len(result['missing_assets'])} referenced asset(s) missing, counted as 0 bytes")
+    if result["external"]:
+        print(f"  {len(result['external'])} external request(s) not counted")
+    for name, limit in limits.items():
+        status = "OVER" if any(o["budget"] == name for o in over) else "ok"
+        print(f"  {status:4} {name:17} {values[name]:8.1f} / {limit:g}")
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check page weight and critical path against a budget.")
+    parser.add_argument("pages", nargs="*", help="pages to check (default: *.html in the project root)")
+    parser.add_argument("--budget", default=BUDGET_PATH, help="budget JSON (default: page_budgets.json)")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME=VALUE",
+                        help="override one default limit, e.g. total_kb=900")
+    parser.add_argument("--display-width", type=int, default=1440,
+                        help="CSS px assumed for images without a width attribute or a "
+                             "display_widths entry (default 1440)")
+    parser.add_argument("--dpr", type=float, default=1, help="device pixel ratio to allow for (default 1)")
+    parser.add_argument("--json", action="store_true", help="print structured JSON instead of text")
+    args = parser.parse_args()
+
+    pages = args.pages or sorted(glob.glob(os.path.join(ROOT, "*.html")))
+    default, page_limits, display_widths = load_budget(args.budget, args.set)
+
+    results = []
+    failed = False
+    for page in pages:
+        result = analyze_page(page, args.display_width, args.dpr, display_widths)
+        limits = page_limits.get(result["page"], default)
+        values = measure(result)
+        result["over_budget"] = check_budget(result, limits)
+        failed = failed or bool(result["over_budget"])
+        results.append(result)
+        if not args.json:
+            print_report(result, values, limits, result["over_budget"])
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        over = sum(1 for r in results if r["over_budget"])
+        print(f"Done! {len(results)} page(s), {over} over budget")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
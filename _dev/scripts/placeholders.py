@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Generate low-quality image placeholders for the images shown on the site.
+
+For every image under assets/images/ (including feat-cards/, but not the
+-NNNw srcset variants) and App Screenshots incomplete/, the manifest at
+assets/images/placeholders.json records:
+
+    width, height   intrinsic size, so the page can reserve the box
+    color           average colour (#rrggbb), painted immediately
+    blurhash        BlurHash string (4x3 components, 3x4 for portrait)
+    lqip            tiny base64 JPEG data URI (longer side --lqip-size px)
+
+The pages (--html, default index.html) are then annotated at build time,
+so the space is reserved and a placeholder painted before any script
+runs:
+
+    <img>        width/height attributes; JPEGs also get the average
+                 colour as background, plus the LQIP when loading="eager"
+                 (lazy images get their LQIP from js/placeholders.js
+                 before they are scrolled into view)
+    url('...')   background / background-image declarations, in <style>
+                 blocks and style attributes, get the LQIP as an extra
+                 layer underneath the real image
+
+Everything added is marked (data-placeholder, or the data: URI layer
+itself), so a rerun refreshes it; <img> tags that already had their own
+width, height or style are left alone.
+
+Images are decoded through imageload at a reduced JPEG scale (nothing
+needs more than --lqip-size pixels), resampled to a common 32x32 grid
+and stacked, so the sRGB->linear conversion and every BlurHash cosine
+component are computed for the whole batch in one NumPy pass. Per-image
+results are cached by content digest in _dev/.cache/placeholders.json.
+
+Usage:
+    python3 _dev/scripts/placeholders.py [--lqip-size 16] [--quality 50]
+        [--manifest PATH] [--html PAGE ...] [--force]
+"""
+import argparse
+import base64
+import io
+import json
+import os
+import re
+import time
+from urllib.parse import unquote
+
+import numpy as np
+from PIL import Image
+
+import devtrace
+import imageload
+from buildcache import BuildCache, make_key
+from crop_features import VARIANT_NAME
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMAGES_DIR = os.path.join(ROOT, "assets", "images")
+SCREENSHOTS_DIR = os.path.join(ROOT, "App Screenshots incomplete")
+DEFAULT_MANIFEST = os.path.join(IMAGES_DIR, "placeholders.json")
+DEFAULT_PAGES = [os.path.join(ROOT, "index.html")]
+IMAGE_EXTS = (".jpg", ".jpeg", ".png", ".webp")
+VERSION = 1
+
+GRID = 32  # BlurHash is computed on a GRID x GRID resample
+COMPONENTS = 4  # computed for all images; sliced to 4x3 / 3x4 per image
+BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+
+IMG_TAG = re.compile(r"<img\b[^>]*>", re.I)
+IMG_SRC = re.compile(r'\ssrc="([^"]*)"')
+GENERATED_ATTRS = re.compile(r'\s(?:width|height|style)="[^"]*"|\sdata-placeholder\b')
+# A single-layer url('...') background (plus a layer added by an earlier run)
+CSS_BACKGROUND = re.compile(
+    r"(?P<prop>background(?:-image)?)\s*:\s*url\('(?P<src>[^']+)'\)(?P<rest>[^;\"'},]*?)"
+    r"(?P<generated>, url\('data:image/jpeg;base64,[^']*'\)[^;\"'},]*?)?(?=\s*[;\"}])"
+)
+
+# sRGB byte -> linear light, and the cosine bases over the grid
+SRGB_TO_LINEAR = np.where(
+    np.arange(256) / 255 <= 0.04045,
+    np.arange(256) / 255 / 12.92,
+    ((np.arange(256) / 255 + 0.055) / 1.055) ** 2.4,
+)
+BASIS = np.cos(np.pi * np.outer(np.arange(COMPONENTS), np.arange(GRID)) / GRID)  # (component, pixel)
+
+
+def find_images(folders=(IMAGES_DIR, SCREENSHOTS_DIR)):
+    found = []
+    for folder in folders:
+        for dirpath, _, filenames in os.walk(folder):
+            found.extend(os.path.join(dirpath, f) for f in filenames
+                         if f.lower().endswith(IMAGE_EXTS) and not VARIANT_NAME.search(f))
+    return sorted(found)
+
+
+def rel(path):
+    return os.path.relpath(path, ROOT).replace(os.sep, "/")
+
+
+# ---------------------------------------------------------------------------
+# BlurHash
+# ---------------------------------------------------------------------------
+
+def base83(value, length):
+    return "".join(BASE83[value // 83 ** (length - 1 - i) % 83] for i in range(length))
+
+
+def linear_to_srgb(value):
+    v = min(1.0, max(0.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+@devtrace.traced("blurhash_factors")
+def blurhash_factors(grids):
+    """
+    Cosine factors for a batch of (n, GRID, GRID, 3) uint8 grids, as an
+    (n, COMPONENTS, COMPONENTS, 3) array indexed [image, y, x, channel].
+    """
+    linear = SRGB_TO_LINEAR[grids]
+    factors = np.einsum("jy,nyxc,ix->njic", BASIS, linear, BASIS, optimize=True) / (GRID * GRID)
+    factors *= 2
+    factors[:, 0, 0, :] /= 2  # the DC term is not doubled
+    return factors
+
+
+def encode_blurhash(factors, cx, cy):
+    """BlurHash string from one image's factors, using cx x cy components."""
+    factors = factors[:cy, :cx].reshape(-1, 3)
+    dc, ac = factors[0], factors[1:]
+    parts = [base83((cx - 1) + (cy - 1) * 9, 1)]
+    if len(ac):
+        quantised_max = int(max(0, min(82, np.floor(np.abs(ac).max() * 166 - 0.5))))
+        max_value = (quantised_max + 1) / 166
+    else:
+        quantised_max, max_value = 0, 1
+    parts.append(base83(quantised_max, 1))
+    r, g, b = (linear_to_srgb(c) for c in dc)
+    parts.append(base83((r << 16) + (g << 8) + b, 4))
+    scaled = np.sign(ac) * np.sqrt(np.abs(ac / max_value))
+    quant = np.clip(np.floor(scaled * 9 + 9.5), 0, 18).astype(int)
+    parts.extend(base83(int(q[0] * 361 + q[1] * 19 + q[2]), 2) for q in quant)
+    return "".join(parts)
+
+
+# ---------------------------------------------------------------------------
+# Per image
+# ---------------------------------------------------------------------------
+
+def lqip(img, size, quality):
+    """Base64 JPEG data URI with the longer side `size` pixels."""
+    w, h = img.size
+    scale = size / max(w, h)
+    thumb = img.resize((max(1, round(w * scale)), max(1, round(h * scale))), Image.LANCZOS)
+    buf = io.BytesIO()
+    thumb.save(buf, "JPEG", quality=quality, optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode("ascii")
+
+
+def load(path, size, quality):
+    """Intrinsic size, LQIP and the GRID x GRID resample of one image."""
+    with devtrace.span("placeholder", file=rel(path)):
+        img = imageload.open_max_side(path, max(size, GRID))
+        w, h = img.info["full_size"]
+        grid = np.asarray(img.resize((GRID, GRID), Image.BOX))
+        return {"width": w, "height": h, "lqip": lqip(img, size, quality)}, grid
+
+
+def build_entries(paths, size, quality):
+    """Manifest entries for `paths`, with the BlurHash pass done over the whole batch."""
+    entries, grids = [], []
+    for path in paths:
+        entry, grid = load(path, size, quality)
+        entries.append(entry)
+        grids.append(grid)
+    if not entries:
+        return []
+    factors = blurhash_factors(np.stack(grids))
+    for entry, f in zip(entries, factors):
+        cx, cy = (3, 4) if entry["height"] > entry["width"] else (4, 3)
+        entry["blurhash"] = encode_blurhash(f, cx, cy)
+        entry["color"] = "#{:02x}{:02x}{:02x}".format(*(linear_to_srgb(c) for c in f[0, 0]))
+    return entries
+
+
+# ---------------------------------------------------------------------------
+# HTML annotation
+# ---------------------------------------------------------------------------
+
+def page_key(src, page):
+    """Manifest key for a src/url() value as written in `page`."""
+    if src.startswith(("data:", "http:", "https:", "//")):
+        return None
+    path = os.path.normpath(os.path.join(os.path.dirname(page), unquote(src.split("?")[0].split("#")[0])))
+    return rel(path)
+
+
+def annotate_img(tag, entry):
+    """`tag` with generated width/height/style (replacing an earlier run's)."""
+    if "data-placeholder" in tag:
+        tag = GENERATED_ATTRS.sub("", tag)
+    elif re.search(r"\s(?:width|height|style)=", tag):
+        return tag  # sized or styled by hand
+    attrs = f' width="{entry["width"]}" height="{entry["height"]}"'
+    src = IMG_SRC.search(tag).group(1)
+    if src.lower().split("?")[0].endswith((".jpg", ".jpeg")):
+        # Opaque images only: the background would show through transparency
+        background = entry["color"]
+        if re.search(r'\sloading="eager"', tag):
+            background += f" url('{entry['lqip']}') center/cover no-repeat"
+        attrs += f' style="background:{background}"'
+    attrs += " data-placeholder"
+    end = len(tag) - (2 if tag.endswith("/>") else 1)
+    return tag[:end].rstrip() + attrs + tag[end:]
+
+
+def annotate_css(match, entry):
+    head = match.group(0)[:match.end("rest") - match.start()]
+    if match.group("prop") == "background-image":
+        return f"{head}, url('{entry['lqip']}')"
+    return f"{head}, url('{entry['lqip']}') center/cover no-repeat {entry['color']}"
+
+
+def annotate_page(page, manifest):
+    """Write placeholders into `page`; returns the number of images/backgrounds annotated."""
+    with open(page, encoding="utf-8") as f:
+        html = f.read()
+    count = 0
+
+    def img(m):
+        nonlocal count
+        src = IMG_SRC.search(m.group(0))
+        entry = manifest.get(page_key(src.group(1), page)) if src else None
+        if not entry:
+            return m.group(0)
+        count += 1
+        return annotate_img(m.group(0), entry)
+
+    def css(m):
+        nonlocal count
+        entry = manifest.get(page_key(m.group("src"), page))
+        if not entry:
+            return m.group(0)
+        count += 1
+        return annotate_css(m, entry)
+
+    annotated = CSS_BACKGROUND.sub(css, IMG_TAG.sub(img, html))
+    if annotated != html:
+        tmp = page + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(annotated)
+        os.replace(tmp, page)
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write BlurHash / LQIP placeholders for the site images.")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="output JSON (default assets/images/placeholders.json)")
+    parser.add_argument("--lqip-size", type=int, default=16, help="longer side of the inline JPEG (default 16)")
+    parser.add_argument("--quality", type=int, default=50, help="JPEG quality of the inline placeholder (default 50)")
+    parser.add_argument("--html", nargs="*", default=DEFAULT_PAGES, metavar="PAGE",
+                        help="pages to annotate with sizes and placeholders (default index.html; none to skip)")
+    parser.add_argument("--force", action="store_true", help="ignore the cache")
+    args = parser.parse_args(argv)
+
+    paths = find_images()
+    if not paths:
+        print("No images found")
+        return
+
+    start = time.perf_counter()
+    cache = BuildCache("placeholders", force=args.force)
+    keys = {p: make_key(src=cache.digest(p), size=args.lqip_size, quality=args.quality, version=VERSION)
+            for p in paths}
+    manifest = {}
+    todo = []
+    for path in paths:
+        cached = cache.get(rel(path), keys[path])
+        if cached is not None:
+            manifest[rel(path)] = cached
+        else:
+            todo.append(path)
+
+    for path, entry in zip(todo, build_entries(todo, args.lqip_size, args.quality)):
+        manifest[rel(path)] = entry
+        cache.record(rel(path), keys[path], info=entry)
+        print(f"  OK: {rel(path)} {entry['width']}x{entry['height']} {entry['blurhash']} ({len(entry['lqip'])} B inline)")
+    cache.save()
+
+    manifest = dict(sorted(manifest.items()))
+    tmp = args.manifest + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+        f.write("\n")
+    os.replace(tmp, args.manifest)
+
+    for page in args.html:
+        print(f"  OK: {rel(page)}: {annotate_page(page, manifest)} image(s) annotated")
+
+    inline = sum(len(e["lqip"]) for e in manifest.values())
+    print(f"\nDone! {len(manifest)} placeholder(s) ({len(todo)} generated, {inline / 1024:.1f} KB inline) "
+          f"in {time.perf_counter() - start:.2f}s -> {args.manifest}")
+    print(cache.summary())
+    print(imageload.STATS.summary())
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
@@ -1,46 +1,104 @@
 #!/usr/bin/env python3
-"""Rename app screenshots to descriptive names."""
-import os, shutil
-
-folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'App Screenshots incomplete')
-
-renames = {
-    "Screenshot_2026-02-08-11-36-38-81_62cb8f718626560d6d480c451ac19cb3.jpg": "app-onboarding-privacy.jpg",
-    "Screenshot_2026-02-08-11-37-13-09_62cb8f718626560d6d480c451ac19cb3.jpg": "app-map-search-home.jpg",
-    "Screenshot_2026-02-08-11-37-17-90_62cb8f718626560d6d480c451ac19cb3.jpg": "app-alarms-empty.jpg",
-    "Screenshot_2026-02-08-11-37-45-48_62cb8f718626560d6d480c451ac19cb3.jpg": "app-search-autocomplete.jpg",
-    "Screenshot_2026-02-08-11-37-49-86_62cb8f718626560d6d480c451ac19cb3.jpg": "app-search-results.jpg",
-    "Screenshot_2026-02-08-11-38-20-24_62cb8f718626560d6d480c451ac19cb3.jpg": "app-map-pinned-location.jpg",
-    "Screenshot_2026-02-08-11-38-25-11_62cb8f718626560d6d480c451ac19cb3.jpg": "app-new-alarm-config.jpg",
-    "Screenshot_2026-02-08-11-38-43-42_62cb8f718626560d6d480c451ac19cb3.jpg": "app-alarms-list.jpg",
-    "Screenshot_2026-02-08-11-38-49-40_62cb8f718626560d6d480c451ac19cb3.jpg": "app-settings-cooldown.jpg",
-    "Screenshot_2026-02-08-11-38-52-15_62cb8f718626560d6d480c451ac19cb3.jpg": "app-settings-sound-haptics.jpg",
-    "Screenshot_2026-02-08-11-38-56-53_62cb8f718626560d6d480c451ac19cb3.jpg": "app-settings-vibration-theme.jpg",
-    "Screenshot_2026-02-08-11-39-02-44_62cb8f718626560d6d480c451ac19cb3.jpg": "app-alarm-display-slide.jpg",
-    "Screenshot_2026-02-08-11-39-05-03_62cb8f718626560d6d480c451ac19cb3.jpg": "app-alarm-display-swipe.jpg",
-    "Screenshot_2026-02-08-11-39-07-17_62cb8f718626560d6d480c451ac19cb3.jpg": "app-alarm-display-tap.jpg",
-    "Screenshot_2026-02-08-11-39-11-51_62cb8f718626560d6d480c451ac19cb3.jpg": "app-alarm-triggered.jpg",
-    "Screenshot_2026-02-08-11-39-23-08_62cb8f718626560d6d480c451ac19cb3.jpg": "app-alarm-display-options.jpg",
-    "Screenshot_2026-02-08-11-39-25-91_62cb8f718626560d6d480c451ac19cb3.jpg": "app-alarm-emoji-picker.jpg",
-    "Screenshot_2026-02-08-11-39-37-87_62cb8f718626560d6d480c451ac19cb3.jpg": "app-settings-appearance.jpg",
-    "Screenshot_2026-02-08-11-39-45-73_62cb8f718626560d6d480c451ac19cb3.jpg": "app-settings-color-themes.jpg",
-    "Screenshot_2026-02-08-11-39-57-09_62cb8f718626560d6d480c451ac19cb3.jpg": "app-map-alarm-setup.jpg",
-    "Screenshot_2026-02-08-11-40-18-84_62cb8f718626560d6d480c451ac19cb3.jpg": "app-demo-national-harbor.jpg",
-    "Screenshot_2026-02-08-11-40-33-92_62cb8f718626560d6d480c451ac19cb3.jpg": "app-demo-national-city.jpg",
+"""
+Rename app screenshots to descriptive names.
+
+Screenshots are identified by capture time (EXIF DateTimeOriginal, or the
+time in the original Screenshot_YYYY-MM-DD-HH-MM-SS name), which survives
+a rename, so the same table works before and after. Canonical names are
+stored in the asset catalog (asset_catalog.py) and all renames are
+applied as one journaled batch that --rollback can undo.
+
+Usage:
+    python3 _dev/scripts/rename_screenshots.py [--dry-run] [--rollback]
+"""
+import argparse
+
+import devtrace
+from asset_catalog import Catalog, refresh
+
+# Capture time -> canonical name
+SCREEN_NAMES = {
+    "2026-02-08T11:36:38": "app-onboarding-privacy.jpg",
+    "2026-02-08T11:37:13": "app-map-search-home.jpg",
+    "2026-02-08T11:37:17": "app-alarms-empty.jpg",
+    "2026-02-08T11:37:45": "app-search-autocomplete.jpg",
+    "2026-02-08T11:37:49": "app-search-results.jpg",
+    "2026-02-08T11:38:20": "app-map-pinned-location.jpg",
+    "2026-02-08T11:38:25": "app-new-alarm-config.jpg",
+    "2026-02-08T11:38:43": "app-alarms-list.jpg",
+    "2026-02-08T11:38:49": "app-settings-cooldown.jpg",
+    "2026-02-08T11:38:52": "app-settings-sound-haptics.jpg",
+    "2026-02-08T11:38:56": "app-settings-vibration-theme.jpg",
+    "2026-02-08T11:39:02": "app-alarm-display-slide.jpg",
+    "2026-02-08T11:39:05": "app-alarm-display-swipe.jpg",
+    "2026-02-08T11:39:07": "app-alarm-display-tap.jpg",
+    "2026-02-08T11:39:11": "app-alarm-triggered.jpg",
+    "2026-02-08T11:39:23": "app-alarm-display-options.jpg",
+    "2026-02-08T11:39:25": "app-alarm-emoji-picker.jpg",
+    "2026-02-08T11:39:37": "app-settings-appearance.jpg",
+    "2026-02-08T11:39:45": "app-settings-color-themes.jpg",
+    "2026-02-08T11:39:57": "app-map-alarm-setup.jpg",
+    "2026-02-08T11:40:18": "app-demo-national-harbor.jpg",
+    "2026-02-08T11:40:33": "app-demo-national-city.jpg",
 }
 
-count = 0
-for old, new in renames.items():
-    old_path = os.path.join(folder, old)
-    new_path = os.path.join(folder, new)
-    if os.path.exists(old_path):
-        os.rename(old_path, new_path)
-        print(f"  {old[:40]}... -> {new}")
-        count += 1
-    elif os.path.exists(new_path):
-        print(f"  Already renamed: {new}")
-        count += 1
-    else:
-        print(f"  NOT FOUND: {old[:40]}...")
-
-print(f"\nRenamed {count}/{len(renames)} files")
+
+def assign_names(cat):
+    """Store canonical names for cataloged screenshots; returns capture times with no screenshot."""
+    names = {}
+    found = set()
+    for row in cat.assets("screenshot"):
+        name = SCREEN_NAMES.get(row["captured_at"])
+        if name:
+            names[row["path"]] = name
+            found.add(row["captured_at"])
+    cat.set_canonical_names(names)
+    return sorted(set(SCREEN_NAMES) - found)
+
+
+def short(path):
+    return path.rsplit("/", 1)[-1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rename app screenshots to their canonical names.")
+    parser.add_argument("--dry-run", action="store_true", help="show the renames without applying them")
+    parser.add_argument("--rollback", action="store_true", help="undo the most recent rename batch")
+    args = parser.parse_args(argv)
+
+    with Catalog() as cat:
+        if args.rollback:
+            batch, results = cat.rollback()
+            if batch is None:
+                print("Nothing to roll back")
+                return
+            for src, dst, error in results:
+                print(f"  {short(src)} -> {short(dst)}" + (f"  FAILED: {error}" if error else ""))
+            print(f"\nRolled back batch {batch}: {sum(1 for *_, e in results if not e)}/{len(results)} files")
+            return
+
+        refresh(cat)
+        missing = assign_names(cat)
+        for captured in missing:
+            print(f"  NOT FOUND: screenshot taken {captured} ({SCREEN_NAMES[captured]})")
+
+        plan = cat.pending_renames("screenshot")
+        already = len(SCREEN_NAMES) - len(missing) - len(plan)
+        if already:
+            print(f"  Already renamed: {already} file(s)")
+        if args.dry_run:
+            for old, new in plan:
+                print(f"  {short(old)[:40]}... -> {short(new)}")
+            print(f"\nWould rename {len(plan)}/{len(SCREEN_NAMES)} files")
+            return
+
+        batch, results = cat.apply_renames(plan) if plan else (None, [])
+        for old, new, error in results:
+            print(f"  {short(old)[:40]}... -> {short(new)}" + (f"  FAILED: {error}" if error else ""))
+        renamed = sum(1 for *_, e in results if not e)
+        print(f"\nRenamed {renamed + already}/{len(SCREEN_NAMES)} files"
+              + (f" (batch {batch}, undo with --rollback)" if renamed else ""))
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Streaming reader for the SQL dumps written by _dev/database/backup.php
+(and db_backup.py, and mysqldump-style files in general).
+
+The dump is read a line at a time and split into statements on top-level
+semicolons, so memory is bounded by the largest single statement, not by
+the file. The splitter understands '...', "..." and `...` quoting
+(backslash escapes and doubled quotes), -- / # line comments and /* */
+block comments, so semicolons and newlines inside quoted values (release
+notes, JSON audit snapshots) and multi-line CREATE TABLE statements are
+handled. .gz dumps are decompressed on the fly.
+
+INSERT statements are parsed into rows, with one or many value tuples per
+statement. Values come back as Python str/int/float/None, and X'..' hex
+literals as bytes. backup.php quotes every value with PDO::quote, so
+numbers arrive as strings and the caller converts them. Unquoted words
+(NOW(), CURRENT_TIMESTAMP, TRUE) come back as Keyword, a str subclass,
+so they can be told apart from a quoted string with the same text.
+Inserts for tables the caller did not ask for are skipped without
+parsing their values.
+
+Usage (library):
+    for table, row in sqldump.iter_rows("backup.sql", tables={"audit_logs"}):
+        ...
+
+Usage (CLI, row counts per table):
+    python3 _dev/scripts/sqldump.py DUMP [DUMP...]
+"""
+import argparse
+import gzip
+import re
+from collections import Counter
+
+import devtrace
+
+# Outside quotes: a quoted string that closes on this line (skipped in one
+# step), else statement end, quote opening or comment start
+SPECIAL = re.compile(
+    r"""(?P<string>'[^'\\\n]*(?:(?:\\[\s\S]|'')[^'\\\n]*)*'(?!')"""
+    r"""|"[^"\\\n]*(?:(?:\\[\s\S]|"")[^"\\\n]*)*"(?!")|`[^`\n]*`)"""
+    r"""|(?P<token>[;'"`]|--|/\*|#)"""
+)
+# Inside a quote left open at the end of a line: the closing quote or an
+# escape pair (backticks have no escapes)
+QUOTE_END = {
+    "'": re.compile(r"\\[\s\S]|'"),
+    '"': re.compile(r'\\[\s\S]|"'),
+    "`": re.compile(r"`"),
+}
+
+INSERT_HEAD = re.compile(
+    r"INSERT\s+(?:IGNORE\s+)?INTO\s+`?(?P<table>\w+)`?\s*(?:\((?P<columns>[^)]*)\))?\s*VALUES\s*",
+    re.I,
+)
+TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<open>\()
+      | (?P<close>\))
+      | (?P<comma>,)
+      | '(?P<single>[^'\\]*(?:(?:\\[\s\S]|'')[^'\\]*)*)'
+      | "(?P<double>[^"\\]*(?:(?:\\[\s\S]|"")[^"\\]*)*)"
+      | [xX]'(?P<hex>[0-9A-Fa-f]*)'
+      | (?P<null>NULL)\b
+      | (?P<number>[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)\b
+      | (?P<word>[A-Za-z_]\w*(?:\(\))?)
+    )""",
+    re.X | re.I,
+)
+ESCAPES = {"0": "\0", "b": "\b", "n": "\n", "r": "\r", "t": "\t", "Z": "\x1a", "%": "\\%", "_": "\\_"}
+ESCAPE = re.compile(r"\\([\s\S])|''|\"\"")
+
+
+class DumpError(ValueError):
+    pass
+
+
+class Keyword(str):
+    """An unquoted word in VALUES, e.g. NOW() or CURRENT_TIMESTAMP."""
+
+
+def open_dump(path):
+    """Text stream over a .sql or .sql.gz dump. Binary column bytes round-trip via surrogateescape."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="surrogateescape", newline="")
+    return open(path, "r", encoding="utf-8", errors="surrogateescape", newline="")
+
+
+def iter_statements(lines):
+    """Yield complete statements (comments removed, no trailing ';') from an iterable of lines."""
+    parts = []
+    quote = None
+    in_block = False
+    for line in lines:
+        # line[start:pos] is statement text not yet copied into parts
+        pos = start = 0
+        n = len(line)
+        while pos < n:
+            if in_block:
+                end = line.find("*/", pos)
+                if end < 0:
+                    pos = start = n
+                    break
+                in_block = False
+                pos = start = end + 2
+            elif quote:
+                m = QUOTE_END[quote].search(line, pos)
+                if not m:
+                    pos = n
+                    break
+                pos = m.end()
+                if m.group() == quote:
+                    if line.startswith(quote, pos):
+                        pos += 1  # doubled quote: still inside
+                    else:
+                        quote = None
+            else:
+                m = SPECIAL.search(line, pos)
+                if not m:
+                    pos = n
+                    break
+                if m.lastgroup == "string":
+                    pos = m.end()
+                    continue
+                parts.append(line[start:m.start()])
+                token = m.group()
+                pos = start = m.end()
+                if token == ";":
+                    statement = "".join(parts).strip()
+                    parts = []
+                    if statement:
+                        yield statement
+                elif token == "--" and line[pos:pos + 1] not in ("", " ", "\t", "\r", "\n"):
+                    parts.append(token)  # "--" is only a comment when followed by whitespace
+                elif token in ("--", "#"):
+                    parts.append("\n")
+                    pos = start = n
+                elif token == "/*":
+                    in_block = True
+                else:
+                    quote = token
+                    parts.append(token)
+        parts.append(line[start:pos])
+    if quote or in_block:
+        raise DumpError("dump ends inside a quoted string or comment")
+    statement = "".join(parts).strip()
+    if statement:
+        yield statement
+
+
+def unescape(text):
+    def sub(m):
+        if m.group(1) is None:
+            return m.group()[0]
+        return ESCAPES.get(m.group(1), m.group(1))
+    return ESCAPE.sub(sub, text) if "\\" in text or "''" in text or '""' in text else text
+
+
+def parse_values(text, pos=0):
+    """Parse `(v, ...), (v, ...)` starting at `pos` into a list of tuples."""
+    rows, row = [], None
+    expect_value = False
+    while True:
+        m = TOKEN.match(text, pos)
+        if not m:
+            if text[pos:].strip():
+                raise DumpError(f"unexpected SQL near {text[pos:pos + 40]!r}")
+            if row is not None:
+                raise DumpError("statement ends inside a VALUES row (truncated dump?)")
+            return rows
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "open":
+            if row is not None:
+                raise DumpError("nested parenthesis in VALUES")
+            row, expect_value = [], True
+        elif kind == "close":
+            rows.append(tuple(row))
+            row = None
+        elif kind == "comma":
+            if row is not None:
+                expect_value = True
+        elif row is None or not expect_value:
+            raise DumpError(f"unexpected value near {text[m.start():m.start() + 40]!r}")
+        else:
+            value = m.group(kind)
+            if kind in ("single", "double"):
+                value = unescape(value)
+            elif kind == "hex":
+                value = bytes.fromhex(value)
+            elif kind == "null":
+                value = None
+            elif kind == "number":
+                value = float(value) if any(c in value for c in ".eE") else int(value)
+            elif kind == "word":
+                value = Keyword(value)
+            row.append(value)
+            expect_value = False
+
+
+def parse_insert(statement, tables=None):
+    """
+    (table, columns or None, [row tuples]) for an INSERT statement, None for
+    anything else or for tables not in `tables`.
+    """
+    m = INSERT_HEAD.match(statement)
+    if not m or (tables is not None and m.group("table") not in tables):
+        return None
+    columns = None
+    if m.group("columns"):
+        columns = [c.strip().strip("`") for c in m.group("columns").split(",")]
+    return m.group("table"), columns, parse_values(statement, m.end())
+
+
+def iter_inserts(path, tables=None):
+    """Yield (table, columns, rows) for every INSERT in the dump at `path`."""
+    with open_dump(path) as f, devtrace.span("sqldump", file=path):
+        for statement in iter_statements(f):
+            parsed = parse_insert(statement, tables)
+            if parsed:
+                yield parsed
+
+
+def iter_rows(path, tables=None):
+    """
+    Yield (table, {column: value}) for every row inserted into `tables`
+    (all tables if None). Inserts without a column list are skipped,
+    because their values cannot be named.
+    """
+    for table, columns, rows in iter_inserts(path, tables):
+        if columns is None:
+            continue
+        devtrace.count(f"sqldump.{table}", len(rows))
+        for values in rows:
+            if len(values) != len(columns):
+                raise DumpError(f"{table}: {len(values)} values for {len(columns)} columns")
+            yield table, dict(zip(columns, values))
+
+
+def dump_header(path):
+    """The `-- Key: value` lines at the top of a backup.php dump, e.g. {"Generated": "..."}."""
+    header = {}
+    with open_dump(path) as f:
+        for line in f:
+            if not line.startswith("--"):
+                if line.strip():
+                    break
+                continue
+            key, sep, value = line[2:].partition(":")
+            if sep and key.strip() and " " not in key.strip():
+                header[key.strip()] = value.strip()
+    return header
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count the rows per table in SQL dumps.")
+    parser.add_argument("dumps", nargs="+", help=".sql or .sql.gz files")
+    args = parser.parse_args()
+
+    for path in args.dumps:
+        counts = Counter()
+        for table, _, rows in iter_inserts(path):
+            counts[table] += len(rows)
+        generated = dump_header(path).get("Generated", "unknown")
+        print(f"{path} (generated {generated})")
+        for table, n in sorted(counts.items()):
+            print(f"  {table}: {n} row(s)")
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
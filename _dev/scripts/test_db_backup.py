@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Round-trip tests for db_backup.py: dump -> restore -> verify, for both
+db_backup's own checksummed dumps and backup.php-style dumps (every value
+quoted by PDO::quote, no checksum comments).
+
+Usage:
+    python3 -m pytest _dev/scripts/test_db_backup.py
+    python3 _dev/scripts/test_db_backup.py
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import db_backup  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE audit_logs (
+    id INTEGER PRIMARY KEY,
+    action TEXT NOT NULL,
+    score REAL,
+    payload BLOB,
+    created_at TEXT
+);
+"""
+ROWS = [
+    (1, "now()", 2.5, b"\x00\xffbin", "2026-01-01 00:00:00"),
+    (2, "CURRENT_TIMESTAMP", None, None, None),
+    (3, "quote ' and \\ and\nnewline; -- not a comment", 10.0, b"", "2026-01-02 03:04:05"),
+]
+
+# What backup.php writes for the same table: MySQL DDL, one INSERT per row,
+# every non-NULL value through PDO::quote
+BACKUP_PHP_DUMP = r"""-- ============================================================
+-- LokAlert Database Backup
+-- Generated: 2026-01-03 00:00:00
+-- DBMS: MySQL / MariaDB
+-- Database: lokalert
+-- ============================================================
+
+SET FOREIGN_KEY_CHECKS = 0;
+SET SQL_MODE = "NO_AUTO_VALUE_ON_ZERO";
+
+-- -----------------------------------------------------------
+-- Table structure for `audit_logs`
+-- -----------------------------------------------------------
+DROP TABLE IF EXISTS `audit_logs`;
+CREATE TABLE `audit_logs` (
+  `id` int(11) NOT NULL AUTO_INCREMENT,
+  `action` varchar(100) COLLATE utf8mb4_unicode_ci NOT NULL,
+  `score` decimal(5,2) DEFAULT NULL,
+  `created_at` timestamp NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `idx_action` (`action`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Data for `audit_logs` (3 rows)
+INSERT INTO `audit_logs` (`id`, `action`, `score`, `created_at`) VALUES ('1', 'now()', '2.50', '2026-01-01 00:00:00');
+INSERT INTO `audit_logs` (`id`, `action`, `score`, `created_at`) VALUES ('2', 'CURRENT_TIMESTAMP', NULL, NULL);
+INSERT INTO `audit_logs` (`id`, `action`, `score`, `created_at`) VALUES ('3', 'it\'s; \"quoted\"\nline', '10.00', '2026-01-02 03:04:05');
+
+SET FOREIGN_KEY_CHECKS = 1;
+
+-- End of backup
+"""
+
+
+def run_quietly(func, *args):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return func(*args)
+
+
+class RoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def restore(self, dump_path):
+        db = db_backup.SqliteDatabase(self.path("restored.sqlite"))
+        self.addCleanup(db.close)
+        with db_backup.sqldump.open_dump(dump_path) as f:
+            db.restore(db_backup.sqldump.iter_statements(f))
+        return db
+
+    def test_checksummed_dump(self):
+        src = sqlite3.connect(self.path("src.sqlite"))
+        src.executescript(SCHEMA)
+        src.executemany("INSERT INTO audit_logs VALUES (?, ?, ?, ?, ?)", ROWS)
+        src.commit()
+        src.close()
+
+        for name in ("backup.sql", "backup.sql.gz"):
+            with self.subTest(name):
+                source = db_backup.SqliteDatabase(self.path("src.sqlite"))
+                self.addCleanup(source.close)
+                dump_path = self.path(name)
+                run_quietly(db_backup.dump, source, dump_path, 2, 2)
+
+                db = self.restore(dump_path)
+                self.assertEqual(db.query("SELECT * FROM audit_logs ORDER BY id").fetchall(), ROWS)
+                self.assertEqual(run_quietly(db_backup.verify, dump_path), 0)
+                self.assertEqual(run_quietly(db_backup.verify, dump_path, db), 0)
+
+                db.query("UPDATE audit_logs SET action = 'changed' WHERE id = 2")
+                self.assertEqual(run_quietly(db_backup.verify, dump_path, db), 1)
+                db.close()
+                os.remove(self.path("restored.sqlite"))
+
+    def test_backup_php_dump(self):
+        dump_path = self.path("backup_php.sql")
+        with open(dump_path, "w") as f:
+            f.write(BACKUP_PHP_DUMP)
+
+        db = self.restore(dump_path)
+        actions = [r[0] for r in db.query("SELECT action FROM audit_logs ORDER BY id")]
+        self.assertEqual(actions, ["now()", "CURRENT_TIMESTAMP", "it's; \"quoted\"\nline"])
+        self.assertEqual(run_quietly(db_backup.verify, dump_path, db), 0)
+
+        db.query("UPDATE audit_logs SET score = 2.4 WHERE id = 1")
+        self.assertEqual(run_quietly(db_backup.verify, dump_path, db), 1)
+
+    def test_unquoted_functions_only(self):
+        dump_path = self.path("seed.sql")
+        with open(dump_path, "w") as f:
+            f.write("CREATE TABLE t (id INTEGER PRIMARY KEY, a TEXT, b TEXT);\n"
+                    "INSERT INTO t (id, a, b) VALUES (1, NOW(), 'NOW()');\n")
+        db = self.restore(dump_path)
+        a, b = db.query("SELECT a, b FROM t").fetchone()
+        self.assertRegex(a, r"^\d{4}-\d\d-\d\d \d\d:\d\d:\d\d$")
+        self.assertEqual(b, "NOW()")
+
+
+class TextLiteralTest(unittest.TestCase):
+    def test_numbers_compare_by_value(self):
+        for a, b in [("1", 1), ("2.50", 2.5), ("10.00", 10.0), ("-0.5", -0.5), ("100", 100)]:
+            self.assertEqual(db_backup.text_literal(a), db_backup.text_literal(b), (a, b))
+
+    def test_text_and_null(self):
+        self.assertEqual(db_backup.text_literal(None), "NULL")
+        self.assertNotEqual(db_backup.text_literal("NULL"), "NULL")
+        self.assertEqual(db_backup.text_literal(b"abc"), db_backup.text_literal("abc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,50 +1,299 @@
 #!/usr/bin/env python3
-"""Quick HTML validator for index-premium.html"""
-import re, os, sys, unicodedata
-
-os.chdir(os.path.dirname(os.path.abspath(__file__)) + "/../..")
-
-with open("index-premium.html", "r") as fh:
-    f = fh.read()
-
-lines = f.count("\n") + 1
-print(f"Line count: {lines}")
-
-# Emojis
-emojis = [c for c in f if unicodedata.category(c).startswith("So")]
-print(f"Emojis found: {len(emojis)}")
-if emojis:
-    print("  Emoji chars:", emojis[:10])
-
-# HTML balance
-opens = len(re.findall(r"<(?:div|section|header|footer|main|nav|article)[\s>]", f, re.I))
-closes = len(re.findall(r"</(?:div|section|header|footer|main|nav|article)>", f, re.I))
-print(f"Opening block tags: {opens}, Closing: {closes}, Balanced: {opens == closes}")
-
-# Asset references
-imgs = re.findall(r'(?:src|poster)=["\x27](assets/[^"\x27]+)["\x27]', f)
-vids = re.findall(r'<source\s+src=["\x27](assets/[^"\x27]+)["\x27]', f)
-all_assets = set(imgs + vids)
-print(f"Total unique asset refs: {len(all_assets)}")
-missing = [a for a in sorted(all_assets) if not os.path.exists(a)]
-if missing:
-    print("MISSING assets:")
-    for m in missing:
-        print(f"  - {m}")
-else:
-    print("All assets exist!")
-
-# Leftover references
-float_refs = re.findall(r"floatImgs|sh-float|stickyPhotos|sticky-photo", f)
-if float_refs:
-    print(f"WARNING: Leftover float/photo refs: {float_refs}")
-else:
-    print("No leftover float/photo references - clean!")
-
-# Check video element
-vid_els = re.findall(r"commuter-journey\.mp4", f)
-print(f"commuter-journey.mp4 references: {len(vid_els)}")
-
-# Check card-compact logic
-compact_refs = re.findall(r"compact|borderRadius|card", f, re.I)
-print(f"Card-compact JS references: {len(compact_refs)}")
+"""
+Quick HTML validator for the site's pages.
+
+Each page is streamed once through an html.parser.HTMLParser in 64 KB
+chunks; tag balance, local asset references, emoji counts and the
+leftover-selector checks are all collected in that single pass.
+
+Usage:
+    python3 _dev/scripts/validate_html.py [page.html ...] [--json]
+
+With no pages, every *.html in the project root is checked. Exits 1 if a
+page has unbalanced block tags or references a missing asset.
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import unicodedata
+from html.parser import HTMLParser
+from urllib.parse import unquote, urlsplit
+
+import devtrace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+CHUNK_SIZE = 64 * 1024
+
+BLOCK_TAGS = {"div", "section", "header", "footer", "main", "nav", "article"}
+URL_ATTRS = {"src", "href", "poster", "data-src"}
+CSS_URL = re.compile(r"""url\(\s*['"]?([^'")]+?)['"]?\s*\)""")
+
+# Leftovers from removed features that should not come back
+LEFTOVER_PATTERN = re.compile(r"floatImgs|sh-float|stickyPhotos|sticky-photo")
+# Informational counters: {name: pattern}
+COUNT_PATTERNS = {
+    "commuter-journey.mp4": re.compile(r"commuter-journey\.mp4"),
+    "card-compact": re.compile(r"compact|borderRadius|card", re.I),
+}
+
+
+def is_local_url(url):
+    parts = urlsplit(url)
+    return bool(parts.path) and not parts.scheme and not parts.netloc and not url.startswith("#")
+
+
+class HtmlAudit(HTMLParser):
+    """Collects every check for one page while it is being parsed."""
+
+    def __init__(self, page):
+        super().__init__(convert_charrefs=True)
+        self.page = page
+        self.base_dir = os.path.dirname(os.path.abspath(page))
+        self.lines = 1
+        self.bytes = 0
+        self.emoji_count = 0
+        self.emoji_sample = []
+        self.tag_counts = {tag: {"open": 0, "close": 0} for tag in sorted(BLOCK_TAGS)}
+        self.stack = []
+        self.unexpected_close = []
+        self.assets = {}
+        self.resources = []
+        self.in_head = False
+        self._picture = None
+        self.inline_bytes = {"style": 0, "script": 0}
+        self._raw_tag = None
+        self.leftovers = {}
+        self.counts = dict.fromkeys(COUNT_PATTERNS, 0)
+        self._text = []
+
+    # -- feeding -------------------------------------------------------------
+
+    def audit_file(self):
+        with open(self.page, "r", encoding="utf-8") as fh:
+            for chunk in iter(lambda: fh.read(CHUNK_SIZE), ""):
+                self.lines += chunk.count("\n")
+                self.bytes += len(chunk.encode("utf-8"))
+                self.feed(chunk)
+        self.close()
+        return self.result()
+
+    def close(self):
+        super().close()
+        self._flush_text()
+
+    # -- text ------------------------------------------------------------------
+
+    def handle_data(self, data):
+        # A text run can arrive in pieces across chunk boundaries; scan it whole
+        self._text.append(data)
+
+    def _flush_text(self):
+        if self._text:
+            text = "".join(self._text)
+            self._text = []
+            if self._raw_tag:
+                self._scan_inline(text)
+            self._scan_text(text)
+            if not text.isascii():
+                self._scan_emoji(text)
+
+    def _scan_text(self, text):
+        for match in LEFTOVER_PATTERN.finditer(text):
+            self.leftovers[match.group()] = self.leftovers.get(match.group(), 0) + 1
+        for name, pattern in COUNT_PATTERNS.items():
+            self.counts[name] += len(pattern.findall(text))
+
+    def _scan_inline(self, text):
+        self.inline_bytes[self._raw_tag] += len(text.encode("utf-8"))
+        if self._raw_tag == "style":
+            for match in CSS_URL.finditer(text):
+                if is_local_url(match.group(1)):
+                    self.resources.append({
+                        "url": match.group(1), "tag": "style-url", "line": self.getpos()[0],
+                        "render_blocking": False, "width": None, "height": None,
+                        "srcset": None, "sizes": None, "loading": None, "class": None, "picture": None,
+                    })
+
+    def _scan_emoji(self, text):
+        for c in text:
+            if c > "\x7f" and unicodedata.category(c) == "So":
+                self.emoji_count += 1
+                if len(self.emoji_sample) < 10:
+                    self.emoji_sample.append(c)
+
+    # -- tags ------------------------------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        self._flush_text()
+        if tag == "head":
+            self.in_head = True
+        elif tag == "body":
+            self.in_head = False
+        elif tag == "picture":
+            self._picture = self.getpos()[0]
+        if tag in self.inline_bytes:
+            self._raw_tag = tag
+        self._record_resource(tag, dict(attrs))
+        if tag in BLOCK_TAGS:
+            self.tag_counts[tag]["open"] += 1
+            self.stack.append((tag, self.getpos()[0]))
+        for name, value in attrs:
+            if not value:
+                continue
+            self._scan_text(value)
+            if not value.isascii():
+                self._scan_emoji(value)
+            if name in URL_ATTRS and is_local_url(value):
+                self._add_asset(value)
+            elif name == "srcset":
+                for candidate in value.split(","):
+                    url = candidate.strip().split(" ")[0]
+                    if url and is_local_url(url):
+                        self._add_asset(url)
+
+    def handle_startendtag(self, tag, attrs):
+        # <div/> is not a real void element; treat it like an opening tag only
+        self.handle_starttag(tag, attrs)
+        self._raw_tag = None
+
+    def handle_endtag(self, tag):
+        self._flush_text()
+        self._raw_tag = None
+        if tag == "head":
+            self.in_head = False
+        elif tag == "picture":
+            self._picture = None
+        if tag not in BLOCK_TAGS:
+            return
+        self.tag_counts[tag]["close"] += 1
+        line = self.getpos()[0]
+        # Pop to the nearest matching opener; anything skipped was left unclosed
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i][0] == tag:
+                del self.stack[i]
+                return
+        self.unexpected_close.append({"tag": tag, "line": line})
+
+    def _record_resource(self, tag, attrs):
+        """Note what loads a subresource and whether it blocks first render."""
+        url, blocking = None, False
+        if tag == "link" and "stylesheet" in (attrs.get("rel") or "").lower().split():
+            url = attrs.get("href")
+            media = (attrs.get("media") or "all").lower()
+            blocking = self.in_head and media in ("all", "screen") and "disabled" not in attrs
+        elif tag == "script" and attrs.get("src"):
+            url = attrs["src"]
+            deferred = "async" in attrs or "defer" in attrs or attrs.get("type") == "module"
+            blocking = self.in_head and not deferred
+        elif tag in ("img", "source", "video", "audio", "iframe"):
+            url = attrs.get("src") or attrs.get("data-src") or attrs.get("poster")
+            if not url and attrs.get("srcset"):
+                # <source srcset> has no src; its first candidate stands in
+                url = attrs["srcset"].split(",")[0].strip().split(" ")[0]
+        if url:
+            self.resources.append({
+                "url": url,
+                "tag": tag,
+                "line": self.getpos()[0],
+                "render_blocking": blocking,
+                "width": attrs.get("width"),
+                "height": attrs.get("height"),
+                "srcset": attrs.get("srcset"),
+                "sizes": attrs.get("sizes"),
+                "loading": attrs.get("loading"),
+                "class": attrs.get("class"),
+                # Line of the enclosing <picture>: the browser fetches one of its sources
+                "picture": self._picture if tag in ("img", "source") else None,
+            })
+            if tag == "video" and attrs.get("poster") and attrs["poster"] != url:
+                self.resources.append(dict(self.resources[-1], url=attrs["poster"], tag="poster"))
+
+    def _add_asset(self, url):
+        path = unquote(urlsplit(url).path)
+        if path not in self.assets:
+            self.assets[path] = os.path.exists(os.path.join(self.base_dir, path))
+
+    # -- result ----------------------------------------------------------------
+
+    def result(self):
+        opens = sum(c["open"] for c in self.tag_counts.values())
+        closes = sum(c["close"] for c in self.tag_counts.values())
+        return {
+            "page": os.path.relpath(self.page, ROOT).replace(os.sep, "/"),
+            "bytes": self.bytes,
+            "lines": self.lines,
+            "emoji_count": self.emoji_count,
+            "emoji_sample": self.emoji_sample,
+            "block_tags": {"open": opens, "close": closes, "by_tag": self.tag_counts},
+            "balanced": opens == closes and not self.stack and not self.unexpected_close,
+            "unclosed": [{"tag": t, "line": line} for t, line in self.stack],
+            "unexpected_close": self.unexpected_close,
+            "assets": sorted(self.assets),
+            "missing_assets": sorted(a for a, ok in self.assets.items() if not ok),
+            "resources": self.resources,
+            "inline_bytes": self.inline_bytes,
+            "leftover_refs": self.leftovers,
+            "counts": self.counts,
+        }
+
+
+def audit_page(page):
+    with devtrace.span("audit", file=page) as sp:
+        result = HtmlAudit(page).audit_file()
+        sp.add(bytes_in=result["bytes"])
+    return result
+
+
+def print_report(r):
+    print(f"=== {r['page']} ({r['bytes'] / 1024:.0f} KB)")
+    print(f"Line count: {r['lines']}")
+    print(f"Emojis found: {r['emoji_count']}")
+    if r["emoji_sample"]:
+        print("  Emoji chars:", r["emoji_sample"])
+    tags = r["block_tags"]
+    print(f"Opening block tags: {tags['open']}, Closing: {tags['close']}, Balanced: {r['balanced']}")
+    for item in r["unclosed"][:10]:
+        print(f"  unclosed <{item['tag']}> opened on line {item['line']}")
+    for item in r["unexpected_close"][:10]:
+        print(f"  stray </{item['tag']}> on line {item['line']}")
+    print(f"Total unique asset refs: {len(r['assets'])}")
+    if r["missing_assets"]:
+        print("MISSING assets:")
+        for m in r["missing_assets"]:
+            print(f"  - {m}")
+    else:
+        print("All assets exist!")
+    if r["leftover_refs"]:
+        print(f"WARNING: Leftover float/photo refs: {r['leftover_refs']}")
+    else:
+        print("No leftover float/photo references - clean!")
+    for name, count in r["counts"].items():
+        print(f"{name} references: {count}")
+    print()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Audit HTML pages in a single streaming pass each.")
+    parser.add_argument("pages", nargs="*", help="pages to check (default: *.html in the project root)")
+    parser.add_argument("--json", action="store_true", help="print structured JSON instead of text")
+    args = parser.parse_args(argv)
+
+    pages = args.pages or sorted(glob.glob(os.path.join(ROOT, "*.html")))
+    results = [audit_page(p) for p in pages]
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+    else:
+        for r in results:
+            print_report(r)
+
+    if any(not r["balanced"] or r["missing_assets"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    devtrace.run(main)
@@ -2,22 +2,53 @@
 """
 LokAlert Image Validator
 ========================
-Uses macOS built-in Vision framework (via pyobjc) to classify
-every image in assets/images/ and check if it matches the expected
-content described in EXPECTED_LABELS.
-
-Prerequisites (one-time):
-    pip3 install pyobjc-framework-Vision pyobjc-framework-Quartz Pillow
+Classifies every image in assets/images/ and checks if it matches the
+expected content described in EXPECTED_LABELS.
+
+Classifier backends (--backend, default "auto" = first available):
+    vision     macOS Vision framework via pyobjc
+               pip3 install pyobjc-framework-Vision pyobjc-framework-Quartz
+    onnx       offline CPU inference with a local ONNX image classifier,
+               batched; works on Linux build boxes
+               pip3 install onnxruntime numpy Pillow
+               model: _dev/models/image-classifier.onnx (or --model PATH)
+               labels: same path with .labels.txt, one class name per line
+    pil-basic  NumPy colour heuristics (sky, night, sunset, vegetation,
+               dominant colours, perceptual hash); no object labels, so
+               person/bus/phone checks cannot pass and its results are
+               advisory: failures are reported but the exit status is 0
+
+Nothing is installed at runtime; a backend whose dependencies are missing
+is reported and skipped.
+
+Images are classified concurrently (--jobs) and the labels are cached in
+_dev/.cache/validate_images.json, keyed by file content hash and
+classifier backend/version, so only new or changed images are classified
+again. image_report.json is merged in place: each entry records the
+backend, version and cache key it was judged with, and only entries whose
+key changed (or that are new, or whose expected labels changed) are
+re-evaluated and rewritten. Failed classifications are not cached.
 
 Usage:
-    python3 scripts/validate_images.py
+    python3 _dev/scripts/validate_images.py [--backend NAME] [--model PATH] [--jobs N] [--force]
 """
 
 import os
 import sys
 import json
+import argparse
 from pathlib import Path
 
+import devtrace
+from buildcache import BuildCache, file_digest, make_key
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+PROJECT_ROOT = SCRIPTS_DIR.parent.parent
+REPORT_PATH = SCRIPTS_DIR / "image_report.json"
+DEFAULT_MODEL = PROJECT_ROOT / "_dev" / "models" / "image-classifier.onnx"
+# First label of a failed classification (never cached)
+ERROR_LABELS = {"ERROR", "FALLBACK_ERROR"}
+
 # ---------------------------------------------------------------------------
 # Expected content for each image  (substring match, case-insensitive)
 # ---------------------------------------------------------------------------
@@ -78,69 +109,328 @@ def classify_image_vision(image_path: str, max_results: int = 10):
 
 def classify_image_coreml(image_path: str):
     """
-    Fallback: use PIL + basic heuristics if Vision import fails.
-    Returns list of (label, confidence) tuples with basic checks.
+    Fallback: use PIL + NumPy colour heuristics if no model is available.
+    Returns list of (label, confidence) tuples: scene heuristics (sky,
+    night, sunset, vegetation), dominant colours and a perceptual hash,
+    followed by basic size/mode facts. See image_features.py.
     """
     try:
-        from PIL import Image
-        img = Image.open(image_path)
-        w, h = img.size
-        mode = img.mode
-        labels = []
+        import image_features
+        rgb, (w, h), mode = image_features.load_thumbnail(image_path)
+        labels = image_features.feature_labels(image_features.color_features(rgb))
         labels.append(("image_loaded", 1.0))
         labels.append((f"size_{w}x{h}", 1.0))
         labels.append((f"mode_{mode}", 1.0))
-        # Check dominant color channel
-        if mode in ("RGB", "RGBA"):
-            import statistics
-            pixels = list(img.resize((50, 50)).getdata())
-            r_avg = statistics.mean(p[0] for p in pixels)
-            g_avg = statistics.mean(p[1] for p in pixels)
-            b_avg = statistics.mean(p[2] for p in pixels)
-            brightness = (r_avg + g_avg + b_avg) / 3
-            if brightness < 80:
-                labels.append(("dark_scene", 0.8))
-            elif brightness > 180:
-                labels.append(("bright_scene", 0.8))
-            labels.append((f"brightness_{brightness:.0f}", 1.0))
         return labels
     except Exception as e:
         return [("FALLBACK_ERROR", str(e))]
 
 
+# ---------------------------------------------------------------------------
+# Classifier backends
+# ---------------------------------------------------------------------------
+
+BACKENDS = {}
+
+
+def register_backend(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+class ClassifierBackend:
+    """
+    One way of turning images into (label, confidence) lists.
+    Bump `version` when a backend's output changes so cached labels are discarded.
+    """
+    name = ""
+    version = "1"
+    batch_size = 1
+    # Heuristic backends cannot check object labels; their FAILs are advisory
+    advisory = False
+
+    def __init__(self, **options):
+        self.options = options
+
+    def unavailable_reason(self):
+        """None if the backend can run here, else why it cannot."""
+        return None
+
+    def cache_version(self):
+        return self.version
+
+    def classify_batch(self, paths):
+        results = []
+        for p in paths:
+            with devtrace.span("classify", file=p, backend=self.name):
+                results.append(self.classify(p))
+        return results
+
+
+@register_backend
+class VisionBackend(ClassifierBackend):
+    name = "vision"
+
+    def unavailable_reason(self):
+        try:
+            import Vision  # noqa: F401
+        except ImportError:
+            return "pyobjc Vision framework not available (macOS only)"
+        return None
+
+    def classify(self, path):
+        return classify_image_vision(path)
+
+
+@register_backend
+class OnnxBackend(ClassifierBackend):
+    """
+    Local ONNX image classifier run on CPU, several images per inference.
+    Expects an NCHW float input with ImageNet normalization (the usual
+    export of torchvision / timm classifiers) and one score row per image.
+    """
+    name = "onnx"
+    version = "1"
+    batch_size = 16
+    MEAN = (0.485, 0.456, 0.406)
+    STD = (0.229, 0.224, 0.225)
+
+    def __init__(self, model=None, top_k=10, **options):
+        super().__init__(**options)
+        self.model_path = Path(model or DEFAULT_MODEL)
+        self.labels_path = self.model_path.with_suffix(".labels.txt")
+        self.top_k = top_k
+        self.session = None
+
+    def unavailable_reason(self):
+        try:
+            import onnxruntime  # noqa: F401
+            import numpy  # noqa: F401
+        except ImportError:
+            return "onnxruntime/numpy not installed"
+        if not self.model_path.exists():
+            return f"model not found: {self.model_path}"
+        if not self.labels_path.exists():
+            return f"labels not found: {self.labels_path}"
+        return None
+
+    def cache_version(self):
+        # Swapping the model file must invalidate cached labels
+        return f"{self.version}:{file_digest(str(self.model_path))[:16]}"
+
+    def load(self):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(str(self.model_path), providers=["CPUExecutionProvider"])
+        inp = self.session.get_inputs()[0]
+        self.input_name = inp.name
+        # Dynamic dims come back as strings/None; fall back to 224x224
+        _, _, h, w = inp.shape
+        self.input_size = (w if isinstance(w, int) else 224, h if isinstance(h, int) else 224)
+        if isinstance(inp.shape[0], int):
+            self.batch_size = inp.shape[0]
+        with open(self.labels_path) as f:
+            self.labels = [line.strip() for line in f if line.strip()]
+
+    def preprocess(self, path):
+        import numpy as np
+        import imageload
+        w, h = self.input_size
+        # Resize the short side to 256/224 of the input, then center-crop
+        short = round(max(w, h) * 256 / 224)
+        img = imageload.open_image(path, size=(short, short))
+        scale = short / min(img.size)
+        img = img.resize((max(w, round(img.size[0] * scale)), max(h, round(img.size[1] * scale))))
+        left, top = (img.size[0] - w) // 2, (img.size[1] - h) // 2
+        arr = np.asarray(img.crop((left, top, left + w, top + h)), dtype=np.float32) / 255.0
+        arr = (arr - np.array(self.MEAN, dtype=np.float32)) / np.array(self.STD, dtype=np.float32)
+        return arr.transpose(2, 0, 1)
+
+    def classify_batch(self, paths):
+        import numpy as np
+        with devtrace.span("onnx_preprocess", images=len(paths)):
+            batch = np.stack([self.preprocess(p) for p in paths])
+        with devtrace.span("onnx_inference", images=len(paths)):
+            scores = self.session.run(None, {self.input_name: batch})[0].reshape(len(paths), -1)
+        # Logits -> probabilities unless the model already outputs them
+        if scores.min() < 0 or not np.allclose(scores.sum(axis=1), 1.0, atol=1e-3):
+            scores = np.exp(scores - scores.max(axis=1, keepdims=True))
+            scores /= scores.sum(axis=1, keepdims=True)
+        top = np.argsort(-scores, axis=1)[:, :self.top_k]
+        return [
+            [(self.labels[i] if i < len(self.labels) else f"class_{i}", float(row[i])) for i in idx]
+            for row, idx in zip(scores, top)
+        ]
+
+
+@register_backend
+class PilBasicBackend(ClassifierBackend):
+    name = "pil-basic"
+    version = "2"
+    advisory = True
+
+    def unavailable_reason(self):
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            return "Pillow not installed"
+        return None
+
+    def classify(self, path):
+        return classify_image_coreml(path)
+
+
+def select_backend(name="auto", **options):
+    """
+    Instantiate the requested backend, or the first available one for "auto".
+    Exits with the reason if an explicitly requested backend cannot run.
+    """
+    candidates = list(BACKENDS) if name == "auto" else [name]
+    for candidate in candidates:
+        backend = BACKENDS[candidate](**options)
+        reason = backend.unavailable_reason()
+        if reason is None:
+            if hasattr(backend, "load"):
+                backend.load()
+            return backend
+        print(f"  {candidate}: unavailable ({reason})")
+    print("ERROR: no usable classifier backend.")
+    sys.exit(2)
+
+
 # ---------------------------------------------------------------------------
 # Main validation logic
 # ---------------------------------------------------------------------------
 
-def validate_images():
-    project_root = Path(__file__).resolve().parent.parent
-    images_dir = project_root / "assets" / "images"
+def classify_all(backend, image_files, jobs=None, force=False):
+    """
+    Classify `image_files` in a bounded thread pool, reusing cached labels.
+    Uncached images are sent to the backend in batches of backend.batch_size.
+    Returns {path: labels or Exception}, the cache (for its hit/miss
+    summary), the paths that were classified on this run and each path's
+    cache key. Error results are not cached, so a transient failure is
+    retried next run.
+    """
+    cache = BuildCache("validate_images", force=force)
+    version = backend.cache_version()
+    keys = {p: make_key(src=cache.digest(str(p)), backend=backend.name, version=version) for p in image_files}
+
+    results = {}
+    todo = []
+    for path in image_files:
+        cached = cache.get(str(path), keys[path])
+        if cached is not None:
+            results[path] = [tuple(item) for item in cached]
+        else:
+            todo.append(path)
+
+    def run(batch):
+        try:
+            return backend.classify_batch([str(p) for p in batch])
+        except Exception as e:
+            return [e] * len(batch)
+
+    batches = [todo[i:i + backend.batch_size] for i in range(0, len(todo), backend.batch_size)]
+    if batches:
+        with devtrace.ThreadPool(max_workers=jobs or min(8, os.cpu_count() or 1)) as pool:
+            for batch, batch_labels in zip(batches, pool.map(run, batches)):
+                for path, labels in zip(batch, batch_labels):
+                    results[path] = labels
+                    if not isinstance(labels, Exception) and not is_error(labels):
+                        cache.record(str(path), keys[path], info=labels)
+    cache.save()
+    return results, cache, set(todo), keys
+
+
+def is_error(labels):
+    return bool(labels) and labels[0][0] in ERROR_LABELS
+
+
+def load_report(report_path):
+    try:
+        with open(report_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def merge_report(report_path, report, updates, image_names):
+    """
+    Apply `updates` to image_report.json and drop images that no longer
+    exist; other entries are left as they are. Returns the number of
+    stale entries removed (the file is only rewritten if something changed).
+    """
+    stale = [name for name in report if name not in image_names]
+    for name in stale:
+        del report[name]
+    report.update(updates)
+    if updates or stale:
+        with open(report_path, "w") as f:
+            json.dump(dict(sorted(report.items())), f, indent=2, default=str)
+    return len(stale)
+
+
+def evaluate(name, labels):
+    """Print the check for one freshly classified image; returns its report entry."""
+    print(f"\n  {name}")
+    print(f"  {'─' * 40}")
+
+    if isinstance(labels, Exception) or is_error(labels):
+        error = labels if isinstance(labels, Exception) else labels[0][1]
+        print(f"    CLASSIFICATION ERROR: {error}")
+        return {"status": "error", "error": str(error)}
+
+    # Print top labels
+    top_labels = []
+    for label, conf in labels[:8]:
+        conf_str = f"{conf:.1%}" if isinstance(conf, float) else str(conf)
+        top_labels.append(f"{label} ({conf_str})")
+
+    print(f"    Labels: {', '.join(top_labels)}")
+
+    # Check against expected
+    expected = EXPECTED_LABELS.get(name)
+    if not expected:
+        print(f"    STATUS: SKIP (no expected labels defined)")
+        return {"status": "skip", "labels": top_labels}
+
+    all_label_text = " ".join(lbl.lower() for lbl, _ in labels)
+    matched = [kw for kw in expected if kw.lower() in all_label_text]
+    match_ratio = len(matched) / len(expected)
+
+    if match_ratio >= 0.15:  # At least 15% keyword hit = plausible
+        status = "PASS"
+        color = "\033[92m"  # green
+    else:
+        status = "FAIL"
+        color = "\033[91m"  # red
+
+    reset = "\033[0m"
+    print(f"    Expected keywords: {expected}")
+    print(f"    Matched: {matched} ({match_ratio:.0%})")
+    print(f"    {color}STATUS: {status}{reset}")
+
+    return {
+        "status": status.lower(),
+        "labels": top_labels,
+        "expected": expected,
+        "matched": matched,
+        "match_ratio": match_ratio,
+    }
+
+
+def validate_images(backend_name="auto", model=None, jobs=None, force=False):
+    images_dir = PROJECT_ROOT / "assets" / "images"
 
     if not images_dir.exists():
         print(f"ERROR: Images directory not found: {images_dir}")
         sys.exit(1)
 
     # Determine classifier
-    use_vision = False
-    try:
-        import Vision  # noqa: F401
-        use_vision = True
-        print("Using macOS Vision framework for classification\n")
-    except ImportError:
-        print("Vision framework not available. Trying to install pyobjc...")
-        os.system(f"{sys.executable} -m pip install pyobjc-framework-Vision pyobjc-framework-Quartz --quiet")
-        try:
-            import Vision  # noqa: F811, F401
-            use_vision = True
-            print("Using macOS Vision framework for classification\n")
-        except ImportError:
-            print("WARNING: Could not load Vision framework. Using basic PIL fallback.\n")
-            try:
-                from PIL import Image  # noqa: F401
-            except ImportError:
-                os.system(f"{sys.executable} -m pip install Pillow --quiet")
-
-    classify = classify_image_vision if use_vision else classify_image_coreml
+    backend = select_backend(backend_name, model=model)
+    print(f"Using {backend.name} backend for classification\n")
+    if backend.advisory:
+        print(f"WARNING: {backend.name} only reports colour/scene heuristics; object checks will fail.")
+        print("         Results are advisory and do not fail the run.\n")
 
     image_files = sorted(images_dir.glob("*.jpg")) + sorted(images_dir.glob("*.png"))
     if not image_files:
@@ -148,87 +438,64 @@ def validate_images():
         sys.exit(1)
 
     print(f"Found {len(image_files)} images in {images_dir}\n")
+    classified, cache, reclassified, keys = classify_all(backend, image_files, jobs=jobs, force=force)
+    print(f"{cache.summary()} ({len(reclassified)} image(s) classified)\n")
     print("=" * 70)
 
-    results = {}
-    pass_count = 0
-    fail_count = 0
-    skip_count = 0
-
+    # Only images classified on this run, missing from the report, judged
+    # by another backend/version/file content (the cache key) or whose
+    # EXPECTED_LABELS changed are re-evaluated and rewritten
+    report = load_report(REPORT_PATH)
+    updates = {}
+    counts = {"pass": 0, "fail": 0, "skip": 0, "error": 0}
+    version = backend.cache_version()
     for img_path in image_files:
         name = img_path.name
-        print(f"\n  {name}")
-        print(f"  {'─' * 40}")
-
-        # Classify
-        try:
-            labels = classify(str(img_path))
-        except Exception as e:
-            print(f"    CLASSIFICATION ERROR: {e}")
-            results[name] = {"status": "error", "error": str(e)}
-            fail_count += 1
-            continue
-
-        # Print top labels
-        top_labels = []
-        for label, conf in labels[:8]:
-            conf_str = f"{conf:.1%}" if isinstance(conf, float) else str(conf)
-            top_labels.append(f"{label} ({conf_str})")
-
-        print(f"    Labels: {', '.join(top_labels)}")
-
-        # Check against expected
-        expected = EXPECTED_LABELS.get(name)
-        if not expected:
-            print(f"    STATUS: SKIP (no expected labels defined)")
-            results[name] = {"status": "skip", "labels": top_labels}
-            skip_count += 1
-            continue
-
-        all_label_text = " ".join(lbl.lower() for lbl, _ in labels)
-        matched = [kw for kw in expected if kw.lower() in all_label_text]
-        match_ratio = len(matched) / len(expected)
-
-        if match_ratio >= 0.15:  # At least 15% keyword hit = plausible
-            status = "PASS"
-            pass_count += 1
-            color = "\033[92m"  # green
+        entry = report.get(name)
+        if (img_path in reclassified or entry is None or entry.get("key") != keys[img_path]
+                or entry.get("expected") != EXPECTED_LABELS.get(name)):
+            entry = updates[name] = evaluate(name, classified[img_path])
+            entry.update(backend=backend.name, backend_version=version, key=keys[img_path])
         else:
-            status = "FAIL"
-            fail_count += 1
-            color = "\033[91m"  # red
-
-        reset = "\033[0m"
-        print(f"    Expected keywords: {expected}")
-        print(f"    Matched: {matched} ({match_ratio:.0%})")
-        print(f"    {color}STATUS: {status}{reset}")
-
-        results[name] = {
-            "status": status.lower(),
-            "labels": top_labels,
-            "expected": expected,
-            "matched": matched,
-            "match_ratio": match_ratio,
-        }
+            print(f"\n  {name}: {entry['status'].upper()} (unchanged)")
+        counts[entry["status"]] += 1
+    fail_count = counts["fail"] + counts["error"]
 
     # Summary
     print("\n" + "=" * 70)
-    print(f"\n  SUMMARY: {pass_count} passed, {fail_count} failed, {skip_count} skipped")
-    print(f"  Total images: {len(image_files)}\n")
-
-    # Save JSON report
-    report_path = project_root / "scripts" / "image_report.json"
-    with open(report_path, "w") as f:
-        json.dump(results, f, indent=2, default=str)
-    print(f"  Full report saved to: {report_path}\n")
+    print(f"\n  SUMMARY: {counts['pass']} passed, {fail_count} failed, {counts['skip']} skipped")
+    print(f"  Total images: {len(image_files)}")
+    if backend.name != "vision":
+        import imageload
+        print(f"  {imageload.STATS.summary()}")
+    print()
+
+    # Merge into the JSON report
+    pruned = merge_report(REPORT_PATH, report, updates, {p.name for p in image_files})
+    print(f"  Report: {len(updates)} entr{'y' if len(updates) == 1 else 'ies'} updated in {REPORT_PATH}"
+          + (f" ({pruned} stale entries removed)" if pruned else "") + "\n")
 
     if fail_count > 0:
         print("  Some images may not match their expected content!")
         print("  Review the FAIL entries above and consider replacing them.\n")
+        if backend.advisory:
+            print(f"  ({backend.name} is advisory only; install vision or onnx for a real check)\n")
+            return
         sys.exit(1)
     else:
         print("  All validated images look correct!\n")
 
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Classify assets/images and check expected content.")
+    parser.add_argument("--backend", default="auto", choices=["auto", *BACKENDS],
+                        help="classifier backend (default: first available)")
+    parser.add_argument("--model", default=None, help=f"ONNX model for --backend onnx (default {DEFAULT_MODEL})")
+    parser.add_argument("--jobs", type=int, default=None, help="concurrent classifications (default: min(8, CPUs))")
+    parser.add_argument("--force", action="store_true", help="ignore cached labels and classify every image")
+    args = parser.parse_args(argv)
+    validate_images(args.backend, model=args.model, jobs=args.jobs, force=args.force)
+
+
 if __name__ == "__main__":
-    validate_images()
+    devtrace.run(main)
@@ -0,0 +1,117 @@
+/**
+ * LokAlert Image Placeholders
+ * Paints a blurred preview for lazy images that are still loading
+ *
+ * _dev/scripts/placeholders.py writes the sizes, average colours and the
+ * eager images' previews into index.html at build time, so layout does
+ * not wait for this script. This fills in the rest from
+ * assets/images/placeholders.json, keyed by image path:
+ * { "assets/images/hero-city.jpg": { width, height, color, blurhash, lqip } }
+ *
+ * - <img> without width/height attributes (not annotated at build time)
+ *   gets the intrinsic size
+ * - <img> still loading gets the tiny inline JPEG (or the average colour)
+ *   as its background until it loads
+ * - Elements with an inline background-image and no preview layer yet
+ *   get the placeholder as a layer underneath the real image
+ *
+ * If the manifest is missing the page behaves exactly as without this script.
+ */
+(function () {
+    'use strict';
+
+    var MANIFEST_URL = 'assets/images/placeholders.json';
+    var BG_URL = /url\(\s*(['"]?)(.*?)\1\s*\)/;
+    var PAINTED = ['backgroundImage', 'backgroundSize', 'backgroundPosition', 'backgroundRepeat', 'backgroundColor'];
+
+    // Manifest key for a src/url attribute value ("./a b.jpg?v=2" -> "a b.jpg")
+    function keyFor(src) {
+        if (!src || src.indexOf('data:') === 0) return null;
+        src = src.split(/[?#]/)[0].replace(/^\.\//, '');
+        try {
+            return decodeURI(src);
+        } catch (e) {
+            return src;
+        }
+    }
+
+    function paint(el, entry) {
+        if (entry.lqip) {
+            el.style.backgroundImage = 'url("' + entry.lqip + '")';
+            el.style.backgroundSize = 'cover';
+            el.style.backgroundPosition = 'center';
+            el.style.backgroundRepeat = 'no-repeat';
+        }
+        if (entry.color) {
+            el.style.backgroundColor = entry.color;
+        }
+    }
+
+    function applyToImage(img, entry) {
+        if (!img.hasAttribute('width') && !img.hasAttribute('height') && entry.width && entry.height) {
+            img.setAttribute('width', entry.width);
+            img.setAttribute('height', entry.height);
+        }
+        if (img.complete && img.naturalWidth) return;
+
+        var previous = {};
+        PAINTED.forEach(function (prop) { previous[prop] = img.style[prop]; });
+        paint(img, entry);
+
+        function restore() {
+            img.removeEventListener('load', restore);
+            img.removeEventListener('error', restore);
+            PAINTED.forEach(function (prop) { img.style[prop] = previous[prop]; });
+        }
+        img.addEventListener('load', restore);
+        img.addEventListener('error', restore);
+    }
+
+    function applyToBackground(el, entry) {
+        if (el.style.backgroundImage.indexOf('data:') !== -1) return;
+        if (entry.lqip) {
+            el.style.backgroundImage = el.style.backgroundImage + ', url("' + entry.lqip + '")';
+        }
+        if (entry.color && !el.style.backgroundColor) {
+            el.style.backgroundColor = entry.color;
+        }
+    }
+
+    function apply(manifest) {
+        var images = document.querySelectorAll('img[src]');
+        for (var i = 0; i < images.length; i++) {
+            var entry = manifest[keyFor(images[i].getAttribute('src'))];
+            if (entry) applyToImage(images[i], entry);
+        }
+
+        var backgrounds = document.querySelectorAll('[style*="background-image"]');
+        for (var j = 0; j < backgrounds.length; j++) {
+            var match = BG_URL.exec(backgrounds[j].style.backgroundImage);
+            var bgEntry = match && manifest[keyFor(match[2])];
+            if (bgEntry) applyToBackground(backgrounds[j], bgEntry);
+        }
+    }
+
+    function init() {
+        // Nothing on this page that the manifest could describe
+        if (!document.querySelector('img[src], [style*="background-image"]')) return;
+        if (!window.fetch) return;
+
+        fetch(MANIFEST_URL)
+            .then(function (response) {
+                return response.ok ? response.json() : null;
+            })
+            .then(function (manifest) {
+                if (manifest) apply(manifest);
+            })
+            .catch(function () {
+                // Missing or invalid manifest: keep the page as it is
+            });
+    }
+
+    if (document.readyState === 'loading') {
+        document.addEventListener('DOMContentLoaded', init);
+    } else {
+        init();
+    }
+})();